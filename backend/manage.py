@@ -0,0 +1,314 @@
+"""Maintenance commands for the Rudi-Media backend.
+
+Run from the backend directory with the same environment as the server, e.g.
+`python manage.py backfill-content --dry-run`. In multi-site mode, select the
+site with `--site <id>` before the command.
+"""
+import asyncio
+import random
+import uuid
+from datetime import datetime, time, timedelta, timezone
+from pathlib import Path
+from typing import Awaitable, Callable, List
+
+import typer
+from fastapi import HTTPException
+from pymongo.errors import BulkWriteError
+
+from server import (
+    TENANTS, InvalidationEvent, apply_post_update, client, create_slug, current_tenant, db, format_publish_at,
+    import_blog_posts, invalidation_bus, iter_markdown_posts, iter_markdown_zip, iter_wxr_posts, rebuild_contact_stats,
+    sanitize_html, text_excerpt
+)
+
+cli = typer.Typer(help="Rudi-Media Backend Wartung", no_args_is_help=True)
+
+
+@cli.callback()
+def select_site(site: str = typer.Option("default", "--site", help="Website (Mandant), auf die sich der Befehl bezieht")):
+    if site not in TENANTS:
+        raise typer.BadParameter(f"Unbekannte Website: {site}", param_hint="--site")
+    # asyncio.run copies this context, so every command works against the selected site
+    current_tenant.set(TENANTS[site])
+
+
+async def backfill_content(dry_run: bool) -> None:
+    changed = skipped = 0
+    cursor = db.blog_posts.find({}, {"_id": 0, "id": 1, "title": 1, "content": 1, "version": 1})
+    async for post in cursor:
+        content = post.get("content")
+        if not isinstance(content, str):
+            continue
+        sanitized = sanitize_html(content)
+        if sanitized == content:
+            continue
+        typer.echo(f"{post['id']}: {len(content)} -> {len(sanitized)} Zeichen ({post.get('title', '')})")
+        if dry_run:
+            changed += 1
+            continue
+        # Goes through the regular update path so revisions, version and caches stay consistent
+        try:
+            await apply_post_update(post["id"], {"content": sanitized}, expected_version=post.get("version", 1))
+            changed += 1
+        except HTTPException as e:
+            skipped += 1
+            typer.echo(f"{post['id']}: übersprungen ({e.detail})", err=True)
+    action = "würden geändert" if dry_run else "geändert"
+    typer.echo(f"{changed} Beiträge {action}, {skipped} übersprungen")
+
+
+@cli.command("backfill-content")
+def backfill_content_command(
+    dry_run: bool = typer.Option(False, "--dry-run", help="Nur anzeigen, nichts schreiben")
+):
+    """Sanitize and minify the HTML of all existing blog posts."""
+    try:
+        asyncio.run(backfill_content(dry_run))
+    finally:
+        client.close()
+
+
+@cli.command("backfill-contact-stats")
+def backfill_contact_stats_command():
+    """Rebuild the contact statistics rollups from all stored contacts."""
+    try:
+        counted = asyncio.run(rebuild_contact_stats())
+        typer.echo(f"Statistik aus {counted} Kontaktanfragen neu berechnet")
+    finally:
+        client.close()
+
+
+async def import_posts(path: Path) -> None:
+    if path.is_dir():
+        result = await import_blog_posts(iter_markdown_posts(path))
+    else:
+        with path.open("rb") as source:
+            entries = iter_markdown_zip(source) if path.suffix.lower() == ".zip" else iter_wxr_posts(source)
+            result = await import_blog_posts(entries)
+    for error in result.errors:
+        typer.echo(error, err=True)
+    typer.echo(f"{result.imported} Beiträge importiert, {result.skipped} bereits vorhanden, {result.failed} fehlerhaft")
+
+
+@cli.command("import-posts")
+def import_posts_command(
+    path: Path = typer.Argument(..., exists=True, help="WordPress-Export (.xml), Zip-Archiv oder Ordner mit Markdown-Dateien")
+):
+    """Import blog posts from a WordPress WXR export or from front-matter Markdown files."""
+    try:
+        asyncio.run(import_posts(path))
+    finally:
+        client.close()
+
+
+# Synthetic data for scale tests
+TOPICS = [
+    "Social Media Marketing", "Suchmaschinenoptimierung", "Google Ads", "Meta Ads", "Content Marketing",
+    "E-Mail-Marketing", "Webdesign", "Markenaufbau", "Videomarketing", "Influencer Marketing",
+    "Local SEO", "Conversion-Optimierung", "Online-Reputation", "LinkedIn für B2B", "TikTok-Werbung"
+]
+TAGS = [
+    "Marketing", "Social Media", "SEO", "Google Ads", "Digital Marketing", "Content", "Instagram", "Facebook",
+    "Webdesign", "Branding", "Strategie", "Analytics", "E-Mail", "Video", "Werbung", "Kleinunternehmen",
+    "LinkedIn", "TikTok", "Local SEO", "Conversion", "Storytelling", "KI", "Newsletter", "Recht", "Fallstudie",
+    "YouTube", "Pinterest", "Landingpage", "Budget", "Trends"
+]
+TITLE_TEMPLATES = [
+    "{n} Tipps für erfolgreiches {topic}", "Warum {topic} für Ihr Unternehmen unverzichtbar ist",
+    "{topic}: Der komplette Leitfaden für {year}", "So messen Sie den Erfolg von {topic}",
+    "{topic} für kleine Unternehmen", "Die häufigsten Fehler beim {topic}", "{topic} oder {other}? Ein Vergleich",
+    "Fallstudie: Mehr Anfragen durch {topic}"
+]
+SENTENCE_STARTS = [
+    "Viele Unternehmen unterschätzen", "In der Praxis zeigt sich", "Unsere Erfahrung mit Kunden zeigt",
+    "Der wichtigste Schritt ist", "Entscheidend für den Erfolg ist", "Gerade im Mittelstand lohnt sich",
+    "Aktuelle Zahlen belegen", "Ein häufiger Irrtum ist", "Langfristig zahlt sich aus", "Wer hier spart, verschenkt"
+]
+SENTENCE_MIDDLES = [
+    "eine klare Zielgruppe", "regelmäßige Inhalte", "ein festes Budget", "messbare Kennzahlen", "die Landingpage",
+    "gute Bilder und Videos", "die Ansprache auf Augenhöhe", "ein durchdachter Redaktionsplan",
+    "die Auswertung der Kampagnen", "schnelle Ladezeiten", "lokale Sichtbarkeit", "ehrliche Kundenbewertungen"
+]
+SENTENCE_ENDS = [
+    "für nachhaltiges Wachstum.", "gerade bei begrenztem Budget.", "bevor die erste Anzeige geschaltet wird.",
+    "und bringt mehr qualifizierte Anfragen.", "im Wettbewerb mit größeren Anbietern.",
+    "statt kurzfristiger Aktionen.", "auf allen Kanälen gleichermaßen.", "für Ihre Marke."
+]
+FIRST_NAMES = [
+    "Anna", "Lukas", "Sophie", "Leon", "Marie", "Felix", "Laura", "Jonas", "Lea", "Paul", "Julia", "Maximilian",
+    "Sarah", "Elias", "Katharina", "Tim", "Hannah", "Jan", "Emily", "Ben", "Mehmet", "Elif", "Arben", "Fatma"
+]
+LAST_NAMES = [
+    "Müller", "Schmidt", "Schneider", "Fischer", "Weber", "Meyer", "Wagner", "Becker", "Schulz", "Hoffmann",
+    "Koch", "Bauer", "Richter", "Klein", "Wolf", "Schröder", "Neumann", "Braun", "Yılmaz", "Krasniqi", "Nowak"
+]
+MAIL_DOMAINS = ["gmail.com", "web.de", "gmx.de", "t-online.de", "outlook.de", "icloud.com"]
+CONTACT_REQUESTS = [
+    "Wir möchten unsere Sichtbarkeit bei Google verbessern.", "Können Sie unsere Social-Media-Kanäle betreuen?",
+    "Ich interessiere mich für eine neue Website.", "Bitte senden Sie mir ein Angebot für Google Ads.",
+    "Wir planen eine Kampagne zur Mitarbeitergewinnung.", "Haben Sie Erfahrung mit Gastronomiebetrieben?",
+    "Unser Onlineshop braucht mehr Besucher.", "Wir suchen Unterstützung bei Instagram-Reels."
+]
+# Contact submissions per local hour of day (business hours peak, a few at night)
+CONTACT_HOUR_WEIGHTS = [1, 1, 1, 1, 1, 2, 4, 8, 14, 18, 20, 19, 15, 16, 18, 17, 14, 11, 9, 8, 7, 5, 3, 2]
+
+
+def zipf_weights(count: int, exponent: float = 1.1) -> List[float]:
+    return [1 / (rank ** exponent) for rank in range(1, count + 1)]
+
+
+TAG_WEIGHTS = zipf_weights(len(TAGS))
+
+
+def synthetic_sentence(rng: random.Random) -> str:
+    return f"{rng.choice(SENTENCE_STARTS)} {rng.choice(SENTENCE_MIDDLES)} {rng.choice(SENTENCE_ENDS)}"
+
+
+def synthetic_paragraph(rng: random.Random) -> str:
+    text = " ".join(synthetic_sentence(rng) for _ in range(rng.randint(2, 6)))
+    if rng.random() < 0.3:
+        text += f" <strong>{rng.choice(SENTENCE_MIDDLES).capitalize()}</strong> macht den Unterschied."
+    if rng.random() < 0.15:
+        text += f' Mehr dazu in unserem <a href="/blog/{create_slug(rng.choice(TOPICS))}">Beitrag zum Thema</a>.'
+    return f"<p>{text}</p>"
+
+
+def synthetic_content(rng: random.Random) -> str:
+    # Log-normal paragraph counts: most posts are short, a long tail runs to ~40 KB of HTML
+    paragraphs = min(80, max(2, int(rng.lognormvariate(2.2, 0.7))))
+    parts = []
+    for index in range(paragraphs):
+        if index and index % 4 == 0:
+            parts.append(f"<h2>{rng.choice(SENTENCE_MIDDLES).capitalize()}</h2>")
+        parts.append(synthetic_paragraph(rng))
+        if rng.random() < 0.1:
+            parts.append("<ul>" + "".join(f"<li>{synthetic_sentence(rng)}</li>" for _ in range(rng.randint(3, 6))) + "</ul>")
+        if rng.random() < 0.05:
+            parts.append(f'<figure><img src="/api/images/{rng.getrandbits(64):016x}.jpg" alt="{rng.choice(TOPICS)}"></figure>')
+    return "".join(parts)
+
+
+def synthetic_posts(seed: int, batch: int, size: int, offset: int, until: datetime, years: int) -> List[dict]:
+    """Build one batch of posts; each batch has its own seed, so batches come out the same in any order"""
+    rng = random.Random(f"{seed}:posts:{batch}")
+    span = years * 365 * 24 * 3600
+    posts = []
+    for index in range(offset, offset + size):
+        topic, other = rng.sample(TOPICS, 2)
+        created_at = until - timedelta(seconds=span * rng.random() ** 0.7)  # More posts in recent years
+        title = rng.choice(TITLE_TEMPLATES).format(n=rng.randint(3, 12), topic=topic, other=other, year=created_at.year)
+        content = synthetic_content(rng)
+        roll = rng.random()
+        publish_at = until + timedelta(hours=rng.randint(1, 60 * 24)) if roll > 0.95 else None
+        tags = list(dict.fromkeys(rng.choices(TAGS, weights=TAG_WEIGHTS, k=rng.randint(1, 5))))
+        posts.append({
+            "id": str(uuid.UUID(int=rng.getrandbits(128), version=4)),
+            "title": title,
+            "content": content,
+            "excerpt": text_excerpt(content),
+            "author": "Arjanit Rudi",
+            "created_at": created_at.isoformat(),
+            "updated_at": (created_at + timedelta(days=rng.randint(0, 30)) if rng.random() < 0.3 else created_at).isoformat(),
+            "published": roll < 0.85,
+            "publish_at": format_publish_at(publish_at) if publish_at else None,
+            "tags": tags,
+            "slug": f"{create_slug(title)}-{index}",
+            "version": 1,
+            "meta_description": synthetic_sentence(rng),
+            "meta_keywords": ", ".join(tags),
+            "featured_image": None
+        })
+    return posts
+
+
+def synthetic_contacts(seed: int, batch: int, size: int, until: datetime, years: int) -> List[dict]:
+    rng = random.Random(f"{seed}:contacts:{batch}")
+    days = years * 365
+    contacts = []
+    for _ in range(size):
+        first, last = rng.choice(FIRST_NAMES), rng.choice(LAST_NAMES)
+        day = until - timedelta(days=int(days * rng.random() ** 0.6))
+        if day.weekday() >= 5 and rng.random() < 0.6:
+            day -= timedelta(days=day.weekday() - 4)  # Fewer weekend submissions
+        hour = rng.choices(range(24), weights=CONTACT_HOUR_WEIGHTS)[0]
+        created_at = datetime.combine(day.date(), time(hour, rng.randint(0, 59), rng.randint(0, 59)), timezone.utc)
+        local = create_slug(f"{first}.{last}").replace("-", "")
+        contacts.append({
+            "id": str(uuid.UUID(int=rng.getrandbits(128), version=4)),
+            "name": f"{first} {last}",
+            "email": f"{local}{rng.randint(1, 999)}@{rng.choice(MAIL_DOMAINS)}",
+            "message": " ".join([rng.choice(CONTACT_REQUESTS)] + [synthetic_sentence(rng) for _ in range(rng.randint(0, 4))]),
+            "phone": f"+49 {rng.randint(150, 179)} {rng.randint(1000000, 9999999)}" if rng.random() < 0.6 else None,
+            "created_at": created_at.isoformat()
+        })
+    return contacts
+
+
+async def insert_batches(collection, total: int, batch_size: int, concurrency: int, build: Callable[[int, int], List[dict]]) -> int:
+    """insert_many batches with up to concurrency writes in flight; generation overlaps with the writes"""
+    semaphore = asyncio.Semaphore(concurrency)
+    inserted = 0
+
+    async def write(documents: List[dict]):
+        nonlocal inserted
+        try:
+            await collection.insert_many(documents, ordered=False)
+            inserted += len(documents)
+        except BulkWriteError as e:
+            # Documents from an earlier run with the same seed already exist
+            inserted += e.details.get("nInserted", 0)
+        finally:
+            semaphore.release()
+
+    tasks: List[Awaitable] = []
+    for batch, offset in enumerate(range(0, total, batch_size)):
+        documents = await asyncio.to_thread(build, batch, min(batch_size, total - offset))
+        await semaphore.acquire()
+        tasks.append(asyncio.create_task(write(documents)))
+        if batch % 10 == 9:
+            typer.echo(f"{collection.name}: {offset + len(documents)}/{total}")
+    await asyncio.gather(*tasks)
+    return inserted
+
+
+async def generate_data(posts: int, contacts: int, seed: int, batch_size: int, concurrency: int, until: datetime, years: int) -> None:
+    if posts:
+        inserted = await insert_batches(
+            db.blog_posts, posts, batch_size, concurrency,
+            lambda batch, size: synthetic_posts(seed, batch, size, batch * batch_size, until, years)
+        )
+        await invalidation_bus.notify(InvalidationEvent(collection="blog_posts", operation="flush"))
+        typer.echo(f"{inserted} Beiträge erzeugt, {posts - inserted} bereits vorhanden")
+    if contacts:
+        inserted = await insert_batches(
+            db.contacts, contacts, batch_size, concurrency,
+            lambda batch, size: synthetic_contacts(seed, batch, size, until, years)
+        )
+        counted = await rebuild_contact_stats()
+        typer.echo(f"{inserted} Kontaktanfragen erzeugt, {contacts - inserted} bereits vorhanden; Statistik aus {counted} neu berechnet")
+
+
+@cli.command("generate-data")
+def generate_data_command(
+    posts: int = typer.Option(0, "--posts", min=0, help="Anzahl Blogbeiträge"),
+    contacts: int = typer.Option(0, "--contacts", min=0, help="Anzahl Kontaktanfragen"),
+    seed: int = typer.Option(42, "--seed", help="Gleicher Seed ergibt die gleichen Daten"),
+    batch_size: int = typer.Option(1000, "--batch-size", min=1, help="Dokumente pro insert_many"),
+    concurrency: int = typer.Option(4, "--concurrency", min=1, help="Gleichzeitige Schreibvorgänge"),
+    until: datetime = typer.Option(None, "--until", formats=["%Y-%m-%d"], help="Jüngstes Datum (Standard: heute)"),
+    years: int = typer.Option(5, "--years", min=1, help="Zeitraum, über den die Daten verteilt werden")
+):
+    """Fill the selected site with synthetic German posts and contacts for scale tests.
+
+    Output depends only on the options: pass --until along with --seed to get
+    identical data on another day. Re-running with the same options inserts nothing new.
+    """
+    until = (until or datetime.combine(datetime.now(timezone.utc).date(), time())).replace(tzinfo=timezone.utc)
+    try:
+        asyncio.run(generate_data(posts, contacts, seed, batch_size, concurrency, until, years))
+    finally:
+        client.close()
+
+
+if __name__ == "__main__":
+    cli()
@@ -1,20 +1,61 @@
-from fastapi import FastAPI, APIRouter, HTTPException, BackgroundTasks, Depends, status, UploadFile, File
+from fastapi import FastAPI, APIRouter, HTTPException, BackgroundTasks, Depends, status, UploadFile, File, Request, Response, Query, Header
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
-from motor.motor_asyncio import AsyncIOMotorClient
+from fastapi.responses import PlainTextResponse, StreamingResponse
+from fastapi.routing import APIRoute
+from motor.motor_asyncio import AsyncIOMotorClient, AsyncIOMotorGridFSBucket
+from pymongo import ReturnDocument, UpdateOne, DeleteOne, monitoring
+from pymongo.errors import BulkWriteError, DuplicateKeyError, OperationFailure, PyMongoError
 from dotenv import load_dotenv
-from pydantic import BaseModel, Field, EmailStr
-from typing import List, Optional
-from datetime import datetime, timezone, timedelta
+from pydantic import BaseModel, Field, EmailStr, ValidationError
+from typing import Any, AsyncIterator, BinaryIO, Callable, Dict, Iterator, List, Literal, Optional, Set, Tuple, Union
+from datetime import date, datetime, timezone, timedelta
+from zoneinfo import ZoneInfo
 from sendgrid import SendGridAPIClient
 from sendgrid.helpers.mail import Mail
 from passlib.context import CryptContext
 from jose import JWTError, jwt
+import io
 import os
+import copy
+import functools
+import re
+import csv
+import sys
+import json
+import math
+import zlib
+import heapq
+import difflib
+import fcntl
+import html
+from html.parser import HTMLParser
+import hashlib
+import hmac
+import secrets
+import time
+import asyncio
 import uuid
 import logging
+import queue
+import random
+import sqlite3
+import tempfile
+import unicodedata
+import threading
+import tracemalloc
+from collections import Counter, OrderedDict, deque
+from contextvars import ContextVar
+from logging.handlers import QueueHandler, QueueListener
+from urllib.parse import parse_qs, unquote
+from email.utils import parsedate_to_datetime
+import xml.etree.ElementTree as ET
+import zipfile
 from pathlib import Path
 import aiofiles
+import boto3
+from botocore.config import Config as BotoConfig
+from botocore.exceptions import BotoCoreError, ClientError
 import base64
 
 # Load environment variables
@@ -25,19 +66,233 @@ load_dotenv(ROOT_DIR / '.env')
 SECRET_KEY = os.environ.get('SECRET_KEY', 'your-secret-key-change-in-production')
 ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE_MINUTES = 30
+REFRESH_TOKEN_EXPIRE_DAYS = int(os.environ.get('REFRESH_TOKEN_EXPIRE_DAYS', '14'))
+REFRESH_TOKEN_REUSE_GRACE = float(os.environ.get('REFRESH_TOKEN_REUSE_GRACE', '10'))  # Seconds in which a just-rotated token may race (e.g. two tabs)
+
+# Logging (records are written by a background thread; access logs are sampled)
+LOG_LEVEL = os.environ.get('LOG_LEVEL', 'INFO').upper()
+LOG_FORMAT = os.environ.get('LOG_FORMAT', 'json')  # "json" or "text"
+LOG_QUEUE_SIZE = int(os.environ.get('LOG_QUEUE_SIZE', '10000'))
+ACCESS_LOG_SAMPLE_RATE = float(os.environ.get('ACCESS_LOG_SAMPLE_RATE', '0.1'))
+ACCESS_LOG_SLOW_MS = float(os.environ.get('ACCESS_LOG_SLOW_MS', '1000'))
+
+# Multi-site mode (one deployment, one database per site on a shared connection pool)
+TENANTS_CONFIG = os.environ.get('TENANTS_CONFIG', '')  # Path to a JSON file or inline JSON: {"<site id>": {...}}
+TENANT_PATH_PREFIX = '/sites'  # /sites/<site id>/api/... selects a site independent of the host
+TENANT_STRICT_HOSTS = os.environ.get('TENANT_STRICT_HOSTS', 'false').lower() == 'true'  # Unknown hosts get 404 instead of the default site
+DEFAULT_TENANT_ID = "default"
+
+# Server-Timing headers with a per-request phase breakdown
+SERVER_TIMING = os.environ.get('SERVER_TIMING', 'false').lower() == 'true'
+SERVER_TIMING_LOG = os.environ.get('SERVER_TIMING_LOG', 'false').lower() == 'true'  # Also log each breakdown
+
+# Request profiling (admin opt-in via "X-Profile: 1" header or "?_profile=1")
+PROFILE_SAMPLE_INTERVAL = float(os.environ.get('PROFILE_SAMPLE_INTERVAL', '0.005'))
+PROFILE_TRACE_FRAMES = int(os.environ.get('PROFILE_TRACE_FRAMES', '10'))
+PROFILE_TOP_ALLOCATIONS = int(os.environ.get('PROFILE_TOP_ALLOCATIONS', '25'))
+PROFILE_RETENTION_DAYS = int(os.environ.get('PROFILE_RETENTION_DAYS', '7'))  # Stored profiles expire after this
+
+# Contact ingestion (write-behind batching of contact form inserts)
+CONTACT_WRITE_BEHIND = os.environ.get('CONTACT_WRITE_BEHIND', 'true').lower() == 'true'
+CONTACT_SPOOL_DIR = Path(os.environ.get('CONTACT_SPOOL_DIR', ROOT_DIR / 'contact_spool'))
+CONTACT_BATCH_SIZE = int(os.environ.get('CONTACT_BATCH_SIZE', '100'))
+CONTACT_FLUSH_INTERVAL = float(os.environ.get('CONTACT_FLUSH_INTERVAL', '1.0'))
+CONTACT_MAX_ATTEMPTS = int(os.environ.get('CONTACT_MAX_ATTEMPTS', '5'))  # Then a rejected submission moves to dead-letter.ndjson
+
+# Duplicate contact submissions (client retries)
+CONTACT_IDEMPOTENCY_TTL = int(os.environ.get('CONTACT_IDEMPOTENCY_TTL', str(24 * 3600)))  # Lifetime of Idempotency-Key entries
+CONTACT_DEDUPE_WINDOW = int(os.environ.get('CONTACT_DEDUPE_WINDOW', '600'))  # Identical submissions without a key within this window
+CONTACT_IDEMPOTENCY_CACHE_SIZE = int(os.environ.get('CONTACT_IDEMPOTENCY_CACHE_SIZE', '1000'))
+CONTACT_IDEMPOTENCY_TIMEOUT = float(os.environ.get('CONTACT_IDEMPOTENCY_TIMEOUT', '1.0'))  # Longest a submission waits for its claim
+
+# Image storage (content-addressed by SHA-256)
+IMAGE_READ_CHUNK_SIZE = int(os.environ.get('IMAGE_READ_CHUNK_SIZE', str(64 * 1024)))
+IMAGE_MAX_SIZE = int(os.environ.get('IMAGE_MAX_SIZE', str(5 * 1024 * 1024)))
+IMAGE_SNIFF_BYTES = 12
+PUBLIC_BASE_URL = os.environ.get('PUBLIC_BASE_URL', '').rstrip('/')
+
+# Direct-to-bucket image uploads (any S3-compatible store; S3_ENDPOINT_URL points at MinIO or moto locally)
+S3_BUCKET = os.environ.get('S3_BUCKET', '')
+S3_ENDPOINT_URL = os.environ.get('S3_ENDPOINT_URL') or None
+S3_REGION = os.environ.get('S3_REGION', 'eu-central-1')
+S3_PUBLIC_URL = os.environ.get('S3_PUBLIC_URL', '').rstrip('/')  # Bucket or CDN base URL for image links
+S3_UPLOAD_PREFIX = os.environ.get('S3_UPLOAD_PREFIX', 'images/')
+S3_PRESIGN_EXPIRES = int(os.environ.get('S3_PRESIGN_EXPIRES', '600'))
+
+# Blog import (WordPress WXR exports and front-matter Markdown)
+IMPORT_BATCH_SIZE = int(os.environ.get('IMPORT_BATCH_SIZE', '200'))
+IMPORT_MAX_SIZE = int(os.environ.get('IMPORT_MAX_SIZE', str(200 * 1024 * 1024)))
+
+# Blog post revision history (reverse deltas with a full snapshot every N revisions)
+REVISION_SNAPSHOT_INTERVAL = int(os.environ.get('REVISION_SNAPSHOT_INTERVAL', '10'))
+
+# Contacts listing and export
+CONTACTS_PAGE_SIZE_MAX = int(os.environ.get('CONTACTS_PAGE_SIZE_MAX', '500'))
+CONTACT_EXPORT_BATCH_SIZE = int(os.environ.get('CONTACT_EXPORT_BATCH_SIZE', '500'))
+CONTACT_EXPORT_FIELDS = ["id", "created_at", "name", "email", "phone", "message"]
+
+# Contact lead statistics (rollups per local day, week and month)
+STATS_TIMEZONE = os.environ.get('STATS_TIMEZONE', 'Europe/Berlin')
+STATS_ZONE = ZoneInfo(STATS_TIMEZONE)
+
+# Live contact feed (Server-Sent Events)
+CONTACT_STREAM_HEARTBEAT = float(os.environ.get('CONTACT_STREAM_HEARTBEAT', '15'))
+CONTACT_STREAM_HISTORY = int(os.environ.get('CONTACT_STREAM_HISTORY', '200'))
+CONTACT_STREAM_QUEUE_SIZE = int(os.environ.get('CONTACT_STREAM_QUEUE_SIZE', '100'))
+CONTACT_STREAM_REPLAY_LIMIT = int(os.environ.get('CONTACT_STREAM_REPLAY_LIMIT', '500'))
+CONTACT_STREAM_TOKEN_EXPIRE = int(os.environ.get('CONTACT_STREAM_TOKEN_EXPIRE', '300'))  # Seconds; checked when a stream connects
+
+# Rate limiting ("<requests>/<seconds>" per client IP and route)
+RATE_LIMIT_BACKEND = os.environ.get('RATE_LIMIT_BACKEND', 'memory')  # "memory" or "mongo" (shared across instances)
+RATE_LIMIT_MAX_KEYS = int(os.environ.get('RATE_LIMIT_MAX_KEYS', '10000'))
+RATE_LIMIT_SWEEP_INTERVAL = float(os.environ.get('RATE_LIMIT_SWEEP_INTERVAL', '60'))
+CONTACT_RATE_LIMIT = os.environ.get('CONTACT_RATE_LIMIT', '5/600')
+LOGIN_RATE_LIMIT = os.environ.get('LOGIN_RATE_LIMIT', '10/300')
+# Proxies in front of the app that append to X-Forwarded-For (1 on Vercel); 0 keys clients on the socket address.
+# Only entries added by these proxies are trusted, counted from the right; anything further left is client-supplied.
+TRUSTED_PROXY_HOPS = int(os.environ.get(
+    'TRUSTED_PROXY_HOPS', '1' if os.environ.get('TRUST_PROXY_HEADERS', 'false').lower() == 'true' else '0'
+))
+
+# Cross-instance cache invalidation
+CACHE_INVALIDATION_MODE = os.environ.get('CACHE_INVALIDATION_MODE', 'auto')  # "auto", "change_stream", "poll" or "off"
+CACHE_POLL_INTERVAL = float(os.environ.get('CACHE_POLL_INTERVAL', '2.0'))
+CACHE_RESUME_TOKEN_INTERVAL = float(os.environ.get('CACHE_RESUME_TOKEN_INTERVAL', '5.0'))
+POST_CACHE_MAX_ENTRIES = int(os.environ.get('POST_CACHE_MAX_ENTRIES', '1000'))
+WATCHED_COLLECTIONS = ["blog_posts", "admin_users"]
+
+# Degraded read mode (circuit breaker around MongoDB reads, local snapshot of published posts)
+MONGO_READ_TIMEOUT = float(os.environ.get('MONGO_READ_TIMEOUT', '2.0'))
+BREAKER_FAILURE_THRESHOLD = int(os.environ.get('BREAKER_FAILURE_THRESHOLD', '3'))
+BREAKER_RESET_TIMEOUT = float(os.environ.get('BREAKER_RESET_TIMEOUT', '15'))
+POST_SNAPSHOT_PATH = Path(os.environ.get('POST_SNAPSHOT_PATH', Path(tempfile.gettempdir()) / 'rudi-media-posts.sqlite3'))
+POST_SNAPSHOT_INTERVAL = float(os.environ.get('POST_SNAPSHOT_INTERVAL', '300'))
 
 # Password hashing
 pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 security = HTTPBearer()
+optional_security = HTTPBearer(auto_error=False)
+
+# Request timing (Server-Timing phases; inert unless SERVER_TIMING is enabled)
+request_timings: ContextVar[Optional[dict]] = ContextVar("request_timings", default=None)
+
+class span:
+    """Time a phase of the current request, e.g. `with span("parse"): ...`
+
+    Outside of a timed request this costs a single context variable lookup.
+    """
+    __slots__ = ("name", "timings", "started")
+
+    def __init__(self, name: str):
+        self.name = name
+
+    def __enter__(self):
+        self.timings = request_timings.get()
+        if self.timings is not None:
+            self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        if self.timings is not None:
+            self.timings["spans"].append((self.name, time.perf_counter() - self.started))
+
+class MongoTimingListener(monitoring.CommandListener):
+    """Record the duration of every MongoDB command issued while handling a timed request"""
+    def started(self, event):
+        pass
+
+    def succeeded(self, event):
+        self._record(event)
+
+    def failed(self, event):
+        self._record(event)
+
+    @staticmethod
+    def _record(event):
+        # Motor runs commands on its executor with the caller's context, so the request's list is visible here
+        timings = request_timings.get()
+        if timings is not None:
+            timings["spans"].append((f"mongo-{event.command_name}", event.duration_micros / 1e6))
+
+class TimedAPIRoute(APIRoute):
+    """Route that notes when the endpoint returns, so rendering the response can be timed separately"""
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        call = self.dependant.call
+        if not asyncio.iscoroutinefunction(call):
+            return
+
+        @functools.wraps(call)
+        async def timed_call(*call_args, **call_kwargs):
+            try:
+                with span("handler"):
+                    return await call(*call_args, **call_kwargs)
+            finally:
+                timings = request_timings.get()
+                if timings is not None:
+                    timings["handler_end"] = time.perf_counter()
+
+        self.dependant.call = timed_call
+
+# Sites (tenants)
+class Tenant(BaseModel):
+    id: str = Field(pattern=r"^[a-z0-9][a-z0-9-]*$")
+    db_name: str
+    hosts: List[str] = []
+    site_name: str = "Rudi-Media"
+    sender_email: str = Field(default_factory=lambda: os.environ.get('SENDER_EMAIL', 'info@rudimedia.de'))
+    notify_email: str = "info@rudi-media.de"  # Receives the contact form submissions
+    email_footer_html: Optional[str] = None  # Contact details closing the confirmation email
+    seed_sample_posts: bool = False
+
+def load_tenants() -> Dict[str, Tenant]:
+    """The default site always exists and uses DB_NAME; TENANTS_CONFIG adds further sites or overrides it"""
+    tenants = {DEFAULT_TENANT_ID: Tenant(id=DEFAULT_TENANT_ID, db_name=os.environ['DB_NAME'], seed_sample_posts=True)}
+    if TENANTS_CONFIG:
+        raw = TENANTS_CONFIG if TENANTS_CONFIG.lstrip().startswith("{") else Path(TENANTS_CONFIG).read_text()
+        for tenant_id, settings in json.loads(raw).items():
+            base = tenants[tenant_id].dict() if tenant_id in tenants else {}
+            tenants[tenant_id] = Tenant(**{**base, **settings, "id": tenant_id})
+    return tenants
+
+TENANTS = load_tenants()
+current_tenant: ContextVar[Tenant] = ContextVar("current_tenant", default=TENANTS[DEFAULT_TENANT_ID])
+
+class TenantScoped:
+    """Stand-in for a module-level object that exists once per site.
+
+    Attribute access goes to the current site's instance, which factory(tenant)
+    creates on first use. Code written against the single-site globals (db,
+    caches, background services) therefore works unchanged in multi-site mode.
+    """
+    def __init__(self, factory: Callable[[Tenant], Any]):
+        self._factory = factory
+        self._instances: Dict[str, Any] = {}
+
+    def current(self):
+        tenant = current_tenant.get()
+        instance = self._instances.get(tenant.id)
+        if instance is None:
+            instance = self._instances[tenant.id] = self._factory(tenant)
+        return instance
+
+    def __getattr__(self, name):
+        return getattr(self.current(), name)
+
+def tenant_path(path: Path, tenant: Tenant) -> Path:
+    """Per-site variant of a local file or directory; the default site keeps the configured path"""
+    if tenant.id == DEFAULT_TENANT_ID:
+        return path
+    return path.with_name(f"{path.stem}-{tenant.id}{path.suffix}")
 
 # MongoDB connection
 mongo_url = os.environ['MONGO_URL']
-client = AsyncIOMotorClient(mongo_url)
-db = client[os.environ['DB_NAME']]
+client = AsyncIOMotorClient(mongo_url, event_listeners=[MongoTimingListener()] if SERVER_TIMING else [])
+db = TenantScoped(lambda tenant: client[tenant.db_name])
 
 # Create FastAPI app and router
 app = FastAPI(title="Rudi-Media Website API")
-api_router = APIRouter(prefix="/api")
+api_router = APIRouter(prefix="/api", route_class=TimedAPIRoute if SERVER_TIMING else APIRoute)
 
 # Models
 class BlogPost(BaseModel):
@@ -49,8 +304,10 @@ class BlogPost(BaseModel):
     created_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
     updated_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
     published: bool = True
+    publish_at: Optional[datetime] = None  # Scheduled release; the post stays unpublished until then
     tags: List[str] = []
     slug: str
+    version: int = 1  # Incremented on every write; sent as ETag and checked against If-Match
     # SEO Fields
     meta_description: Optional[str] = None
     meta_keywords: Optional[str] = None
@@ -62,6 +319,7 @@ class BlogPostCreate(BaseModel):
     excerpt: str
     tags: List[str] = []
     published: bool = True
+    publish_at: Optional[datetime] = None
     meta_description: Optional[str] = None
     meta_keywords: Optional[str] = None
     featured_image: Optional[str] = None
@@ -72,10 +330,67 @@ class BlogPostUpdate(BaseModel):
     excerpt: Optional[str] = None
     tags: Optional[List[str]] = None
     published: Optional[bool] = None
+    publish_at: Optional[datetime] = None
     meta_description: Optional[str] = None
     meta_keywords: Optional[str] = None
     featured_image: Optional[str] = None
 
+class JsonPatchOperation(BaseModel):
+    op: Literal["add", "remove", "replace", "move", "copy", "test"]
+    path: str
+    value: Optional[Any] = None
+    from_: Optional[str] = Field(None, alias="from")
+
+class BlogPostPatch(BaseModel):
+    base_version: Optional[int] = None  # Version the patch was made against (or send If-Match)
+    operations: List[JsonPatchOperation] = []  # RFC 6902 operations on the post's editable fields
+    # Per-field text deltas against base_version: [0, n] keeps n characters,
+    # [-1, n] deletes n characters, [1, "text"] inserts text
+    text_deltas: Dict[str, List[List[Union[int, str]]]] = {}
+
+class BlogPostPatchResponse(BaseModel):
+    id: str
+    slug: str
+    version: int
+    updated_at: datetime
+    changed_fields: List[str]
+    normalized_fields: List[str] = []  # Stored differently than sent (e.g. sanitized HTML); reload these
+
+class BlogPostRevision(BaseModel):
+    version: int
+    kind: str  # "delta" or "snapshot"
+    changed_fields: List[str]
+    size: int  # Compressed bytes stored
+    created_at: datetime
+
+class BlogPostBulkOperation(BaseModel):
+    op: Literal["publish", "unpublish", "delete", "retag", "rename_tag", "merge_tags"]
+    post_id: Optional[str] = None  # publish, unpublish, delete, retag
+    tags: Optional[List[str]] = None  # retag: the post's new tag list
+    from_tags: Optional[List[str]] = None  # rename_tag, merge_tags: tags to replace
+    to_tag: Optional[str] = None  # rename_tag, merge_tags: replacement tag
+
+class BlogPostBulkRequest(BaseModel):
+    operations: List[BlogPostBulkOperation]
+
+class BlogPostBulkResult(BaseModel):
+    index: int
+    op: str
+    post_id: Optional[str] = None
+    status: str  # "ok", "not_found", "invalid" or "error"
+    modified: int = 0
+    detail: Optional[str] = None
+
+class BlogPostBulkResponse(BaseModel):
+    results: List[BlogPostBulkResult]
+    modified: int = 0  # Documents the database actually changed or deleted
+
+class BlogPostImportResult(BaseModel):
+    imported: int = 0
+    skipped: int = 0  # Entries imported by an earlier run
+    failed: int = 0
+    errors: List[str] = []
+
 class ContactForm(BaseModel):
     id: str = Field(default_factory=lambda: str(uuid.uuid4()))
     name: str
@@ -94,6 +409,19 @@ class ContactFormResponse(BaseModel):
     status: str
     message: str
 
+class ContactStatsBucket(BaseModel):
+    start: str  # Local date the bucket starts on (Monday for weeks, the 1st for months)
+    count: int
+    hours: List[int]  # Submissions per local hour of day, 0-23
+
+class ContactStats(BaseModel):
+    timezone: str
+    total: int
+    hours: List[int]
+    days: List[ContactStatsBucket]
+    weeks: List[ContactStatsBucket]
+    months: List[ContactStatsBucket]
+
 # Admin Models
 class AdminUser(BaseModel):
     id: str = Field(default_factory=lambda: str(uuid.uuid4()))
@@ -109,6 +437,15 @@ class AdminLogin(BaseModel):
 class Token(BaseModel):
     access_token: str
     token_type: str
+    refresh_token: Optional[str] = None
+    expires_in: Optional[int] = None  # Access token lifetime in seconds
+
+class StreamToken(BaseModel):
+    token: str
+    expires_in: int  # Seconds
+
+class RefreshTokenRequest(BaseModel):
+    refresh_token: str
 
 class AdminPasswordUpdate(BaseModel):
     current_password: str
@@ -118,16 +455,67 @@ class AdminUsernameUpdate(BaseModel):
     new_username: str
     password: str  # Current password for verification
 
+class InvalidationEvent(BaseModel):
+    collection: str  # "blog_posts" or "admin_users"
+    operation: str  # "insert", "update", "replace", "delete" or "flush" (anything may have changed)
+    post_id: Optional[str] = None
+    slug: Optional[str] = None
+    published: Optional[bool] = None
+    publish_at: Optional[str] = None
+    username: Optional[str] = None
+
 class ImageUploadResponse(BaseModel):
     status: str
     url: str
     message: str
 
+class ImagePresignRequest(BaseModel):
+    content_type: str
+    size: int
+    filename: Optional[str] = None
+
+class ImagePresignResponse(BaseModel):
+    upload_id: str
+    method: str = "POST"
+    url: str
+    fields: Dict[str, str]  # Form fields to send along with the file
+    key: str
+    expires_in: int
+
+class RequestProfile(BaseModel):
+    id: str
+    method: str
+    path: str
+    status_code: Optional[int] = None
+    duration_ms: float
+    sample_interval: float
+    sample_count: int
+    folded_stacks: str  # Brendan Gregg "folded" format, one "frame;frame;frame count" per line
+    top_allocations: List[dict] = []
+    created_at: datetime
+
 # Email Service
+DEFAULT_EMAIL_FOOTER_HTML = """
+                    <p>In der Zwischenzeit können Sie uns auch direkt über WhatsApp kontaktieren:</p>
+                    <p><a href="https://wa.me/4915222539425" style="color: #25D366; text-decoration: none; font-weight: bold;">📱 +49 1522 2539425</a></p>
+                    
+                    <hr style="border: none; border-top: 1px solid #eee; margin: 30px 0;">
+                    <p style="color: #666; font-size: 14px;">
+                        Mit freundlichen Grüßen<br>
+                        <strong>Arjanit Rudi</strong><br>
+                        Rudi-Media<br>
+                        Kampenwandstr. 2, 85586 Poing<br>
+                        Tel: +49 1522 2539425<br>
+                        Web: rudimedia.de
+                    </p>"""
+
 class EmailService:
-    def __init__(self):
+    def __init__(self, tenant: Tenant):
         self.api_key = os.environ.get('SENDGRID_API_KEY')
-        self.sender_email = os.environ.get('SENDER_EMAIL', 'info@rudimedia.de')
+        self.sender_email = tenant.sender_email
+        self.notify_email = tenant.notify_email
+        self.site_name = tenant.site_name
+        self.footer_html = tenant.email_footer_html or DEFAULT_EMAIL_FOOTER_HTML
         
     async def send_contact_email(self, contact_data: ContactForm):
         """Send contact form email"""
@@ -140,7 +528,7 @@ class EmailService:
             company_content = f"""
             <html>
                 <body style="font-family: Arial, sans-serif; line-height: 1.6;">
-                    <h2 style="color: #1e53f9;">Neue Kontaktanfrage - Rudi-Media</h2>
+                    <h2 style="color: #1e53f9;">Neue Kontaktanfrage - {self.site_name}</h2>
                     <p><strong>Name:</strong> {contact_data.name}</p>
                     <p><strong>E-Mail:</strong> {contact_data.email}</p>
                     {f'<p><strong>Telefon:</strong> {contact_data.phone}</p>' if contact_data.phone else ''}
@@ -155,37 +543,25 @@ class EmailService:
             
             company_message = Mail(
                 from_email=self.sender_email,
-                to_emails="info@rudi-media.de",
+                to_emails=self.notify_email,
                 subject=company_subject,
                 html_content=company_content
             )
             
             # Confirmation email to customer
-            customer_subject = "Ihre Anfrage bei Rudi-Media - Wir melden uns bald!"
+            customer_subject = f"Ihre Anfrage bei {self.site_name} - Wir melden uns bald!"
             customer_content = f"""
             <html>
                 <body style="font-family: Arial, sans-serif; line-height: 1.6;">
                     <h2 style="color: #1e53f9;">Vielen Dank für Ihre Anfrage!</h2>
                     <p>Hallo {contact_data.name},</p>
-                    <p>vielen Dank für Ihr Interesse an Rudi-Media. Wir haben Ihre Nachricht erhalten und werden uns schnellstmöglich bei Ihnen melden.</p>
+                    <p>vielen Dank für Ihr Interesse an {self.site_name}. Wir haben Ihre Nachricht erhalten und werden uns schnellstmöglich bei Ihnen melden.</p>
                     
                     <div style="background-color: #f8f9ff; padding: 20px; border-radius: 8px; margin: 20px 0;">
                         <h3 style="color: #1e53f9; margin-top: 0;">Ihre Nachricht:</h3>
                         <p style="margin-bottom: 0;">{contact_data.message}</p>
                     </div>
-                    
-                    <p>In der Zwischenzeit können Sie uns auch direkt über WhatsApp kontaktieren:</p>
-                    <p><a href="https://wa.me/4915222539425" style="color: #25D366; text-decoration: none; font-weight: bold;">📱 +49 1522 2539425</a></p>
-                    
-                    <hr style="border: none; border-top: 1px solid #eee; margin: 30px 0;">
-                    <p style="color: #666; font-size: 14px;">
-                        Mit freundlichen Grüßen<br>
-                        <strong>Arjanit Rudi</strong><br>
-                        Rudi-Media<br>
-                        Kampenwandstr. 2, 85586 Poing<br>
-                        Tel: +49 1522 2539425<br>
-                        Web: rudimedia.de
-                    </p>
+                    {self.footer_html}
                 </body>
             </html>
             """
@@ -209,77 +585,2704 @@ class EmailService:
             logging.error(f"Email sending failed: {str(e)}")
             return False
 
-email_service = EmailService()
+email_service = TenantScoped(EmailService)
+
+# Cache invalidation
+class InvalidationBus:
+    """Deliver invalidation events for blog_posts and admin_users to in-process subscribers.
+
+    Events come from a MongoDB change stream, so writes made by any instance
+    reach every instance. The resume token is persisted in db.cache_state,
+    which lets a restarted watcher pick up where it stopped. Without change
+    streams (standalone mongod) the bus polls per-collection version counters
+    that every local write bumps, and publishes a "flush" event when one moves.
+    """
+    def __init__(self, mode: str = CACHE_INVALIDATION_MODE):
+        self.requested_mode = mode
+        self.mode: Optional[str] = None
+        self.running = False
+        self._subscribers: List[Callable[[InvalidationEvent], None]] = []
+        self._resume_token = None
+        self._task: Optional[asyncio.Task] = None
+
+    def subscribe(self, callback: Callable[[InvalidationEvent], None]):
+        self._subscribers.append(callback)
+
+    def publish(self, event: InvalidationEvent):
+        for callback in self._subscribers:
+            try:
+                callback(event)
+            except Exception as e:
+                logging.error(f"Invalidation subscriber failed: {str(e)}")
+
+    async def notify(self, event: InvalidationEvent):
+        """Publish a local write right away and make sure other instances hear about it"""
+        self.publish(event)
+        # Anything but a running change stream (polling, not started yet, maintenance scripts) bumps the counter
+        if self.mode != "change_stream":
+            await db.cache_state.update_one(
+                {"_id": f"version:{event.collection}"},
+                {"$inc": {"value": 1}},
+                upsert=True
+            )
+
+    async def start(self):
+        if self.requested_mode == "off":
+            return
+        self.running = True
+        if self.requested_mode == "poll":
+            self.mode = "poll"
+            self._task = asyncio.create_task(self._poll())
+        else:
+            self.mode = "change_stream"
+            self._task = asyncio.create_task(self._watch())
+        self._task.add_done_callback(self._on_task_done)
+
+    def _on_task_done(self, task: asyncio.Task):
+        # Caches are only safe while events flow; if the watcher dies, stop trusting them
+        self.running = False
+        if not task.cancelled() and task.exception():
+            logging.error(f"Invalidation watcher stopped: {str(task.exception())}")
+        self._flush_all()
+
+    async def stop(self):
+        self.running = False
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+        if self._resume_token is not None:
+            await self._save_resume_token()
+
+    def _flush_all(self):
+        for collection in WATCHED_COLLECTIONS:
+            self.publish(InvalidationEvent(collection=collection, operation="flush"))
+
+    async def _save_resume_token(self):
+        await db.cache_state.update_one(
+            {"_id": "change_stream"},
+            {"$set": {"resume_token": self._resume_token, "updated_at": datetime.now(timezone.utc).isoformat()}},
+            upsert=True
+        )
+
+    @staticmethod
+    def _event_from_change(change: dict) -> InvalidationEvent:
+        collection = change.get("ns", {}).get("coll")
+        operation = change["operationType"]
+        if operation not in ("insert", "update", "replace", "delete") or collection not in WATCHED_COLLECTIONS:
+            return InvalidationEvent(collection=collection or "blog_posts", operation="flush")
+        # Deletes carry no document; subscribers treat an event without keys as "drop everything"
+        document = change.get("fullDocument") or {}
+        return InvalidationEvent(
+            collection=collection,
+            operation=operation,
+            post_id=document.get("id") if collection == "blog_posts" else None,
+            slug=document.get("slug"),
+            published=document.get("published"),
+            publish_at=document.get("publish_at"),
+            username=document.get("username")
+        )
+
+    async def _watch(self):
+        state = await db.cache_state.find_one({"_id": "change_stream"})
+        self._resume_token = state.get("resume_token") if state else None
+        pipeline = [{"$match": {"ns.coll": {"$in": WATCHED_COLLECTIONS}}}]
+        last_saved = time.monotonic()
+        while self.running:
+            try:
+                async with db.watch(pipeline, full_document="updateLookup", resume_after=self._resume_token) as stream:
+                    async for change in stream:
+                        self.publish(self._event_from_change(change))
+                        self._resume_token = stream.resume_token
+                        if time.monotonic() - last_saved >= CACHE_RESUME_TOKEN_INTERVAL:
+                            await self._save_resume_token()
+                            last_saved = time.monotonic()
+            except OperationFailure as e:
+                if e.code == 40573 and self.requested_mode == "auto":
+                    # Change streams need a replica set; a standalone server gets polled instead
+                    logging.info("Change streams unavailable, polling cache version counters instead")
+                    self.mode = "poll"
+                    await self._poll()
+                    return
+                if e.code in (260, 280, 286):
+                    # The resume point fell off the oplog; start over and drop everything cached
+                    logging.warning(f"Change stream cannot resume, restarting: {str(e)}")
+                    self._resume_token = None
+                    self._flush_all()
+                else:
+                    logging.error(f"Change stream failed: {str(e)}")
+                    await asyncio.sleep(1)
+            except PyMongoError as e:
+                logging.error(f"Change stream interrupted: {str(e)}")
+                await asyncio.sleep(1)
+
+    async def _poll(self):
+        versions = None
+        while self.running:
+            try:
+                # A counter that does not exist yet counts as 0, so its first appearance is a change too
+                current = {collection: 0 for collection in WATCHED_COLLECTIONS}
+                async for counter in db.cache_state.find({"_id": {"$in": [f"version:{c}" for c in WATCHED_COLLECTIONS]}}):
+                    current[counter["_id"].split(":", 1)[1]] = counter["value"]
+                if versions is not None:
+                    for collection, value in current.items():
+                        if versions[collection] != value:
+                            self.publish(InvalidationEvent(collection=collection, operation="flush"))
+                versions = current
+            except PyMongoError as e:
+                logging.error(f"Cache version poll failed: {str(e)}")
+                self._flush_all()
+            await asyncio.sleep(CACHE_POLL_INTERVAL)
+
+def create_invalidation_bus(tenant: Tenant) -> InvalidationBus:
+    bus = InvalidationBus()
+    bus.subscribe(invalidate_local_caches)
+    bus.subscribe(publish_scheduler.on_invalidation)
+    bus.subscribe(post_snapshot.on_invalidation)
+    return bus
+
+invalidation_bus = TenantScoped(create_invalidation_bus)
+
+class LocalCache:
+    """Bounded LRU map that is only consulted while the invalidation bus is running.
+
+    Callers take the generation before reading from MongoDB and pass it to
+    put(), so a result read before an invalidation is never cached after it.
+    With change_stream_only the cache also stays off while the bus polls,
+    because polling only sees writes made through notify().
+    """
+    def __init__(self, max_entries: int, change_stream_only: bool = False):
+        self.max_entries = max_entries
+        self.change_stream_only = change_stream_only
+        self.generation = 0
+        self._entries: OrderedDict = OrderedDict()
+
+    @property
+    def active(self) -> bool:
+        if self.change_stream_only and invalidation_bus.mode != "change_stream":
+            return False
+        return invalidation_bus.running
+
+    def get(self, key):
+        if not self.active or key not in self._entries:
+            return None
+        self._entries.move_to_end(key)
+        return self._entries[key]
+
+    def put(self, key, value, generation: int):
+        if not self.active or generation != self.generation:
+            return
+        self._entries[key] = value
+        self._entries.move_to_end(key)
+        if len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def clear(self):
+        self._entries.clear()
+        self.generation += 1
+
+post_cache = TenantScoped(lambda tenant: LocalCache(POST_CACHE_MAX_ENTRIES))
+# Admin accounts are also changed outside the app (deactivated by hand), which only a change stream sees
+admin_cache = TenantScoped(lambda tenant: LocalCache(100, change_stream_only=True))
+
+class PublishScheduler:
+    """Publish scheduled posts when their publish_at time arrives.
+
+    Upcoming publish times live in a min-heap that is loaded once at startup
+    and extended from invalidation events, which cover local writes as well
+    as those of other instances. The task sleeps until the earliest entry is
+    due and then publishes every due post with one update_many. The update
+    only matches posts that are still unpublished and due, so when several
+    instances wake for the same post exactly one of them flips it; stale heap
+    entries (rescheduled or deleted posts) simply match nothing.
+    """
+    MAX_SLEEP = 3600
+
+    def __init__(self):
+        self._heap: List[Tuple[str, str]] = []  # (publish_at, post_id)
+        self._wakeup = asyncio.Event()
+        self._reload = False
+        self._task: Optional[asyncio.Task] = None
+
+    async def start(self):
+        await self._load()
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+
+    async def _load(self):
+        self._reload = False
+        heap = []
+        async for post in db.blog_posts.find(
+            {"published": False, "publish_at": {"$ne": None}},
+            {"_id": 0, "id": 1, "publish_at": 1}
+        ):
+            heap.append((post["publish_at"], post["id"]))
+        heapq.heapify(heap)
+        self._heap = heap
+
+    def schedule(self, post_id: str, publish_at: str):
+        heapq.heappush(self._heap, (publish_at, post_id))
+        if self._heap[0] == (publish_at, post_id):
+            self._wakeup.set()
+
+    def on_invalidation(self, event: InvalidationEvent):
+        if event.collection != "blog_posts":
+            return
+        if event.operation == "flush":
+            # Unknown changes (bulk operations, polling mode): rebuild the heap on the next wakeup
+            self._reload = True
+            self._wakeup.set()
+        elif event.post_id and event.publish_at and event.published is False:
+            self.schedule(event.post_id, event.publish_at)
+
+    async def _run(self):
+        while True:
+            try:
+                if self._reload:
+                    await self._load()
+                self._wakeup.clear()
+                now = format_publish_at(datetime.now(timezone.utc))
+                if not self._heap or self._heap[0][0] > now:
+                    timeout = self.MAX_SLEEP
+                    if self._heap:
+                        due_at = datetime.fromisoformat(self._heap[0][0])
+                        timeout = min(timeout, max((due_at - datetime.now(timezone.utc)).total_seconds(), 0.05))
+                    try:
+                        await asyncio.wait_for(self._wakeup.wait(), timeout=timeout)
+                    except asyncio.TimeoutError:
+                        pass
+                    continue
+                
+                due_ids = []
+                while self._heap and self._heap[0][0] <= now:
+                    due_ids.append(heapq.heappop(self._heap)[1])
+                result = await db.blog_posts.update_many(
+                    {"id": {"$in": due_ids}, "published": False, "publish_at": {"$lte": now}},
+                    {
+                        "$set": {"published": True, "publish_at": None, "updated_at": datetime.now(timezone.utc).isoformat()},
+                        "$inc": {"version": 1}
+                    }
+                )
+                if result.modified_count:
+                    logging.info(f"Published {result.modified_count} scheduled blog post(s)")
+                    await invalidation_bus.notify(InvalidationEvent(collection="blog_posts", operation="flush"))
+            except Exception as e:
+                logging.error(f"Publish scheduler error: {str(e)}")
+                self._reload = True
+                await asyncio.sleep(5)
+
+publish_scheduler = TenantScoped(lambda tenant: PublishScheduler())
+
+def invalidate_local_caches(event: InvalidationEvent):
+    # Writes are rare next to reads, so any change simply drops the whole cache
+    if event.collection == "blog_posts":
+        post_cache.clear()
+    elif event.collection == "admin_users":
+        admin_cache.clear()
+
+async def post_changed(post: Optional[dict] = None, operation: str = "update", post_id: Optional[str] = None):
+    """Announce a local blog post write on the invalidation bus"""
+    post = post or {}
+    await invalidation_bus.notify(InvalidationEvent(
+        collection="blog_posts",
+        operation=operation,
+        post_id=post.get("id", post_id),
+        slug=post.get("slug"),
+        published=post.get("published"),
+        publish_at=post.get("publish_at")
+    ))
+
+# Degraded read mode
+class MongoUnavailable(Exception):
+    """Raised instead of waiting on MongoDB while the read circuit is open"""
+
+class CircuitBreaker:
+    """Fail fast on MongoDB reads after repeated timeouts or driver errors.
+
+    Every read runs under a deadline. After BREAKER_FAILURE_THRESHOLD
+    consecutive failures the circuit opens and reads raise MongoUnavailable
+    immediately; once BREAKER_RESET_TIMEOUT has passed a single trial read is
+    let through, which closes the circuit again on success.
+    """
+    def __init__(self, failure_threshold: int, reset_timeout: float, deadline: float):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.deadline = deadline
+        self.failures = 0
+        self.opened_at: Optional[float] = None
+        self._trial_running = False
+
+    @property
+    def is_open(self) -> bool:
+        return self.opened_at is not None
+
+    async def call(self, read: Callable[[], Any], deadline: Optional[float] = None):
+        trial = False
+        if self.opened_at is not None:
+            if self._trial_running or time.monotonic() - self.opened_at < self.reset_timeout:
+                raise MongoUnavailable()
+            self._trial_running = trial = True
+        try:
+            result = await asyncio.wait_for(read(), timeout=deadline or self.deadline)
+        except (asyncio.TimeoutError, PyMongoError) as e:
+            self.failures += 1
+            if trial or self.failures >= self.failure_threshold:
+                if self.opened_at is None:
+                    logging.error(f"MongoDB reads failing, opening circuit: {type(e).__name__}: {str(e)}")
+                self.opened_at = time.monotonic()
+            raise MongoUnavailable() from e
+        finally:
+            if trial:
+                self._trial_running = False
+        if self.opened_at is not None:
+            logging.info("MongoDB reads recovered, closing circuit")
+        self.failures = 0
+        self.opened_at = None
+        return result
+
+# One circuit per site, so an unreachable database of one site does not cut off the others
+mongo_breaker = TenantScoped(lambda tenant: CircuitBreaker(BREAKER_FAILURE_THRESHOLD, BREAKER_RESET_TIMEOUT, MONGO_READ_TIMEOUT))
+
+class PostSnapshot:
+    """Local SQLite copy of all published posts, served while MongoDB is unreachable.
+
+    The file is rebuilt every POST_SNAPSHOT_INTERVAL seconds and once blog
+    post changes have settled. Each rebuild streams the posts in batches into
+    a temporary file that replaces the old one atomically, so readers never
+    see a half-written snapshot; parsing and writing run in a worker thread.
+    """
+    BATCH_SIZE = 500
+    DEBOUNCE = 5  # Quiet period after the last change before rebuilding
+    MAX_DELAY = 60  # Upper bound for that wait while writes keep coming
+
+    def __init__(self, path: Path, interval: float):
+        self.path = path
+        self.interval = interval
+        self._changed = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+
+    async def start(self):
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+
+    def on_invalidation(self, event: InvalidationEvent):
+        if event.collection == "blog_posts":
+            self._changed.set()
+
+    async def _run(self):
+        while True:
+            try:
+                await self.refresh()
+            except MongoUnavailable:
+                pass  # Keep serving the previous snapshot
+            except Exception as e:
+                logging.error(f"Post snapshot error: {str(e)}")
+            try:
+                await asyncio.wait_for(self._changed.wait(), timeout=self.interval)
+                await self._settle()
+            except asyncio.TimeoutError:
+                pass
+            self._changed.clear()
+
+    async def _settle(self):
+        """Wait until no change came in for DEBOUNCE seconds, so a burst of writes causes a single rebuild"""
+        deadline = time.monotonic() + self.MAX_DELAY
+        while time.monotonic() < deadline:
+            self._changed.clear()
+            try:
+                await asyncio.wait_for(self._changed.wait(), timeout=min(self.DEBOUNCE, deadline - time.monotonic()))
+            except asyncio.TimeoutError:
+                return
+
+    async def refresh(self):
+        taken_at = time.time()
+        cursor = db.blog_posts.find({"published": True}, {"_id": 0}).batch_size(self.BATCH_SIZE)
+        conn = await asyncio.to_thread(self._create)
+        try:
+            while True:
+                # Each batch runs under the normal read deadline, however many posts there are
+                posts = await mongo_breaker.call(lambda: cursor.to_list(self.BATCH_SIZE))
+                if not posts:
+                    break
+                await asyncio.to_thread(self._insert, conn, posts)
+            await asyncio.to_thread(self._commit, conn, taken_at)
+        except BaseException:
+            await asyncio.to_thread(self._discard, conn)
+            raise
+
+    def _tmp_path(self) -> Path:
+        return self.path.with_name(f"{self.path.name}.{os.getpid()}.tmp")
+
+    def _create(self) -> sqlite3.Connection:
+        tmp_path = self._tmp_path()
+        tmp_path.unlink(missing_ok=True)
+        # Used from one worker thread at a time, but not always the same one
+        conn = sqlite3.connect(tmp_path, check_same_thread=False)
+        conn.execute("CREATE TABLE posts (id TEXT PRIMARY KEY, slug TEXT, created_at TEXT, data TEXT)")
+        conn.execute("CREATE INDEX posts_slug ON posts (slug)")
+        conn.execute("CREATE INDEX posts_created_at ON posts (created_at)")
+        conn.execute("CREATE TABLE meta (key TEXT PRIMARY KEY, value TEXT)")
+        return conn
+
+    def _insert(self, conn: sqlite3.Connection, posts: List[dict]):
+        rows = [
+            (post.id, post.slug, post.created_at.isoformat(), post.json())
+            for post in (BlogPost(**parse_from_mongo(post)) for post in posts)
+        ]
+        conn.executemany("INSERT INTO posts VALUES (?, ?, ?, ?)", rows)
+
+    def _commit(self, conn: sqlite3.Connection, taken_at: float):
+        try:
+            conn.execute("INSERT INTO meta VALUES ('taken_at', ?)", (str(taken_at),))
+            conn.commit()
+        finally:
+            conn.close()
+        os.replace(self._tmp_path(), self.path)
+
+    def _discard(self, conn: sqlite3.Connection):
+        conn.close()
+        self._tmp_path().unlink(missing_ok=True)
+
+    def _read(self, where: str, params: tuple, limit: int) -> Tuple[List[BlogPost], float]:
+        if not self.path.exists():
+            raise HTTPException(status_code=503, detail="Blog ist vorübergehend nicht verfügbar")
+        conn = sqlite3.connect(f"file:{self.path}?mode=ro", uri=True)
+        try:
+            taken_at = float(conn.execute("SELECT value FROM meta WHERE key = 'taken_at'").fetchone()[0])
+            rows = conn.execute(f"SELECT data FROM posts {where} ORDER BY created_at DESC LIMIT ?", (*params, limit)).fetchall()
+        finally:
+            conn.close()
+        return [BlogPost(**json.loads(row[0])) for row in rows], taken_at
+
+    async def read(self, response: Response, where: str = "", params: tuple = (), limit: Optional[int] = None) -> List[BlogPost]:
+        """Read posts from the snapshot and mark the response as stale"""
+        posts, taken_at = await asyncio.to_thread(self._read, where, params, limit or -1)
+        age = max(int(time.time() - taken_at), 0)
+        response.headers["X-Snapshot-Age"] = str(age)
+        response.headers["Warning"] = '110 - "Response is Stale"'
+        response.headers["Cache-Control"] = "no-store"
+        return posts
+
+    async def get(self, response: Response, column: str, value: str) -> BlogPost:
+        posts = await self.read(response, f"WHERE {column} = ?", (value,), limit=1)
+        if not posts:
+            raise HTTPException(status_code=404, detail="Blog post nicht gefunden")
+        return posts[0]
+
+post_snapshot = TenantScoped(lambda tenant: PostSnapshot(tenant_path(POST_SNAPSHOT_PATH, tenant), POST_SNAPSHOT_INTERVAL))
+
+# Authentication functions
+def verify_password(plain_password, hashed_password):
+    return pwd_context.verify(plain_password, hashed_password)
+
+def get_password_hash(password):
+    return pwd_context.hash(password)
+
+def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
+    to_encode = data.copy()
+    if expires_delta:
+        expire = datetime.now(timezone.utc) + expires_delta
+    else:
+        expire = datetime.now(timezone.utc) + timedelta(minutes=15)
+    to_encode.update({"exp": expire})
+    encoded_jwt = jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
+    return encoded_jwt
+
+async def get_admin_from_token(token: Optional[str], scope: Optional[str] = None) -> Optional[AdminUser]:
+    """Resolve a bearer token to an admin user, or None if it is not valid.
+
+    Tokens issued for a single purpose carry a scope claim and are only
+    accepted where that scope is asked for, never as access tokens.
+    """
+    if not token:
+        return None
+    try:
+        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+    except JWTError:
+        return None
+    username: str = payload.get("sub")
+    if username is None or payload.get("scope") != scope:
+        return None
+    # Admins of one site must not be able to use their token on another
+    if payload.get("tenant", DEFAULT_TENANT_ID) != current_tenant.get().id:
+        return None
+    
+    cached = admin_cache.get(username)
+    if cached is not None:
+        return cached if cached.is_active else None
+    generation = admin_cache.generation
+    admin = await db.admin_users.find_one({"username": username})
+    if admin is None:
+        return None
+    admin = AdminUser(**admin)
+    admin_cache.put(username, admin, generation)
+    return admin if admin.is_active else None
+
+async def get_current_admin(credentials: HTTPAuthorizationCredentials = Depends(security)):
+    with span("auth"):
+        admin = await get_admin_from_token(credentials.credentials)
+    if admin is None:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Could not validate credentials",
+            headers={"WWW-Authenticate": "Bearer"},
+        )
+    return admin
+
+def hash_refresh_token(refresh_token: str) -> str:
+    # Refresh tokens are 256 random bits, so a plain SHA-256 is enough; no need for bcrypt here
+    return hashlib.sha256(refresh_token.encode()).hexdigest()
+
+def successor_refresh_token(refresh_token: str) -> str:
+    # Derived instead of random so a racing request with the same old token gets the same successor back
+    digest = hmac.new(SECRET_KEY.encode(), f"refresh:{refresh_token}".encode(), hashlib.sha256).digest()
+    return base64.urlsafe_b64encode(digest).rstrip(b"=").decode()
+
+def token_response(username: str, refresh_token: str) -> dict:
+    access_token = create_access_token(
+        data={"sub": username, "tenant": current_tenant.get().id},
+        expires_delta=timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
+    )
+    return {
+        "access_token": access_token,
+        "token_type": "bearer",
+        "refresh_token": refresh_token,
+        "expires_in": ACCESS_TOKEN_EXPIRE_MINUTES * 60
+    }
+
+async def issue_tokens(username: str, family_id: Optional[str] = None, refresh_token: Optional[str] = None) -> dict:
+    """Create a short-lived access token and a new refresh token in the given (or a new) rotation family"""
+    refresh_token = refresh_token or secrets.token_urlsafe(32)
+    now = datetime.now(timezone.utc)
+    await db.refresh_tokens.insert_one({
+        "_id": hash_refresh_token(refresh_token),
+        "family_id": family_id or str(uuid.uuid4()),
+        "username": username,
+        "created_at": now.isoformat(),
+        "expires_at": now + timedelta(days=REFRESH_TOKEN_EXPIRE_DAYS),
+        "rotated_at": None
+    })
+    return token_response(username, refresh_token)
+
+async def rotate_refresh_token(refresh_token: str) -> Optional[dict]:
+    """Exchange a refresh token for new tokens; every refresh token works exactly once.
+
+    Presenting an already rotated token means it was copied, so the whole
+    family is revoked and the legitimate holder has to log in again. Within
+    REFRESH_TOKEN_REUSE_GRACE seconds of the rotation parallel requests of
+    the same client (e.g. two tabs) race like that, so they get the already
+    issued successor refresh token and a fresh access token instead.
+    """
+    token_hash = hash_refresh_token(refresh_token)
+    now = datetime.now(timezone.utc)
+    token = await db.refresh_tokens.find_one_and_update(
+        {"_id": token_hash, "rotated_at": None, "expires_at": {"$gt": now}},
+        {"$set": {"rotated_at": now}},
+        projection={"family_id": 1, "username": 1}
+    )
+    racing = token is None
+    if racing:
+        token = await db.refresh_tokens.find_one({"_id": token_hash, "rotated_at": {"$ne": None}})
+        if not token:
+            return None
+        rotated_at = token["rotated_at"].replace(tzinfo=timezone.utc)
+        if (now - rotated_at).total_seconds() > REFRESH_TOKEN_REUSE_GRACE:
+            result = await db.refresh_tokens.delete_many({"family_id": token["family_id"]})
+            logging.warning(f"Refresh token reuse for {token['username']}, revoked {result.deleted_count} token(s)")
+            return None
+    
+    admin = await db.admin_users.find_one({"username": token["username"]}, {"is_active": 1})
+    if not admin or not admin.get("is_active", True):
+        await db.refresh_tokens.delete_many({"family_id": token["family_id"]})
+        return None
+    successor = successor_refresh_token(refresh_token)
+    if racing:
+        # The winning request stores the successor; this one only hands it out again
+        return token_response(token["username"], successor)
+    return await issue_tokens(token["username"], token["family_id"], successor)
+
+async def authenticate_admin(username: str, password: str):
+    admin = await db.admin_users.find_one({"username": username})
+    if not admin:
+        return False
+    if not verify_password(password, admin["hashed_password"]):
+        return False
+    return AdminUser(**admin)
+
+# Helper functions
+SLUG_TRANSLITERATIONS = str.maketrans({"ä": "ae", "ö": "oe", "ü": "ue", "ß": "ss"})
+SLUG_BATCH_SIZE = 500
+
+def create_slug(title: str) -> str:
+    """Create URL-friendly ASCII slug from title (ä -> ae, ö -> oe, ü -> ue, ß -> ss)"""
+    slug = title.lower().translate(SLUG_TRANSLITERATIONS)
+    slug = unicodedata.normalize('NFKD', slug).encode('ascii', 'ignore').decode('ascii')
+    slug = re.sub(r'[^a-z0-9\s_-]', '', slug)
+    slug = re.sub(r'[-\s_]+', '-', slug)
+    return slug.strip('-') or 'beitrag'
+
+# HTML processing
+ALLOWED_HTML_TAGS = {
+    "p", "br", "hr", "h1", "h2", "h3", "h4", "h5", "h6", "strong", "b", "em", "i", "u", "s",
+    "sub", "sup", "small", "mark", "span", "div", "ul", "ol", "li", "a", "img", "blockquote",
+    "code", "pre", "figure", "figcaption", "table", "thead", "tbody", "tfoot", "tr", "th", "td",
+}
+ALLOWED_HTML_ATTRIBUTES = {
+    "a": {"href", "title", "target", "rel"},
+    "img": {"src", "alt", "title", "width", "height", "loading"},
+    "th": {"colspan", "rowspan", "scope"},
+    "td": {"colspan", "rowspan"},
+    "ol": {"start"},
+}
+DROPPED_HTML_CONTENT_TAGS = {"script", "style", "iframe", "object", "embed", "noscript", "template", "svg", "math", "head", "title"}
+BLOCK_HTML_TAGS = {
+    "p", "br", "hr", "h1", "h2", "h3", "h4", "h5", "h6", "div", "ul", "ol", "li", "blockquote", "pre",
+    "figure", "figcaption", "table", "thead", "tbody", "tfoot", "tr", "th", "td",
+}
+VOID_HTML_TAGS = {"br", "hr", "img"}
+SAFE_URL_SCHEMES = ("http", "https", "mailto", "tel")
+SAFE_DATA_IMAGE = re.compile(r"^data:image/(png|jpeg|gif|webp);base64,", re.IGNORECASE)
+HTML_WHITESPACE = re.compile(r"[ \t\n\r\f]+")
+
+def is_safe_url(url: str, allow_data_image: bool = False) -> bool:
+    compact = re.sub(r"[\x00-\x20]", "", url).lower()
+    if allow_data_image and SAFE_DATA_IMAGE.match(compact):
+        return True
+    scheme = re.match(r"^([a-z][a-z0-9+.-]*):", compact)
+    return scheme is None or scheme.group(1) in SAFE_URL_SCHEMES
+
+class HTMLSanitizer(HTMLParser):
+    """Rebuild HTML from an allowlist of tags and attributes, collapsing insignificant whitespace.
+
+    Output is normalized: lowercase tags, double-quoted escaped attributes,
+    balanced tags, no comments, and no whitespace around block elements.
+    """
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.parts: List[str] = []
+        self.open_tags: List[str] = []
+        self.skip_depth = 0
+        self.pre_depth = 0
+        self.after_block = True
+        self.last_was_text = False
+
+    def _emit_tag(self, markup: str, tag: str):
+        if tag in BLOCK_HTML_TAGS and self.last_was_text and not self.pre_depth:
+            self.parts[-1] = self.parts[-1].rstrip(" ")
+            if not self.parts[-1]:
+                self.parts.pop()
+        self.parts.append(markup)
+        self.after_block = tag in BLOCK_HTML_TAGS
+        self.last_was_text = False
+
+    def handle_starttag(self, tag, attrs):
+        if tag in DROPPED_HTML_CONTENT_TAGS:
+            self.skip_depth += 1
+            return
+        if self.skip_depth or tag not in ALLOWED_HTML_TAGS:
+            return
+        if tag == "li" and "li" in self.open_tags:
+            # A new item implies the end of the previous one, unless it starts a nested list
+            last_item = len(self.open_tags) - 1 - self.open_tags[::-1].index("li")
+            if not {"ul", "ol"} & set(self.open_tags[last_item:]):
+                self.handle_endtag("li")
+        allowed = ALLOWED_HTML_ATTRIBUTES.get(tag, set())
+        kept = {}
+        for name, value in attrs:
+            if name not in allowed or value is None:
+                continue
+            if name == "href" and not is_safe_url(value):
+                continue
+            if name == "src" and not is_safe_url(value, allow_data_image=True):
+                continue
+            kept[name] = value
+        if kept.get("target") == "_blank":
+            kept["rel"] = "noopener noreferrer"
+        attributes = "".join(f' {name}="{html.escape(value, quote=True)}"' for name, value in kept.items())
+        self._emit_tag(f"<{tag}{attributes}>", tag)
+        if tag not in VOID_HTML_TAGS:
+            self.open_tags.append(tag)
+            if tag == "pre":
+                self.pre_depth += 1
+
+    def handle_startendtag(self, tag, attrs):
+        if tag in DROPPED_HTML_CONTENT_TAGS:
+            return  # Self-closed, so there is no content to skip
+        self.handle_starttag(tag, attrs)
+        if tag not in VOID_HTML_TAGS:
+            self.handle_endtag(tag)
+
+    def handle_endtag(self, tag):
+        if tag in DROPPED_HTML_CONTENT_TAGS:
+            self.skip_depth = max(self.skip_depth - 1, 0)
+            return
+        if self.skip_depth or tag not in self.open_tags:
+            return
+        while self.open_tags:
+            open_tag = self.open_tags.pop()
+            # Emitted while still inside the pre block, so its trailing whitespace is kept
+            self._emit_tag(f"</{open_tag}>", open_tag)
+            if open_tag == "pre":
+                self.pre_depth -= 1
+            if open_tag == tag:
+                break
+
+    def handle_data(self, data):
+        if self.skip_depth:
+            return
+        if not self.pre_depth:
+            data = HTML_WHITESPACE.sub(" ", data)
+            if self.after_block or (self.last_was_text and self.parts[-1].endswith(" ")):
+                data = data.lstrip(" ")
+        if not data:
+            return
+        self.parts.append(html.escape(data, quote=False))
+        self.after_block = False
+        self.last_was_text = True
+
+    def result(self) -> str:
+        self.close()
+        while self.open_tags:
+            self.handle_endtag(self.open_tags[-1])
+        return "".join(self.parts).strip()
+
+def sanitize_html(content: str) -> str:
+    """Sanitize and minify post HTML once at write time"""
+    sanitizer = HTMLSanitizer()
+    sanitizer.feed(content)
+    return sanitizer.result()
+
+def process_post_content(data: dict) -> dict:
+    """Normalize write-time derived fields of a post before it is stored"""
+    if isinstance(data.get("content"), str):
+        data["content"] = sanitize_html(data["content"])
+    return data
+
+def is_duplicate_slug(error: DuplicateKeyError) -> bool:
+    return "slug" in (error.details or {}).get("keyPattern", {})
+
+# Sites whose unique slug index could not be created at startup. Slug allocation
+# relies on that index to break ties, so writes there are refused instead of
+# silently storing duplicate slugs.
+slug_index_missing: Set[str] = set()
+
+def require_slug_index():
+    if current_tenant.get().id in slug_index_missing:
+        raise HTTPException(status_code=503, detail="Beiträge können vorübergehend nicht gespeichert werden")
+
+async def allocate_slugs(bases: List[str], exclude_id: Optional[str] = None) -> List[str]:
+    """Resolve free slugs for a batch of base slugs with one query per SLUG_BATCH_SIZE distinct bases.
+
+    Taken slugs get deterministic -2, -3, ... suffixes; duplicates within the
+    batch are resolved against each other as well. The unique index on slug
+    remains the final arbiter, so callers retry on DuplicateKeyError.
+    """
+    distinct_bases = list(dict.fromkeys(bases))
+    taken = set()
+    for start in range(0, len(distinct_bases), SLUG_BATCH_SIZE):
+        chunk = distinct_bases[start:start + SLUG_BATCH_SIZE]
+        query = {"slug": {"$regex": "^(" + "|".join(re.escape(base) for base in chunk) + ")(-[0-9]+)?$"}}
+        if exclude_id:
+            query["id"] = {"$ne": exclude_id}
+        taken.update(await db.blog_posts.distinct("slug", query))
+    
+    slugs = []
+    for base in bases:
+        slug, suffix = base, 1
+        while slug in taken:
+            suffix += 1
+            slug = f"{base}-{suffix}"
+        taken.add(slug)
+        slugs.append(slug)
+    return slugs
+
+async def insert_post_with_unique_slug(post_obj: BlogPost) -> BlogPost:
+    """Insert a post in one round trip, moving to the next free slug only if the unique index rejects it"""
+    require_slug_index()
+    base = post_obj.slug
+    while True:
+        mongo_data = prepare_for_mongo(post_obj.dict())
+        try:
+            await db.blog_posts.insert_one(mongo_data)
+            break
+        except DuplicateKeyError as e:
+            if not is_duplicate_slug(e):
+                raise
+            post_obj.slug = (await allocate_slugs([base]))[0]
+    await post_changed(mongo_data, operation="insert")
+    return post_obj
+
+def parse_if_match(if_match: Optional[str]) -> Optional[int]:
+    """Extract the expected post version from an If-Match header ("3", "\"3\"" or W/"3")"""
+    if if_match is None or if_match.strip() == "*":
+        return None
+    value = if_match.strip()
+    if value.startswith("W/"):
+        value = value[2:]
+    value = value.strip('"')
+    if not value.isdigit():
+        raise HTTPException(status_code=400, detail="Invalid If-Match header")
+    return int(value)
+
+async def apply_post_update(post_id: str, update_data: dict, expected_version: Optional[int] = None) -> dict:
+    """Update a post with a single find_one_and_update and return the updated document.
+
+    With expected_version the write only applies if nobody else changed the
+    post in the meantime (412 otherwise). A new slug that collides with
+    another post moves to the next free -N suffix.
+    """
+    update_data = prepare_for_mongo(apply_publish_schedule(update_data))
+    query = {"id": post_id}
+    if expected_version is not None:
+        query["version"] = expected_version
+    base = update_data.get("slug")
+    if base:
+        require_slug_index()
+    while True:
+        try:
+            # The previous state feeds the revision history; the new one follows from the update itself
+            previous_post = await db.blog_posts.find_one_and_update(
+                query,
+                {"$set": update_data, "$inc": {"version": 1}},
+                projection={"_id": 0},
+                return_document=ReturnDocument.BEFORE
+            )
+            break
+        except DuplicateKeyError as e:
+            if not base or not is_duplicate_slug(e):
+                raise
+            update_data["slug"] = (await allocate_slugs([base], exclude_id=post_id))[0]
+    
+    if previous_post is None:
+        # Only the failure path pays for telling a stale version from a missing post
+        if expected_version is not None and await db.blog_posts.count_documents({"id": post_id}, limit=1):
+            raise HTTPException(
+                status_code=status.HTTP_412_PRECONDITION_FAILED,
+                detail="Blog post wurde zwischenzeitlich geändert. Bitte neu laden."
+            )
+        raise HTTPException(status_code=404, detail="Blog post nicht gefunden")
+    updated_post = {**previous_post, **update_data, "version": previous_post.get("version", 0) + 1}
+    await save_post_revision(previous_post, updated_post)
+    await post_changed(updated_post)
+    return updated_post
+
+PATCHABLE_POST_FIELDS = list(BlogPostCreate.model_fields)
+
+def unescape_json_pointer(path: str) -> List[str]:
+    if not path.startswith("/"):
+        raise HTTPException(status_code=422, detail=f"Invalid JSON pointer: {path}")
+    return [token.replace("~1", "/").replace("~0", "~") for token in path[1:].split("/")]
+
+def resolve_json_pointer(document: dict, path: str, for_add: bool = False) -> Tuple[Any, Union[str, int]]:
+    """Return the container and key a JSON pointer refers to"""
+    tokens = unescape_json_pointer(path)
+    if tokens[0] not in PATCHABLE_POST_FIELDS:
+        raise HTTPException(status_code=422, detail=f"Field cannot be patched: {tokens[0]}")
+    container = document
+    for depth, token in enumerate(tokens):
+        last = depth == len(tokens) - 1
+        if isinstance(container, dict):
+            key = token
+            if not last or not for_add:
+                if key not in container:
+                    raise HTTPException(status_code=422, detail=f"Path not found: {path}")
+        elif isinstance(container, list):
+            if last and for_add and token == "-":
+                key = len(container)
+            elif token.isdigit() and int(token) < len(container) + (1 if last and for_add else 0):
+                key = int(token)
+            else:
+                raise HTTPException(status_code=422, detail=f"Path not found: {path}")
+        else:
+            raise HTTPException(status_code=422, detail=f"Path not found: {path}")
+        if last:
+            return container, key
+        container = container[key]
+
+def json_patch_remove(document: dict, path: str) -> Any:
+    container, key = resolve_json_pointer(document, path)
+    return container.pop(key)
+
+def json_patch_add(document: dict, path: str, value: Any):
+    container, key = resolve_json_pointer(document, path, for_add=True)
+    if isinstance(container, list):
+        container.insert(key, value)
+    else:
+        container[key] = value
+
+def apply_json_patch(document: dict, operations: List[JsonPatchOperation]) -> dict:
+    """Apply RFC 6902 operations to a copy of document"""
+    document = copy.deepcopy(document)
+    for operation in operations:
+        has_value = "value" in operation.model_fields_set
+        if operation.op in ("add", "replace", "test") and not has_value:
+            raise HTTPException(status_code=422, detail=f"'{operation.op}' requires a value")
+        if operation.op in ("move", "copy") and operation.from_ is None:
+            raise HTTPException(status_code=422, detail=f"'{operation.op}' requires from")
+        
+        if operation.op == "add":
+            json_patch_add(document, operation.path, operation.value)
+        elif operation.op == "remove":
+            json_patch_remove(document, operation.path)
+        elif operation.op == "replace":
+            container, key = resolve_json_pointer(document, operation.path)
+            container[key] = operation.value
+        elif operation.op == "move":
+            json_patch_add(document, operation.path, json_patch_remove(document, operation.from_))
+        elif operation.op == "copy":
+            container, key = resolve_json_pointer(document, operation.from_)
+            json_patch_add(document, operation.path, copy.deepcopy(container[key]))
+        elif operation.op == "test":
+            container, key = resolve_json_pointer(document, operation.path)
+            if container[key] != operation.value:
+                raise HTTPException(status_code=409, detail=f"Test failed at {operation.path}")
+    return document
+
+def apply_text_delta(text: str, delta: List[List[Union[int, str]]]) -> str:
+    """Apply a [[0, keep], [-1, delete], [1, insert]] delta to text"""
+    parts = []
+    position = 0
+    for step in delta:
+        if len(step) != 2:
+            raise HTTPException(status_code=422, detail="Invalid text delta")
+        kind, argument = step
+        if kind == 1 and isinstance(argument, str):
+            parts.append(argument)
+        elif kind in (0, -1) and isinstance(argument, int) and 0 <= argument <= len(text) - position:
+            if kind == 0:
+                parts.append(text[position:position + argument])
+            position += argument
+        else:
+            raise HTTPException(status_code=422, detail="Invalid text delta")
+    if position != len(text):
+        raise HTTPException(status_code=422, detail="Text delta does not match the base version")
+    return "".join(parts)
+
+# Revision history
+def compute_text_delta(new_text: str, old_text: str) -> List[List[Union[int, str]]]:
+    """Delta that turns new_text back into old_text, in the format apply_text_delta understands"""
+    delta = []
+    for tag, i1, i2, j1, j2 in difflib.SequenceMatcher(None, new_text, old_text).get_opcodes():
+        if tag == "equal":
+            delta.append([0, i2 - i1])
+            continue
+        if i2 > i1:
+            delta.append([-1, i2 - i1])
+        if j2 > j1:
+            delta.append([1, old_text[j1:j2]])
+    return delta
+
+def compress_revision(data: dict) -> bytes:
+    return zlib.compress(json.dumps(data, ensure_ascii=False, separators=(",", ":")).encode(), 6)
+
+def decompress_revision(data: bytes) -> dict:
+    return json.loads(zlib.decompress(data))
+
+async def save_post_revision(previous_post: dict, updated_post: dict):
+    """Store how to get from updated_post back to previous_post.
+
+    Usually this is a reverse delta of the changed fields (text fields as
+    character deltas); every REVISION_SNAPSHOT_INTERVAL versions a full
+    snapshot is stored instead, which bounds reconstruction work.
+    """
+    version = previous_post.get("version", 1)
+    changed_fields = sorted(
+        field for field in set(previous_post) | set(updated_post)
+        if field not in ("version", "updated_at") and previous_post.get(field) != updated_post.get(field)
+    )
+    if version % REVISION_SNAPSHOT_INTERVAL == 0:
+        kind, payload = "snapshot", previous_post
+    else:
+        kind, payload = "delta", {}
+        for field in changed_fields + ["updated_at"]:
+            old_value, new_value = previous_post.get(field), updated_post.get(field)
+            if isinstance(old_value, str) and isinstance(new_value, str) and len(old_value) > 200:
+                payload[field] = ["delta", compute_text_delta(new_value, old_value)]
+            else:
+                payload[field] = ["set", old_value]
+    data = compress_revision(payload)
+    try:
+        await db.post_revisions.insert_one({
+            "post_id": previous_post["id"],
+            "version": version,
+            "kind": kind,
+            "changed_fields": changed_fields,
+            "size": len(data),
+            "data": data,
+            "created_at": datetime.now(timezone.utc).isoformat()
+        })
+    except Exception as e:
+        # History is best effort; the update itself has already been applied
+        logging.error(f"Saving revision {version} of post {previous_post['id']} failed: {str(e)}")
+
+async def delete_post_revisions(post_ids: List[str]):
+    """Drop the history of deleted posts"""
+    try:
+        await db.post_revisions.delete_many({"post_id": {"$in": post_ids}})
+    except Exception as e:
+        logging.error(f"Deleting revisions of posts {post_ids} failed: {str(e)}")
+
+def revert_post_delta(post: dict, delta: dict) -> dict:
+    post = dict(post)
+    for field, (kind, value) in delta.items():
+        post[field] = apply_text_delta(post.get(field) or "", value) if kind == "delta" else value
+    return post
+
+async def reconstruct_post_revision(post_id: str, version: int) -> dict:
+    """Rebuild a post as it was at the given version.
+
+    Starts from the nearest snapshot at or above the version (or from the
+    current post if there is none) and walks reverse deltas downwards.
+    Versions written by bulk operations or the publish scheduler carry no
+    revision; a version below such a gap cannot be rebuilt and gives 409
+    rather than a post with the wrong content.
+    """
+    current = await db.blog_posts.find_one({"id": post_id}, {"_id": 0})
+    if not current:
+        raise HTTPException(status_code=404, detail="Blog post nicht gefunden")
+    if version == current.get("version", 1):
+        return current
+    if version < 1 or version > current.get("version", 1):
+        raise HTTPException(status_code=404, detail="Revision not found")
+    
+    deltas = []
+    post = current
+    start_version = current.get("version", 1)
+    revisions = db.post_revisions.find({"post_id": post_id, "version": {"$gte": version}}).sort("version", 1)
+    async for revision in revisions.batch_size(REVISION_SNAPSHOT_INTERVAL):
+        if revision["version"] == version and revision["kind"] == "snapshot":
+            return decompress_revision(revision["data"])
+        if revision["kind"] == "snapshot":
+            post = decompress_revision(revision["data"])
+            start_version = revision["version"]
+            break
+        deltas.append(revision)
+    if not deltas or deltas[0]["version"] != version:
+        raise HTTPException(status_code=404, detail="Revision not found")
+    # Each delta leads exactly one version down, so the chain must not skip any
+    missing = sorted(set(range(version, start_version)) - {revision["version"] for revision in deltas})
+    if missing:
+        raise HTTPException(
+            status_code=409,
+            detail=f"Revision {version} cannot be reconstructed: version {missing[-1]} was written without history"
+        )
+    
+    for revision in reversed(deltas):
+        post = revert_post_delta(post, decompress_revision(revision["data"]))
+    post["version"] = version
+    return post
+
+def tag_merge_pipeline(from_tags: List[str], to_tag: str) -> List[dict]:
+    """Update pipeline replacing from_tags with to_tag, keeping tag order and dropping duplicates"""
+    return [{"$set": {"tags": {"$reduce": {
+        "input": {"$map": {
+            "input": "$tags",
+            "as": "tag",
+            "in": {"$cond": [{"$in": ["$$tag", from_tags]}, to_tag, "$$tag"]},
+        }},
+        "initialValue": [],
+        "in": {"$cond": [
+            {"$in": ["$$this", "$$value"]},
+            "$$value",
+            {"$concatArrays": ["$$value", ["$$this"]]},
+        ]},
+    }}}}]
+
+def format_publish_at(value: datetime) -> str:
+    """UTC ISO timestamp at whole seconds, so stored publish times compare correctly as strings"""
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=timezone.utc)
+    return value.astimezone(timezone.utc).isoformat(timespec='seconds')
+
+def apply_publish_schedule(data: dict) -> dict:
+    """Keep a post unpublished while its publish_at lies in the future; publishing it clears the schedule"""
+    publish_at = data.get('publish_at')
+    if isinstance(publish_at, datetime):
+        publish_at = format_publish_at(publish_at)
+    if publish_at and publish_at > format_publish_at(datetime.now(timezone.utc)):
+        data['published'] = False
+    elif data.get('published') is True:
+        data['publish_at'] = None
+    return data
+
+def prepare_for_mongo(data: dict) -> dict:
+    """Prepare data for MongoDB storage"""
+    if isinstance(data.get('created_at'), datetime):
+        data['created_at'] = data['created_at'].isoformat()
+    if isinstance(data.get('updated_at'), datetime):
+        data['updated_at'] = data['updated_at'].isoformat()
+    if isinstance(data.get('publish_at'), datetime):
+        data['publish_at'] = format_publish_at(data['publish_at'])
+    return data
+
+def parse_from_mongo(item: dict) -> dict:
+    """Parse data from MongoDB"""
+    if isinstance(item.get('created_at'), str):
+        item['created_at'] = datetime.fromisoformat(item['created_at'])
+    if isinstance(item.get('updated_at'), str):
+        item['updated_at'] = datetime.fromisoformat(item['updated_at'])
+    if isinstance(item.get('publish_at'), str):
+        item['publish_at'] = datetime.fromisoformat(item['publish_at'])
+    return item
+
+def contact_stats_hour(created_at: str) -> Tuple[str, int]:
+    """Map a contact's UTC timestamp to its local date and hour of day"""
+    local = datetime.fromisoformat(created_at).astimezone(STATS_ZONE)
+    return local.date().isoformat(), local.hour
+
+def contact_stats_totals(hour_counts: Dict[Tuple[str, int], int]) -> Dict[str, Counter]:
+    """Fold counts per (local date, hour) into the day, week, month and overall rollups they belong to"""
+    totals: Dict[str, Counter] = {}
+    for (day, hour), count in hour_counts.items():
+        day_date = datetime.fromisoformat(day).date()
+        bucket_ids = [
+            f"day:{day}",
+            f"week:{(day_date - timedelta(days=day_date.weekday())).isoformat()}",
+            f"month:{day_date.replace(day=1).isoformat()}",
+            "all"
+        ]
+        for bucket_id in bucket_ids:
+            counter = totals.setdefault(bucket_id, Counter())
+            counter["count"] += count
+            counter[f"hours.{hour}"] += count
+    return totals
+
+def contact_stats_since(today: date, days: int, weeks: int, months: int) -> Dict[str, date]:
+    """Start of the oldest day, week and month bucket to show; the current bucket counts as the first"""
+    first_month = today.year * 12 + today.month - months
+    return {
+        "day": today - timedelta(days=days - 1),
+        "week": today - timedelta(days=today.weekday(), weeks=weeks - 1),
+        "month": today.replace(year=first_month // 12, month=first_month % 12 + 1, day=1)
+    }
+
+async def record_contact_stats(contacts: List[dict]):
+    """Add newly stored contacts to the rollups with one bulk write; never fails the caller"""
+    if not contacts:
+        return
+    hour_counts = Counter(contact_stats_hour(contact["created_at"]) for contact in contacts)
+    writes = []
+    for bucket_id, counter in contact_stats_totals(hour_counts).items():
+        period, _, start = bucket_id.partition(":")
+        writes.append(UpdateOne(
+            {"_id": bucket_id},
+            {"$inc": dict(counter), "$setOnInsert": {"period": period, "start": start}},
+            upsert=True
+        ))
+    try:
+        await db.contact_stats.bulk_write(writes, ordered=False)
+    except PyMongoError as e:
+        logging.error(f"Contact stats update failed: {str(e)}")
+
+async def rebuild_contact_stats() -> int:
+    """Recompute all rollups from db.contacts with one aggregation; returns the number of contacts counted
+
+    Counts are grouped per local date and hour on the server, so only a few
+    thousand small documents come back regardless of the number of contacts.
+    Submissions arriving while the rebuild runs can be counted twice or not at
+    all, so run it while the contact form is quiet.
+    """
+    pipeline = [
+        {"$project": {"at": {"$dateFromString": {
+            "dateString": {"$substrBytes": ["$created_at", 0, 19]},
+            "format": "%Y-%m-%dT%H:%M:%S",
+            "timezone": "UTC"
+        }}}},
+        {"$group": {
+            "_id": {
+                "day": {"$dateToString": {"date": "$at", "format": "%Y-%m-%d", "timezone": STATS_TIMEZONE}},
+                "hour": {"$hour": {"date": "$at", "timezone": STATS_TIMEZONE}}
+            },
+            "count": {"$sum": 1}
+        }}
+    ]
+    hour_counts = {}
+    async for row in db.contacts.aggregate(pipeline, allowDiskUse=True):
+        hour_counts[(row["_id"]["day"], row["_id"]["hour"])] = row["count"]
+    totals = contact_stats_totals(hour_counts)
+    writes = []
+    for bucket_id, counter in totals.items():
+        period, _, start = bucket_id.partition(":")
+        hours = {f"hours.{hour}": counter[f"hours.{hour}"] for hour in range(24)}
+        writes.append(UpdateOne(
+            {"_id": bucket_id},
+            {"$set": {"period": period, "start": start, "count": counter["count"], **hours}},
+            upsert=True
+        ))
+    await db.contact_stats.delete_many({"_id": {"$nin": list(totals)}})
+    if writes:
+        await db.contact_stats.bulk_write(writes, ordered=False)
+    return sum(hour_counts.values())
+
+def encode_contact_cursor(contact: dict) -> str:
+    """Opaque cursor pointing just past a contact in (created_at, id) descending order"""
+    raw = json.dumps([contact["created_at"], contact["id"]]).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+def decode_contact_cursor(cursor: str) -> dict:
+    """Build the MongoDB filter for the contacts after a cursor"""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        created_at, contact_id = json.loads(raw)
+    except Exception:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    return {"$or": [
+        {"created_at": {"$lt": created_at}},
+        {"created_at": created_at, "id": {"$lt": contact_id}},
+    ]}
+
+def csv_safe(value) -> str:
+    """Stringify a CSV cell and defuse spreadsheet formulas in user-supplied text"""
+    if value is None:
+        return ""
+    value = str(value)
+    if value[:1] in ("=", "+", "-", "@", "\t", "\r"):
+        return "'" + value
+    return value
+
+# Rate limiting
+class TokenBucketRateLimiter:
+    """In-process token buckets keyed by route and client.
+
+    Buckets live in an LRU-ordered dict capped at max_keys entries, so memory
+    stays fixed no matter how many clients show up. Buckets that have refilled
+    completely carry no state and are swept out periodically.
+    """
+    def __init__(self, max_keys: int = RATE_LIMIT_MAX_KEYS, sweep_interval: float = RATE_LIMIT_SWEEP_INTERVAL):
+        self.max_keys = max_keys
+        self.sweep_interval = sweep_interval
+        self._buckets: "OrderedDict[str, Tuple[float, float, float]]" = OrderedDict()  # key -> (tokens, updated, period)
+        self._last_sweep = time.monotonic()
+
+    async def hit(self, key: str, capacity: int, period: float) -> float:
+        """Take one token; return 0 if allowed, otherwise the seconds until a token is available"""
+        now = time.monotonic()
+        rate = capacity / period
+        tokens, updated, _ = self._buckets.pop(key, (capacity, now, period))
+        tokens = min(capacity, tokens + (now - updated) * rate)
+        if tokens >= 1:
+            tokens -= 1
+            retry_after = 0.0
+        else:
+            retry_after = (1 - tokens) / rate
+        self._buckets[key] = (tokens, now, period)
+
+        if len(self._buckets) > self.max_keys:
+            self._buckets.popitem(last=False)
+        if now - self._last_sweep >= self.sweep_interval:
+            self._sweep(now)
+        return retry_after
+
+    def _sweep(self, now: float):
+        # Least recently used buckets come first; stop at the first one still refilling
+        self._last_sweep = now
+        while self._buckets:
+            key, (_, updated, period) = next(iter(self._buckets.items()))
+            if now - updated < period:
+                break
+            del self._buckets[key]
+
+class MongoRateLimiter:
+    """Fixed-window counters in MongoDB, shared by every instance of the deployment"""
+    async def hit(self, key: str, capacity: int, period: float) -> float:
+        now = time.time()
+        window = int(now // period)
+        window_end = (window + 1) * period
+        counter = await db.rate_limits.find_one_and_update(
+            {"_id": f"{key}:{window}"},
+            {
+                "$inc": {"count": 1},
+                "$setOnInsert": {"expires_at": datetime.fromtimestamp(window_end, timezone.utc)},
+            },
+            upsert=True,
+            return_document=ReturnDocument.AFTER,
+        )
+        if counter["count"] > capacity:
+            return window_end - now
+        return 0.0
+
+rate_limiter = MongoRateLimiter() if RATE_LIMIT_BACKEND == "mongo" else TokenBucketRateLimiter()
+
+def parse_rate_limit(spec: str) -> Tuple[int, float]:
+    """Parse a "<requests>/<seconds>" rate limit"""
+    requests, _, seconds = spec.partition("/")
+    return int(requests), float(seconds)
+
+def get_client_ip(request: Request) -> str:
+    """Client address as seen by the outermost trusted proxy; clients can prepend arbitrary X-Forwarded-For entries"""
+    if TRUSTED_PROXY_HOPS:
+        forwarded_for = [entry.strip() for entry in request.headers.get("x-forwarded-for", "").split(",") if entry.strip()]
+        if forwarded_for:
+            return forwarded_for[-min(TRUSTED_PROXY_HOPS, len(forwarded_for))]
+    return request.client.host if request.client else "unknown"
+
+def rate_limit(route: str, spec: str):
+    """Dependency that rejects a client with 429 once it exceeds the route's rate limit"""
+    capacity, period = parse_rate_limit(spec)
+
+    async def check_rate_limit(request: Request):
+        key = f"{current_tenant.get().id}:{route}:{get_client_ip(request)}"
+        try:
+            retry_after = await rate_limiter.hit(key, capacity, period)
+        except Exception as e:
+            # Fail open: an unavailable shared store must not take the endpoint down
+            logging.error(f"Rate limiter error: {str(e)}")
+            return
+        if retry_after > 0:
+            raise HTTPException(
+                status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+                detail="Zu viele Anfragen. Bitte versuchen Sie es später erneut.",
+                headers={"Retry-After": str(math.ceil(retry_after))},
+            )
+
+    return check_rate_limit
+
+# Contact ingestion buffer
+class ContactIngestBuffer:
+    """Acknowledge contact submissions after a durable local append and write them to MongoDB in batches.
+
+    Every submission is appended to a spool segment on disk and fsynced before
+    the request returns; concurrent submissions share one fsync. A background
+    task flushes the pending documents with an unordered insert_many as soon as
+    a batch is full or the flush interval has passed, and deletes the spool
+    segments once MongoDB has them. Segments left over from a crash are
+    replayed on start; the unique index on contacts.id makes replays idempotent.
+
+    Each process spools into its own worker-* subdirectory and holds an
+    exclusive lock on it while running, so with several workers a starting
+    process only recovers directories whose owner has exited. Submissions
+    MongoDB keeps rejecting go to dead-letter.ndjson after max_attempts.
+    """
+    def __init__(self, spool_dir: Path, batch_size: int, flush_interval: float, max_attempts: int = CONTACT_MAX_ATTEMPTS):
+        self.spool_dir = Path(spool_dir)
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_attempts = max_attempts
+        self.running = False
+        self.worker_dir: Optional[Path] = None
+        self._worker_lock = None
+        self._attempts: Dict[str, int] = {}
+        self._inflight: List[dict] = []
+        self._pending: List[dict] = []
+        self._sealed_segments: List[Path] = []
+        self._segment_path: Optional[Path] = None
+        self._segment = None
+        self._written_seq = 0
+        self._synced_seq = 0
+        self._write_lock = asyncio.Lock()
+        self._sync_lock = asyncio.Lock()
+        self._flush_lock = asyncio.Lock()
+        self._batch_ready = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+
+    def _open_segment(self):
+        self._segment_path = self.worker_dir / f"contacts-{time.time_ns()}.ndjson"
+        self._segment = open(self._segment_path, "a", encoding="utf-8")
+
+    def _seal_segment(self):
+        self._segment.flush()
+        os.fsync(self._segment.fileno())
+        self._segment.close()
+
+    def _claim_worker_dir(self):
+        # Locked before it is renamed into view, so no other process can mistake it for an abandoned one
+        name = f"worker-{os.getpid()}-{time.time_ns()}"
+        staging = self.spool_dir / f".{name}"
+        staging.mkdir()
+        self._worker_lock = open(staging / "lock", "w")
+        fcntl.flock(self._worker_lock, fcntl.LOCK_EX)
+        self.worker_dir = self.spool_dir / name
+        staging.rename(self.worker_dir)
+
+    def _recover(self):
+        """Take over the segments of exited workers (and of spools from before per-worker directories)"""
+        for directory in [self.spool_dir, *sorted(self.spool_dir.glob("worker-*"))]:
+            if directory == self.worker_dir:
+                continue
+            lock = None
+            if directory != self.spool_dir:
+                try:
+                    lock = open(directory / "lock", "a")
+                    fcntl.flock(lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                except FileNotFoundError:
+                    continue  # Recovered by another process just now
+                except BlockingIOError:
+                    lock.close()
+                    continue  # Owner is still running
+            for segment_path in sorted(directory.glob("contacts-*.ndjson")):
+                claimed_path = self.worker_dir / segment_path.name
+                try:
+                    # Atomic, so of several processes recovering at once exactly one gets each segment
+                    os.rename(segment_path, claimed_path)
+                except FileNotFoundError:
+                    continue
+                with open(claimed_path, encoding="utf-8") as segment:
+                    for line in segment:
+                        if line.strip():
+                            self._pending.append(json.loads(line))
+                self._sealed_segments.append(claimed_path)
+            if lock is not None:
+                (directory / "lock").unlink(missing_ok=True)
+                try:
+                    directory.rmdir()
+                except OSError:
+                    pass
+                lock.close()
+
+    async def start(self):
+        self.spool_dir.mkdir(parents=True, exist_ok=True)
+        self._claim_worker_dir()
+        self._recover()
+        self._open_segment()
+        self.running = True
+        if self._pending:
+            logging.info(f"Recovered {len(self._pending)} spooled contact submissions")
+            self._batch_ready.set()
+        self._task = asyncio.create_task(self._run())
+
+    async def add(self, document: dict):
+        line = json.dumps(document, ensure_ascii=False) + "\n"
+        async with self._write_lock:
+            self._segment.write(line)
+            self._written_seq += 1
+            seq = self._written_seq
+            self._pending.append(document)
+            if len(self._pending) >= self.batch_size:
+                self._batch_ready.set()
+        await self._sync(seq)
+
+    async def _sync(self, seq: int):
+        # Group commit: a single fsync covers every line written before it started
+        async with self._sync_lock:
+            if self._synced_seq >= seq:
+                return
+            async with self._write_lock:
+                target_seq = self._written_seq
+                self._segment.flush()
+            await asyncio.to_thread(os.fsync, self._segment.fileno())
+            self._synced_seq = target_seq
+
+    async def flush(self):
+        async with self._flush_lock:
+            async with self._sync_lock, self._write_lock:
+                if not self._pending:
+                    return
+                batch, self._pending = self._pending, []
+                await asyncio.to_thread(self._seal_segment)
+                self._synced_seq = self._written_seq
+                self._sealed_segments.append(self._segment_path)
+                segments, self._sealed_segments = self._sealed_segments, []
+                if self.running:
+                    self._open_segment()
+            inserted, rejected = batch, []
+            self._inflight = batch
+            try:
+                await db.contacts.insert_many(batch, ordered=False)
+            except BulkWriteError as e:
+                errors = e.details.get("writeErrors", [])
+                # Replayed documents that were already stored must not be counted again
+                failed = {error["index"] for error in errors}
+                inserted = [contact for index, contact in enumerate(batch) if index not in failed]
+                rejected = [(batch[error["index"]], error) for error in errors if error.get("code") != 11000]
+            except Exception:
+                self._requeue(batch, segments)
+                raise
+            finally:
+                self._inflight = []
+            await record_contact_stats(inserted)
+            for contact in inserted:
+                self._attempts.pop(contact.get("id"), None)
+            if rejected and not self.running:
+                # Draining: the segments stay for the next start, whose replay skips what was stored now
+                self._sealed_segments[:0] = segments
+                raise RuntimeError(f"{len(rejected)} contact submission(s) rejected: {rejected[0][1].get('errmsg')}")
+            if rejected:
+                await self._retry_rejected(rejected)
+            for segment_path in segments:
+                segment_path.unlink(missing_ok=True)
+
+    def spooled(self) -> List[dict]:
+        """Acknowledged submissions that MongoDB does not have yet"""
+        return self._inflight + self._pending
+
+    def _requeue(self, batch: List[dict], segments: List[Path]):
+        # Keep the segments on disk and retry the batch with the next flush
+        self._pending[:0] = batch
+        self._sealed_segments[:0] = segments
+
+    async def _retry_rejected(self, rejected: List[Tuple[dict, dict]]):
+        """Spool rejected documents again, or dead-letter them once they have used up their attempts"""
+        dead = []
+        for contact, error in rejected:
+            attempts = self._attempts.get(contact.get("id"), 0) + 1
+            if attempts < self.max_attempts:
+                self._attempts[contact.get("id")] = attempts
+                await self.add(contact)
+            else:
+                self._attempts.pop(contact.get("id"), None)
+                dead.append({"contact": contact, "error": error.get("errmsg"), "failed_at": datetime.now(timezone.utc).isoformat()})
+        if dead:
+            logging.error(f"{len(dead)} contact submission(s) rejected {self.max_attempts} times, moved to {self.spool_dir / 'dead-letter.ndjson'}")
+            await asyncio.to_thread(self._write_dead_letters, dead)
+
+    def _write_dead_letters(self, entries: List[dict]):
+        with open(self.spool_dir / "dead-letter.ndjson", "a", encoding="utf-8") as dead_letters:
+            fcntl.flock(dead_letters, fcntl.LOCK_EX)
+            for entry in entries:
+                dead_letters.write(json.dumps(entry, ensure_ascii=False, default=str) + "\n")
+            dead_letters.flush()
+            os.fsync(dead_letters.fileno())
+
+    async def _run(self):
+        while True:
+            try:
+                await asyncio.wait_for(self._batch_ready.wait(), timeout=self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._batch_ready.clear()
+            try:
+                await self.flush()
+            except Exception as e:
+                logging.error(f"Contact flush failed: {str(e)}")
+
+    async def drain(self):
+        """Stop the background flusher and write out everything still pending"""
+        if not self.running:
+            return
+        self.running = False
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+        try:
+            await self.flush()
+        except Exception as e:
+            logging.error(f"Contact drain failed, submissions stay spooled in {self.spool_dir}: {str(e)}")
+        if not self._segment.closed:
+            self._segment.close()
+            if self._segment_path.stat().st_size == 0:
+                self._segment_path.unlink(missing_ok=True)
+        if not any(self.worker_dir.glob("contacts-*.ndjson")):
+            (self.worker_dir / "lock").unlink(missing_ok=True)
+            self.worker_dir.rmdir()
+        # Released lock leaves what is still spooled to the next process that starts
+        self._worker_lock.close()
+
+contact_buffer = TenantScoped(
+    lambda tenant: ContactIngestBuffer(tenant_path(CONTACT_SPOOL_DIR, tenant), CONTACT_BATCH_SIZE, CONTACT_FLUSH_INTERVAL)
+)
+
+# Duplicate contact submissions
+CONTACT_IDEMPOTENCY_PENDING_TIMEOUT = 30  # Seconds after which an unconfirmed claim counts as abandoned
+
+def contact_fingerprint(contact_data: ContactFormCreate) -> str:
+    """Hash of the submission with insignificant differences (case, whitespace) normalized away"""
+    fingerprint = "\x1f".join([
+        HTML_WHITESPACE.sub(" ", contact_data.name).strip().lower(),
+        contact_data.email.lower(),
+        HTML_WHITESPACE.sub("", contact_data.phone or ""),
+        HTML_WHITESPACE.sub(" ", contact_data.message).strip()
+    ])
+    return hashlib.sha256(fingerprint.encode()).hexdigest()
+
+def contact_idempotency_key(contact_data: ContactFormCreate, idempotency_key: Optional[str]) -> Tuple[str, int, str]:
+    """Return the dedupe key, its lifetime and the body fingerprint: the client's Idempotency-Key or the fingerprint itself"""
+    fingerprint = contact_fingerprint(contact_data)
+    if idempotency_key:
+        return "key:" + hashlib.sha256(idempotency_key.encode()).hexdigest(), CONTACT_IDEMPOTENCY_TTL, fingerprint
+    return "fp:" + fingerprint, CONTACT_DEDUPE_WINDOW, fingerprint
+
+class ContactIdempotency:
+    """Remember the response to each contact submission so client retries get it back without new work.
+
+    Retries to this instance are answered from a small LRU of confirmed
+    responses and a set of submissions still in progress, without a query.
+    Otherwise the submission claims its key with a single insert into a
+    TTL-indexed collection, which keeps concurrent retries on other instances
+    from both going through. The claim may hold up the request for at most
+    CONTACT_IDEMPOTENCY_TIMEOUT; the response is confirmed in the background
+    once the contact is safely spooled, so MongoDB stays off the request path.
+    A key sent again with a different body is rejected instead of swallowing
+    the new message. Storage errors and timeouts let the submission through:
+    a rare duplicate is better than a lost lead.
+    """
+    def __init__(self, max_entries: int, timeout: float = CONTACT_IDEMPOTENCY_TIMEOUT):
+        self.max_entries = max_entries
+        self.timeout = timeout
+        self._entries: "OrderedDict[str, Tuple[float, str, dict]]" = OrderedDict()  # key -> (expires, fingerprint, response)
+        self._pending: Dict[str, Tuple[float, str]] = {}  # key -> (started, fingerprint) of submissions in progress here
+        self._tasks = set()
+
+    def _remember(self, key: str, fingerprint: str, response: dict, expires: float):
+        self._entries[key] = (expires, fingerprint, response)
+        self._entries.move_to_end(key)
+        if len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    @staticmethod
+    def _replay(fingerprint: str, claimed_fingerprint: str, response: dict) -> dict:
+        if claimed_fingerprint != fingerprint:
+            raise HTTPException(
+                status_code=422,
+                detail="Dieser Idempotency-Key wurde bereits für eine andere Nachricht verwendet."
+            )
+        return response
+
+    @staticmethod
+    def _in_progress() -> HTTPException:
+        return HTTPException(
+            status_code=409,
+            detail="Ihre Nachricht wird bereits verarbeitet.",
+            headers={"Retry-After": "1"}
+        )
+
+    async def claim(self, key: str, ttl: int, fingerprint: str) -> Optional[dict]:
+        """Claim key for this submission; returns the original response if the submission was already stored"""
+        cached = self._entries.get(key)
+        if cached and cached[0] > time.monotonic():
+            self._entries.move_to_end(key)
+            return self._replay(fingerprint, cached[1], cached[2])
+        pending = self._pending.get(key)
+        if pending and time.monotonic() - pending[0] < CONTACT_IDEMPOTENCY_PENDING_TIMEOUT:
+            self._replay(fingerprint, pending[1], {})
+            raise self._in_progress()
+        self._pending[key] = (time.monotonic(), fingerprint)
+        try:
+            return await asyncio.wait_for(self._claim(key, ttl, fingerprint), timeout=self.timeout)
+        except (PyMongoError, asyncio.TimeoutError) as e:
+            logging.warning(f"Contact idempotency check skipped: {str(e) or 'timed out'}")
+            return None
+        except BaseException:
+            self._pending.pop(key, None)
+            raise
+
+    async def _claim(self, key: str, ttl: int, fingerprint: str) -> Optional[dict]:
+        now = datetime.now(timezone.utc)
+        claim = {"fingerprint": fingerprint, "response": None, "created_at": now, "expires_at": now + timedelta(seconds=ttl)}
+        try:
+            await db.contact_idempotency.insert_one({"_id": key, **claim})
+            return None
+        except DuplicateKeyError:
+            pass
+        existing = await db.contact_idempotency.find_one({"_id": key})
+        expires_at = existing["expires_at"].replace(tzinfo=timezone.utc) if existing else now
+        created_at = existing["created_at"].replace(tzinfo=timezone.utc) if existing else now
+        if expires_at > now and existing.get("response") is not None:
+            self._pending.pop(key, None)
+            self._remember(key, existing["fingerprint"], existing["response"], time.monotonic() + (expires_at - now).total_seconds())
+            return self._replay(fingerprint, existing["fingerprint"], existing["response"])
+        if expires_at > now and (now - created_at).total_seconds() < CONTACT_IDEMPOTENCY_PENDING_TIMEOUT:
+            self._pending.pop(key, None)
+            self._replay(fingerprint, existing["fingerprint"], {})
+            raise self._in_progress()
+        # Expired but not yet removed by the TTL monitor, or abandoned by a claimant that never confirmed
+        await db.contact_idempotency.replace_one({"_id": key}, claim, upsert=True)
+        return None
+
+    def _in_background(self, coroutine, description: str):
+        async def run():
+            try:
+                await asyncio.wait_for(coroutine, timeout=self.timeout)
+            except (PyMongoError, asyncio.TimeoutError) as e:
+                logging.warning(f"Contact idempotency {description}: {str(e) or 'timed out'}")
+        task = asyncio.create_task(run())
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    def complete(self, key: str, ttl: int, fingerprint: str, response: dict):
+        """Confirm a stored submission; retries to this instance get response back at once, others once it is written"""
+        self._pending.pop(key, None)
+        self._remember(key, fingerprint, response, time.monotonic() + ttl)
+        self._in_background(
+            db.contact_idempotency.update_one({"_id": key}, {"$set": {"response": response}}),
+            f"confirmation failed for {key}"
+        )
+
+    def release(self, key: str):
+        """Forget a claim whose submission failed, so the client's retry is processed"""
+        self._pending.pop(key, None)
+        self._entries.pop(key, None)
+        self._in_background(db.contact_idempotency.delete_one({"_id": key}), f"release failed for {key}")
+
+contact_idempotency = TenantScoped(lambda tenant: ContactIdempotency(CONTACT_IDEMPOTENCY_CACHE_SIZE))
+
+# Live contact feed
+class ContactBroadcaster:
+    """Fan out new contact submissions to connected admin dashboards.
+
+    Keeps the most recent submissions so a reconnecting client can resume
+    from its Last-Event-ID without touching MongoDB. Subscribers that fall
+    behind by more than their queue size are dropped and resume on reconnect.
+    """
+    def __init__(self, history: int = CONTACT_STREAM_HISTORY, queue_size: int = CONTACT_STREAM_QUEUE_SIZE):
+        self.queue_size = queue_size
+        self._history: deque = deque(maxlen=history)
+        self._subscribers = set()
+
+    def subscribe(self) -> asyncio.Queue:
+        queue = asyncio.Queue(maxsize=self.queue_size)
+        self._subscribers.add(queue)
+        return queue
+
+    def unsubscribe(self, queue: asyncio.Queue):
+        self._subscribers.discard(queue)
+
+    def is_subscribed(self, queue: asyncio.Queue) -> bool:
+        return queue in self._subscribers
+
+    def publish(self, contact: ContactForm):
+        self._history.append(contact)
+        for queue in list(self._subscribers):
+            try:
+                queue.put_nowait(contact)
+            except asyncio.QueueFull:
+                self._subscribers.discard(queue)
+
+    def replay_after(self, event_id: str) -> Optional[List[ContactForm]]:
+        """Contacts published after event_id, or None if it is no longer in the history"""
+        history = list(self._history)
+        for index, contact in enumerate(history):
+            if contact.id == event_id:
+                return history[index + 1:]
+        return None
+
+contact_broadcaster = TenantScoped(lambda tenant: ContactBroadcaster())
+
+async def contacts_after(contact_id: str) -> List[ContactForm]:
+    """Contacts after the given one, oldest first, for resuming beyond the in-memory history.
+
+    Covers MongoDB as well as submissions still waiting in the write-behind spool.
+    """
+    spooled = {contact["id"]: contact for contact in contact_buffer.spooled()}
+    last_seen = spooled.get(contact_id) or await db.contacts.find_one({"id": contact_id}, {"created_at": 1})
+    if not last_seen:
+        return []
+    position = (last_seen["created_at"], contact_id)
+    query = {"$or": [
+        {"created_at": {"$gt": last_seen["created_at"]}},
+        {"created_at": last_seen["created_at"], "id": {"$gt": contact_id}},
+    ]}
+    contacts = await db.contacts.find(query, {"_id": 0}).sort([("created_at", 1), ("id", 1)]).to_list(CONTACT_STREAM_REPLAY_LIMIT)
+    for contact in contacts:
+        spooled.pop(contact["id"], None)
+    contacts += [contact for contact in spooled.values() if (contact["created_at"], contact["id"]) > position]
+    contacts.sort(key=lambda contact: (contact["created_at"], contact["id"]))
+    return [ContactForm(**parse_from_mongo(dict(contact))) for contact in contacts[:CONTACT_STREAM_REPLAY_LIMIT]]
+
+def format_contact_event(contact: ContactForm) -> str:
+    return f"id: {contact.id}\nevent: contact\ndata: {contact.json()}\n\n"
+
+# Logging
+request_context: ContextVar[Optional[dict]] = ContextVar("request_context", default=None)
+LOG_RECORD_ATTRIBUTES = set(vars(logging.LogRecord("", 0, "", 0, "", None, None))) | {"message", "asctime"}
+
+def request_route(scope: dict) -> Optional[str]:
+    """Route template of a request once the router has matched it, e.g. /api/blog/posts/{post_id}"""
+    route = scope.get("route")
+    if route is not None:
+        return getattr(route, "path", None)
+    endpoint = scope.get("endpoint")
+    return getattr(endpoint, "__name__", None)
+
+class ContextQueueHandler(QueueHandler):
+    """Hand log records to the listener thread without blocking the event loop.
+
+    The message, traceback and request context are resolved on the calling
+    side, because context variables are not visible to the listener thread.
+    When the queue is full records are dropped and counted instead of waiting.
+    """
+    def __init__(self, log_queue: queue.Queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        record = copy.copy(record)
+        record.message = record.getMessage()
+        record.msg, record.args = record.message, None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        context = request_context.get()
+        if context is not None:
+            record.request_id = context["request_id"]
+            record.route = request_route(context["scope"])
+        if len(TENANTS) > 1:
+            # The access log is written after TenantMiddleware has reset current_tenant
+            record.tenant = context["tenant"] if context and "tenant" in context else current_tenant.get().id
+        return record
+
+    def enqueue(self, record: logging.LogRecord):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line with the record's extra fields at the top level"""
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "ts": datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.message if hasattr(record, "message") else record.getMessage()
+        }
+        for key, value in vars(record).items():
+            if key not in LOG_RECORD_ATTRIBUTES and not key.startswith("_"):
+                entry[key] = value
+        if record.exc_text:
+            entry["exception"] = record.exc_text
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+def configure_logging() -> QueueListener:
+    """Route all records through a queue to a stdout handler running on a background thread"""
+    stream_handler = logging.StreamHandler(sys.stdout)
+    if LOG_FORMAT == "json":
+        stream_handler.setFormatter(JsonFormatter())
+    else:
+        stream_handler.setFormatter(logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s'))
+    log_queue = queue.Queue(maxsize=LOG_QUEUE_SIZE)
+    root = logging.getLogger()
+    for handler in root.handlers[:]:
+        root.removeHandler(handler)
+    root.addHandler(ContextQueueHandler(log_queue))
+    root.setLevel(LOG_LEVEL)
+    listener = QueueListener(log_queue, stream_handler, respect_handler_level=True)
+    listener.start()
+    return listener
+
+class AccessLogMiddleware:
+    """Assign every request an ID and write a sampled access log.
+
+    The ID is taken from an incoming X-Request-ID header or generated, and is
+    echoed back in the response. Server errors and slow requests are always
+    logged; everything else with probability ACCESS_LOG_SAMPLE_RATE, which
+    is recorded on each entry so counts can be scaled back up.
+    """
+    def __init__(self, app):
+        self.app = app
+        self.logger = logging.getLogger("access")
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        request_id = None
+        for name, value in scope["headers"]:
+            if name == b"x-request-id":
+                request_id = value.decode("latin-1")[:64]
+                break
+        request_id = request_id or uuid.uuid4().hex
+        token = request_context.set({"request_id": request_id, "scope": scope})
+        started = time.perf_counter()
+        status_code = 500
+
+        async def send_wrapper(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+                message["headers"] = list(message.get("headers", [])) + [(b"x-request-id", request_id.encode())]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            duration_ms = (time.perf_counter() - started) * 1000
+            always = status_code >= 500 or duration_ms >= ACCESS_LOG_SLOW_MS
+            if always or random.random() < ACCESS_LOG_SAMPLE_RATE:
+                self.logger.info(
+                    f"{scope['method']} {scope['path']} {status_code}",
+                    extra={
+                        "method": scope["method"],
+                        "path": scope["path"],
+                        "status": status_code,
+                        "duration_ms": round(duration_ms, 2),
+                        "sample_rate": 1.0 if always else ACCESS_LOG_SAMPLE_RATE
+                    }
+                )
+            request_context.reset(token)
+
+class TenantMiddleware:
+    """Select the site of a request from a /sites/<id> path prefix or else from the Host header.
+
+    The prefix is moved into root_path, so routing and url_for work as if the
+    site were mounted there. Requests for unknown hosts go to the default site
+    unless TENANT_STRICT_HOSTS is set.
+    """
+    def __init__(self, app):
+        self.app = app
+        self.hosts = {host.lower(): tenant for tenant in TENANTS.values() for host in tenant.hosts}
+
+    def resolve(self, scope) -> Tuple[Optional[Tenant], dict]:
+        route_path = scope["path"][len(scope.get("root_path", "")):]
+        if route_path.startswith(TENANT_PATH_PREFIX + "/"):
+            tenant_id = route_path[len(TENANT_PATH_PREFIX) + 1:].split("/", 1)[0]
+            tenant = TENANTS.get(tenant_id)
+            if tenant is not None:
+                scope = dict(scope, root_path=f"{scope.get('root_path', '')}{TENANT_PATH_PREFIX}/{tenant_id}")
+            return tenant, scope
+        for name, value in scope["headers"]:
+            if name == b"host":
+                tenant = self.hosts.get(value.decode("latin-1").rsplit(":", 1)[0].lower())
+                if tenant is not None:
+                    return tenant, scope
+                break
+        return (None if TENANT_STRICT_HOSTS else TENANTS[DEFAULT_TENANT_ID]), scope
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] not in ("http", "websocket"):
+            await self.app(scope, receive, send)
+            return
+        tenant, scope = self.resolve(scope)
+        if tenant is None:
+            response = PlainTextResponse("Unbekannte Website", status_code=404)
+            await response(scope, receive, send)
+            return
+        context = request_context.get()
+        if context is not None:
+            # Keep the site and the rewritten scope for the access log written outside this middleware
+            context.update(tenant=tenant.id, scope=scope)
+        token = current_tenant.set(tenant)
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            current_tenant.reset(token)
+
+class ServerTimingMiddleware:
+    """Add a Server-Timing header with the phases recorded by span() and the MongoDB listener.
+
+    Repeated phases are summed, with the number of occurrences as description.
+    "handler" includes the database and parse time spent inside the endpoint,
+    "render" is the response model validation and serialization after it.
+    """
+    def __init__(self, app):
+        self.app = app
+        self.logger = logging.getLogger("timing")
+        self.allow_origin = ", ".join(origin.strip() for origin in os.environ.get('CORS_ORIGINS', '*').split(','))
+
+    @staticmethod
+    def summarize(timings: dict, total: float) -> Dict[str, Tuple[float, int]]:
+        phases: Dict[str, Tuple[float, int]] = {}
+        for name, seconds in list(timings["spans"]):
+            duration, count = phases.get(name, (0.0, 0))
+            phases[name] = (duration + seconds, count + 1)
+        if timings["handler_end"] is not None:
+            phases["render"] = (timings["started"] + total - timings["handler_end"], 1)
+        phases["total"] = (total, 1)
+        return phases
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        timings = {"spans": [], "handler_end": None, "started": time.perf_counter()}
+        token = request_timings.set(timings)
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                phases = self.summarize(timings, time.perf_counter() - timings["started"])
+                header = ", ".join(
+                    f'{name};dur={duration * 1000:.1f}' + (f';desc="{count}x"' if count > 1 else "")
+                    for name, (duration, count) in phases.items()
+                )
+                message["headers"] = list(message.get("headers", [])) + [
+                    (b"server-timing", header.encode()),
+                    (b"timing-allow-origin", self.allow_origin.encode())
+                ]
+                if SERVER_TIMING_LOG:
+                    self.logger.info(
+                        f"{scope['method']} {scope['path']} {header}",
+                        extra={"timings": {name: round(duration * 1000, 2) for name, (duration, _) in phases.items()}}
+                    )
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            request_timings.reset(token)
+
+# Request profiling
+class SamplingProfiler:
+    """Periodically sample the Python stacks of all threads into folded stack counts"""
+    def __init__(self, interval: float = PROFILE_SAMPLE_INTERVAL):
+        self.interval = interval
+        self.samples = Counter()
+        self.sample_count = 0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="request-profiler", daemon=True)
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+
+    def _run(self):
+        own_ident = threading.get_ident()
+        thread_names = {}
+        while not self._stop.wait(self.interval):
+            self.sample_count += 1
+            for ident, frame in sys._current_frames().items():
+                if ident == own_ident:
+                    continue
+                if ident not in thread_names:
+                    thread_names.update((thread.ident, thread.name) for thread in threading.enumerate())
+                stack = []
+                while frame is not None:
+                    code = frame.f_code
+                    stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+                    frame = frame.f_back
+                stack.append(thread_names.get(ident, str(ident)))
+                self.samples[";".join(reversed(stack))] += 1
+
+    def folded(self) -> str:
+        return "\n".join(f"{stack} {count}" for stack, count in self.samples.most_common())
+
+def top_allocations(before: tracemalloc.Snapshot, after: tracemalloc.Snapshot, limit: int) -> List[dict]:
+    """Allocation sites that grew the most between two tracemalloc snapshots"""
+    filters = [tracemalloc.Filter(False, tracemalloc.__file__)]
+    stats = after.filter_traces(filters).compare_to(before.filter_traces(filters), "traceback")
+    allocations = []
+    for stat in stats[:limit]:
+        allocations.append({
+            "size_diff": stat.size_diff,
+            "count_diff": stat.count_diff,
+            "size": stat.size,
+            "traceback": [f"{frame.filename}:{frame.lineno}" for frame in stat.traceback],
+        })
+    return allocations
+
+class RequestProfilerMiddleware:
+    """Profile single requests of authenticated admins that ask for it.
+
+    Requests without the opt-in flag are passed straight through, so the
+    profiler costs nothing unless it is explicitly requested.
+    """
+    _lock = threading.Lock()
+
+    def __init__(self, app):
+        self.app = app
+
+    @staticmethod
+    def _wants_profile(scope) -> bool:
+        for name, value in scope["headers"]:
+            if name == b"x-profile" and value in (b"1", b"true"):
+                return True
+        query_string = scope.get("query_string", b"")
+        if b"_profile" in query_string:
+            return parse_qs(query_string.decode("latin-1")).get("_profile", [""])[0] in ("1", "true")
+        return False
+
+    @staticmethod
+    def _bearer_token(scope) -> Optional[str]:
+        for name, value in scope["headers"]:
+            if name == b"authorization":
+                scheme, _, token = value.decode("latin-1").partition(" ")
+                if scheme.lower() == "bearer":
+                    return token.strip()
+        return None
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not self._wants_profile(scope):
+            await self.app(scope, receive, send)
+            return
+
+        admin = await get_admin_from_token(self._bearer_token(scope))
+        if admin is None or not self._lock.acquire(blocking=False):
+            # Unauthenticated callers and concurrent profiling requests are served normally
+            await self.app(scope, receive, send)
+            return
+
+        profile_id = str(uuid.uuid4())
+        status_code = None
+
+        async def send_wrapper(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+                message.setdefault("headers", [])
+                message["headers"] = list(message["headers"]) + [(b"x-profile-id", profile_id.encode())]
+            await send(message)
+
+        started_tracing = not tracemalloc.is_tracing()
+        try:
+            if started_tracing:
+                tracemalloc.start(PROFILE_TRACE_FRAMES)
+            # Snapshots of a large heap take a while; keep them off the event loop
+            baseline = await asyncio.to_thread(tracemalloc.take_snapshot)
+            profiler = SamplingProfiler()
+            started = time.perf_counter()
+            profiler.start()
+            try:
+                await self.app(scope, receive, send_wrapper)
+            finally:
+                profiler.stop()
+                duration_ms = (time.perf_counter() - started) * 1000
+                allocations = await asyncio.to_thread(
+                    lambda: top_allocations(baseline, tracemalloc.take_snapshot(), PROFILE_TOP_ALLOCATIONS)
+                )
+        finally:
+            if started_tracing:
+                tracemalloc.stop()
+            self._lock.release()
+
+        profile = RequestProfile(
+            id=profile_id,
+            method=scope["method"],
+            path=scope["path"],
+            status_code=status_code,
+            duration_ms=round(duration_ms, 3),
+            sample_interval=profiler.interval,
+            sample_count=profiler.sample_count,
+            folded_stacks=profiler.folded(),
+            top_allocations=allocations,
+            created_at=datetime.now(timezone.utc),
+        )
+        expires_at = profile.created_at + timedelta(days=PROFILE_RETENTION_DAYS)
+        try:
+            await db.profiles.insert_one({**prepare_for_mongo(profile.dict()), "expires_at": expires_at})
+        except Exception as e:
+            logging.error(f"Storing request profile failed: {str(e)}")
+
+# Blog import
+IMPORT_MAX_ERRORS = 100
+WXR_SKIPPED_STATUSES = {"trash", "auto-draft", "inherit"}
+WP_SHORTCODE = re.compile(r"\[/?(caption|gallery|embed|video|audio|wp_[a-z_]+)\b[^\]]*\]")
+BLOCK_START = re.compile(r"^\s*<(p|div|h[1-6]|ul|ol|li|table|blockquote|pre|figure|hr)\b", re.IGNORECASE)
+
+def parse_import_date(value: Any) -> Optional[datetime]:
+    """Read ISO 8601 or RFC 822 dates as found in exports; naive times count as UTC"""
+    if isinstance(value, datetime):
+        parsed = value
+    elif not value or str(value).startswith("0000-00-00"):
+        return None
+    else:
+        value = str(value).strip()
+        try:
+            parsed = datetime.fromisoformat(value.replace("Z", "+00:00"))
+        except ValueError:
+            try:
+                parsed = parsedate_to_datetime(value)
+            except (TypeError, ValueError, IndexError):
+                return None
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=timezone.utc)
+    return parsed.astimezone(timezone.utc)
+
+def text_excerpt(content: str, length: int = 200) -> str:
+    text = HTML_WHITESPACE.sub(" ", html.unescape(re.sub(r"<[^>]+>", " ", content))).strip()
+    if len(text) <= length:
+        return text
+    return text[:length].rsplit(" ", 1)[0] + " …"
 
-# Authentication functions
-def verify_password(plain_password, hashed_password):
-    return pwd_context.verify(plain_password, hashed_password)
+def wp_autop(content: str) -> str:
+    """Turn classic-editor text, where blank lines separate paragraphs, into <p> markup"""
+    content = WP_SHORTCODE.sub("", content)
+    if re.search(r"<p[\s>]", content, re.IGNORECASE):
+        return content  # Block editor content is already marked up
+    paragraphs = []
+    for chunk in re.split(r"\n\s*\n", content.replace("\r\n", "\n")):
+        chunk = chunk.strip()
+        if not chunk:
+            continue
+        paragraphs.append(chunk if BLOCK_START.match(chunk) else f"<p>{chunk.replace(chr(10), '<br>')}</p>")
+    return "".join(paragraphs)
 
-def get_password_hash(password):
-    return pwd_context.hash(password)
+def wxr_item_entry(item: ET.Element) -> Optional[dict]:
+    """Map a WXR <item> to post fields; pages, attachments and trashed posts give None"""
+    fields: Dict[str, str] = {}
+    tags: List[str] = []
+    meta: Dict[str, str] = {}
+    for child in item:
+        namespace, _, name = child.tag.rpartition("}")
+        text = child.text or ""
+        if name == "category":
+            if child.get("domain") in ("post_tag", "category") and text.strip() and text.strip() not in tags:
+                tags.append(text.strip())
+        elif name == "encoded":
+            fields["excerpt" if "excerpt" in namespace else "content"] = text
+        elif name == "postmeta":
+            meta[child.findtext(f"{namespace}}}meta_key") or ""] = child.findtext(f"{namespace}}}meta_value") or ""
+        else:
+            fields[name] = text.strip()
+    status = fields.get("status", "publish")
+    if fields.get("post_type", "post") != "post" or status in WXR_SKIPPED_STATUSES:
+        return None
+    created_at = parse_import_date(fields.get("post_date_gmt")) or parse_import_date(fields.get("pubDate"))
+    return {
+        "source_id": f"wxr:{fields.get('post_id') or fields.get('guid') or fields.get('link')}",
+        "title": fields.get("title", ""),
+        "content": wp_autop(fields.get("content", "")),
+        "excerpt": fields.get("excerpt", "").strip() or None,
+        "slug": unquote(fields.get("post_name", "")),
+        "author": fields.get("creator") or None,
+        "created_at": created_at,
+        "updated_at": parse_import_date(fields.get("post_modified_gmt")) or created_at,
+        "published": status == "publish",
+        "publish_at": created_at if status == "future" else None,
+        "tags": tags,
+        "meta_description": meta.get("_yoast_wpseo_metadesc") or meta.get("rank_math_description") or None,
+        "meta_keywords": meta.get("_yoast_wpseo_focuskw") or meta.get("rank_math_focus_keyword") or None
+    }
 
-def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
-    to_encode = data.copy()
-    if expires_delta:
-        expire = datetime.now(timezone.utc) + expires_delta
-    else:
-        expire = datetime.now(timezone.utc) + timedelta(minutes=15)
-    to_encode.update({"exp": expire})
-    encoded_jwt = jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
-    return encoded_jwt
+def iter_wxr_posts(source: BinaryIO) -> Iterator[dict]:
+    """Yield the posts of a WordPress WXR export one by one; memory stays flat whatever the file size"""
+    channel = None
+    for event, element in ET.iterparse(source, events=("start", "end")):
+        if element.tag == "channel":
+            channel = element
+        elif event == "end" and element.tag == "item":
+            entry = wxr_item_entry(element)
+            # Drop the finished item (and earlier channel children) so the tree never grows
+            (channel if channel is not None else element).clear()
+            if entry is not None:
+                yield entry
 
-async def get_current_admin(credentials: HTTPAuthorizationCredentials = Depends(security)):
-    credentials_exception = HTTPException(
-        status_code=status.HTTP_401_UNAUTHORIZED,
-        detail="Could not validate credentials",
-        headers={"WWW-Authenticate": "Bearer"},
-    )
+def front_matter_value(value: str) -> Any:
+    value = value.strip()
+    if len(value) >= 2 and value[0] == value[-1] and value[0] in "\"'":
+        return value[1:-1]
+    if value.lower() in ("true", "false"):
+        return value.lower() == "true"
+    return value
+
+def parse_front_matter(text: str) -> Tuple[dict, str]:
+    """Split "---" delimited front matter (flat keys, scalars and lists) from a Markdown body"""
+    lines = text.split("\n")
+    if not lines or lines[0].strip() != "---":
+        return {}, text
+    end = next((index for index in range(1, len(lines)) if lines[index].strip() in ("---", "...")), None)
+    if end is None:
+        return {}, text
+    meta: Dict[str, Any] = {}
+    key = None
+    for line in lines[1:end]:
+        if not line.strip() or line.lstrip().startswith("#"):
+            continue
+        item = re.match(r"\s*-\s+(.*)$", line)
+        if item and key is not None:
+            if not isinstance(meta.get(key), list):
+                meta[key] = []
+            meta[key].append(front_matter_value(item.group(1)))
+            continue
+        match = re.match(r"([A-Za-z0-9_-]+)\s*:\s*(.*)$", line)
+        if not match:
+            continue
+        key, value = match.group(1).lower(), match.group(2).strip()
+        if value.startswith("[") and value.endswith("]"):
+            meta[key] = [front_matter_value(part) for part in value[1:-1].split(",") if part.strip()]
+        else:
+            meta[key] = front_matter_value(value)
+    return meta, "\n".join(lines[end + 1:])
+
+def markdown_inline(text: str) -> str:
+    parts = re.split(r"(`[^`]+`)", text)
+    for index, part in enumerate(parts):
+        if index % 2:
+            parts[index] = f"<code>{html.escape(part[1:-1])}</code>"
+            continue
+        part = re.sub(r"!\[([^\]]*)\]\(([^)\s]+)[^)]*\)", r'<img src="\2" alt="\1">', part)
+        part = re.sub(r"\[([^\]]+)\]\(([^)\s]+)[^)]*\)", r'<a href="\2">\1</a>', part)
+        part = re.sub(r"(\*\*|__)(?=\S)(.+?)(?<=\S)\1", r"<strong>\2</strong>", part)
+        part = re.sub(r"(?<![\w*])\*(?=\S)(.+?)(?<=\S)\*(?![\w*])", r"<em>\1</em>", part)
+        parts[index] = re.sub(r"(?<![\w_])_(?=\S)(.+?)(?<=\S)_(?![\w_])", r"<em>\1</em>", part)
+    return "".join(parts)
+
+def markdown_to_html(text: str) -> str:
+    """Render the common Markdown subset: headings, paragraphs, lists, quotes, code, rules, emphasis, links, images"""
+    output: List[str] = []
+    paragraph: List[str] = []
+    quote: List[str] = []
+    items: List[str] = []
+    list_tag = "ul"
+
+    def flush():
+        if paragraph:
+            output.append(f"<p>{markdown_inline(' '.join(paragraph))}</p>")
+            paragraph.clear()
+        if quote:
+            output.append(f"<blockquote>{markdown_to_html(chr(10).join(quote))}</blockquote>")
+            quote.clear()
+        if items:
+            output.append(f"<{list_tag}>" + "".join(f"<li>{markdown_inline(item)}</li>" for item in items) + f"</{list_tag}>")
+            items.clear()
+
+    lines = iter(text.replace("\r\n", "\n").split("\n"))
+    for line in lines:
+        stripped = line.strip()
+        heading = re.match(r"(#{1,6})\s+(.*?)\s*#*$", stripped)
+        list_item = re.match(r"([-*+]|\d+[.)])\s+(.*)$", stripped)
+        if stripped.startswith("```"):
+            flush()
+            code = []
+            for code_line in lines:
+                if code_line.strip().startswith("```"):
+                    break
+                code.append(code_line)
+            output.append(f"<pre><code>{html.escape(chr(10).join(code))}</code></pre>")
+        elif not stripped:
+            flush()
+        elif heading:
+            flush()
+            level = len(heading.group(1))
+            output.append(f"<h{level}>{markdown_inline(heading.group(2))}</h{level}>")
+        elif re.fullmatch(r"(-{3,}|\*{3,}|_{3,})", stripped.replace(" ", "")):
+            flush()
+            output.append("<hr>")
+        elif stripped.startswith(">"):
+            if paragraph or items:
+                flush()
+            quote.append(stripped[1:].lstrip())
+        elif list_item:
+            tag = "ol" if list_item.group(1)[0].isdigit() else "ul"
+            if paragraph or quote or (items and tag != list_tag):
+                flush()
+            list_tag = tag
+            items.append(list_item.group(2))
+        elif items and line[:1] in (" ", "\t"):
+            items[-1] += " " + stripped
+        else:
+            if quote or items:
+                flush()
+            paragraph.append(stripped)
+    flush()
+    return "".join(output)
+
+def markdown_entry(text: str, source_id: str, name: str) -> dict:
+    """Map a front-matter Markdown document to post fields; the file name serves as fallback slug and title"""
+    meta, body = parse_front_matter(text.lstrip("\ufeff"))
+    tags = meta.get("tags") or meta.get("categories") or []
+    if isinstance(tags, str):
+        tags = [tag.strip() for tag in tags.split(",") if tag.strip()]
+    published = meta["published"] if isinstance(meta.get("published"), bool) else meta.get("draft") is not True
+    keywords = meta.get("meta_keywords") or meta.get("keywords") or None
+    if isinstance(keywords, list):
+        keywords = ", ".join(map(str, keywords))
+    created_at = parse_import_date(meta.get("date"))
+    return {
+        "source_id": source_id,
+        "title": str(meta.get("title") or name.replace("-", " ").strip()),
+        "content": markdown_to_html(body),
+        "excerpt": meta.get("excerpt") or meta.get("summary") or meta.get("description") or None,
+        "slug": str(meta.get("slug") or name),
+        "author": meta.get("author") or None,
+        "created_at": created_at,
+        "updated_at": parse_import_date(meta.get("updated") or meta.get("lastmod")) or created_at,
+        "published": published,
+        "publish_at": parse_import_date(meta.get("publish_at")),
+        "tags": [str(tag) for tag in tags],
+        "meta_description": meta.get("meta_description") or meta.get("description") or None,
+        "meta_keywords": keywords,
+        "featured_image": meta.get("featured_image") or meta.get("image") or None
+    }
+
+def iter_markdown_posts(root: Path) -> Iterator[dict]:
+    """Yield the posts of a folder of Markdown files, reading one file at a time"""
+    for path in sorted(root.rglob("*.md")):
+        yield markdown_entry(path.read_text(encoding="utf-8"), f"md:{path.relative_to(root).as_posix()}", path.stem)
+
+def iter_markdown_zip(source: BinaryIO) -> Iterator[dict]:
+    """Yield the posts of a zip archive of Markdown files, reading one member at a time"""
+    with zipfile.ZipFile(source) as archive:
+        for member in sorted(archive.infolist(), key=lambda info: info.filename):
+            if member.is_dir() or not member.filename.lower().endswith((".md", ".markdown")):
+                continue
+            name = member.filename.rsplit("/", 1)[-1].rsplit(".", 1)[0]
+            yield markdown_entry(archive.read(member).decode("utf-8"), f"md:{member.filename}", name)
+
+def prepare_import_batch(entries: Iterator[dict], size: int, result: BlogPostImportResult) -> Tuple[List[Tuple[str, BlogPost]], bool]:
+    """Parse, sanitize and validate up to size entries (runs in a worker thread); returns (posts, exhausted)"""
+    posts = []
     try:
-        token = credentials.credentials
-        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
-        username: str = payload.get("sub")
-        if username is None:
-            raise credentials_exception
-    except JWTError:
-        raise credentials_exception
+        for entry in entries:
+            source_id = entry.pop("source_id")
+            try:
+                data = {key: value for key, value in entry.items() if value is not None}
+                data = process_post_content(apply_publish_schedule(data))
+                data.setdefault("excerpt", text_excerpt(data.get("content", "")))
+                data["slug"] = create_slug(data.get("slug") or data.get("title", ""))
+                posts.append((source_id, BlogPost(**data)))
+            except ValidationError as e:
+                result.failed += 1
+                if len(result.errors) < IMPORT_MAX_ERRORS:
+                    error = e.errors()[0]
+                    result.errors.append(f"{source_id}: {'.'.join(map(str, error['loc']))}: {error['msg']}")
+            if len(posts) >= size:
+                return posts, False
+    except (ET.ParseError, zipfile.BadZipFile, UnicodeDecodeError, OSError) as e:
+        result.errors.append(f"Import abgebrochen, Datei nicht lesbar: {str(e)}")
+    return posts, True
+
+async def insert_import_batch(batch: List[Tuple[str, BlogPost]], result: BlogPostImportResult):
+    """Insert one batch with a single slug lookup and insert_many; entries imported before are skipped"""
+    unique = dict(batch)
+    result.skipped += len(batch) - len(unique)
+    existing = set(await db.blog_posts.distinct("source_id", {"source_id": {"$in": list(unique)}}))
+    result.skipped += len(existing)
+    batch = [(source_id, post) for source_id, post in unique.items() if source_id not in existing]
+    if not batch:
+        return
     
-    admin = await db.admin_users.find_one({"username": username})
-    if admin is None:
-        raise credentials_exception
-    return AdminUser(**admin)
+    bases = [post.slug for _, post in batch]
+    documents = []
+    for (source_id, post), slug in zip(batch, await allocate_slugs(bases)):
+        post.slug = slug
+        documents.append({**prepare_for_mongo(post.dict()), "source_id": source_id})
+    try:
+        await db.blog_posts.insert_many(documents, ordered=False)
+        result.imported += len(documents)
+        return
+    except BulkWriteError as e:
+        result.imported += e.details.get("nInserted", 0)
+        write_errors = e.details.get("writeErrors", [])
+    
+    for error in write_errors:
+        document, base = documents[error["index"]], bases[error["index"]]
+        if error.get("code") == 11000 and "source_id" in error.get("keyPattern", {}):
+            result.skipped += 1
+            continue
+        if error.get("code") == 11000 and "slug" in error.get("keyPattern", {}):
+            # A concurrent write took the slug in the meantime; fall back to one-by-one inserts for these
+            while True:
+                document["slug"] = (await allocate_slugs([base]))[0]
+                try:
+                    await db.blog_posts.insert_one(document)
+                    result.imported += 1
+                    break
+                except DuplicateKeyError as retry_error:
+                    if not is_duplicate_slug(retry_error):
+                        result.skipped += 1
+                        break
+            continue
+        result.failed += 1
+        if len(result.errors) < IMPORT_MAX_ERRORS:
+            result.errors.append(f"{document['source_id']}: {error.get('errmsg')}")
 
-async def authenticate_admin(username: str, password: str):
-    admin = await db.admin_users.find_one({"username": username})
-    if not admin:
+async def import_blog_posts(entries: Iterator[dict]) -> BlogPostImportResult:
+    """Stream entries into blog_posts in batches of IMPORT_BATCH_SIZE.
+
+    Parsing runs in a worker thread one batch at a time, so neither memory nor
+    event loop latency depends on the size of the import. Entries carry a
+    source_id, which makes re-running the same import skip what is already there.
+    """
+    require_slug_index()
+    result = BlogPostImportResult()
+    exhausted = False
+    while not exhausted:
+        batch, exhausted = await asyncio.to_thread(prepare_import_batch, entries, IMPORT_BATCH_SIZE, result)
+        if batch:
+            await insert_import_batch(batch, result)
+    if result.imported:
+        await invalidation_bus.notify(InvalidationEvent(collection="blog_posts", operation="flush"))
+    return result
+
+# Image storage
+def image_bucket() -> AsyncIOMotorGridFSBucket:
+    return AsyncIOMotorGridFSBucket(db.current(), bucket_name="image_files")
+
+def sniff_image_type(head: bytes) -> Optional[Tuple[str, str]]:
+    """Detect the real image format from its leading bytes; returns (content_type, extension)"""
+    if head.startswith(b"\xff\xd8\xff"):
+        return "image/jpeg", "jpg"
+    if head.startswith(b"\x89PNG\r\n\x1a\n"):
+        return "image/png", "png"
+    if head.startswith((b"GIF87a", b"GIF89a")):
+        return "image/gif", "gif"
+    if head[:4] == b"RIFF" and head[8:12] == b"WEBP":
+        return "image/webp", "webp"
+    return None
+
+async def upload_file_chunks(file: UploadFile) -> AsyncIterator[bytes]:
+    while chunk := await file.read(IMAGE_READ_CHUNK_SIZE):
+        yield chunk
+
+async def spool_image_upload(chunks: AsyncIterator[bytes], spool: BinaryIO) -> Tuple[str, str, str, int]:
+    """Copy an upload into a temporary file chunk by chunk.
+
+    The format is sniffed from the first bytes and the size limit is enforced
+    while streaming, so bad uploads are rejected without reading them in full.
+    Returns (sha256, content_type, extension, size).
+    """
+    invalid_type = HTTPException(
+        status_code=400,
+        detail="Invalid file type. Only JPEG, PNG, GIF, and WebP are allowed."
+    )
+    sha256 = hashlib.sha256()
+    size = 0
+    head = b""
+    detected = None
+    async for chunk in chunks:
+        size += len(chunk)
+        if size > IMAGE_MAX_SIZE:
+            raise HTTPException(status_code=400, detail=f"File too large. Maximum size is {IMAGE_MAX_SIZE // (1024 * 1024)}MB.")
+        if detected is None:
+            head += chunk[:IMAGE_SNIFF_BYTES - len(head)]
+            if len(head) >= IMAGE_SNIFF_BYTES:
+                detected = sniff_image_type(head)
+                if detected is None:
+                    raise invalid_type
+        sha256.update(chunk)
+        spool.write(chunk)
+    if detected is None:
+        detected = sniff_image_type(head)
+        if detected is None:
+            raise invalid_type
+    content_type, extension = detected
+    return sha256.hexdigest(), content_type, extension, size
+
+async def store_image_blob(digest: str, spool: BinaryIO, content_type: str, size: int) -> bool:
+    """Store spooled image bytes in GridFS under their SHA-256 digest, or take another reference on an existing blob.
+
+    Returns True if the bytes were new.
+    """
+    existing = await db.image_blobs.find_one_and_update(
+        {"_id": digest},
+        {"$inc": {"ref_count": 1}},
+        projection={"_id": 1}
+    )
+    if existing:
         return False
-    if not verify_password(password, admin["hashed_password"]):
+    
+    spool.seek(0)
+    gridfs_id = await image_bucket().upload_from_stream(
+        digest,
+        spool,
+        chunk_size_bytes=255 * 1024,
+        metadata={"content_type": content_type}
+    )
+    try:
+        await db.image_blobs.insert_one({
+            "_id": digest,
+            "gridfs_id": gridfs_id,
+            "content_type": content_type,
+            "size": size,
+            "ref_count": 1,
+            "created_at": datetime.now(timezone.utc).isoformat()
+        })
+        return True
+    except DuplicateKeyError:
+        # A concurrent upload of the same bytes won the insert; reference its blob instead
+        await image_bucket().delete(gridfs_id)
+        await db.image_blobs.update_one({"_id": digest}, {"$inc": {"ref_count": 1}})
         return False
-    return AdminUser(**admin)
+    except Exception:
+        await image_bucket().delete(gridfs_id)
+        raise
 
-# Helper functions
-def create_slug(title: str) -> str:
-    """Create URL-friendly slug from title"""
-    import re
-    slug = title.lower()
-    slug = re.sub(r'[^\w\s-]', '', slug)
-    slug = re.sub(r'[-\s]+', '-', slug)
-    return slug.strip('-')
+async def release_image_blob(digest: str):
+    """Drop one reference to a blob and delete it once nothing refers to it any more"""
+    blob = await db.image_blobs.find_one_and_update(
+        {"_id": digest},
+        {"$inc": {"ref_count": -1}},
+        projection={"ref_count": 1, "gridfs_id": 1},
+        return_document=ReturnDocument.AFTER
+    )
+    if blob and blob["ref_count"] <= 0:
+        result = await db.image_blobs.delete_one({"_id": digest, "ref_count": {"$lte": 0}})
+        if result.deleted_count:
+            await image_bucket().delete(blob["gridfs_id"])
 
-def prepare_for_mongo(data: dict) -> dict:
-    """Prepare data for MongoDB storage"""
-    if isinstance(data.get('created_at'), datetime):
-        data['created_at'] = data['created_at'].isoformat()
-    if isinstance(data.get('updated_at'), datetime):
-        data['updated_at'] = data['updated_at'].isoformat()
-    return data
+async def save_image_upload(request: Request, chunks: AsyncIterator[bytes], original_filename: Optional[str]) -> ImageUploadResponse:
+    """Validate, deduplicate and store an uploaded image; peak memory is one chunk"""
+    with tempfile.TemporaryFile() as spool:
+        digest, content_type, extension, size = await spool_image_upload(chunks, spool)
+        try:
+            image_name = f"{digest}.{extension}"
+            url = image_url(request, image_name)
+            
+            is_new = await store_image_blob(digest, spool, content_type, size)
+            
+            # Store image metadata in database
+            image_doc = {
+                "id": str(uuid.uuid4()),
+                "filename": image_name,
+                "original_filename": original_filename,
+                "content_type": content_type,
+                "size": size,
+                "sha256": digest,
+                "url": url,
+                "created_at": datetime.now(timezone.utc).isoformat()
+            }
+            
+            try:
+                await db.images.insert_one(image_doc)
+            except Exception:
+                # Give back the reference store_image_blob took, or the blob would never be freed
+                await release_image_blob(digest)
+                raise
+            
+            return ImageUploadResponse(
+                status="success",
+                url=url,
+                message="Image uploaded successfully" if is_new else "Image already stored, reusing existing file"
+            )
+            
+        except Exception as e:
+            logging.error(f"Image upload error: {str(e)}")
+            raise HTTPException(status_code=500, detail="Image upload failed")
 
-def parse_from_mongo(item: dict) -> dict:
-    """Parse data from MongoDB"""
-    if isinstance(item.get('created_at'), str):
-        item['created_at'] = datetime.fromisoformat(item['created_at'])
-    if isinstance(item.get('updated_at'), str):
-        item['updated_at'] = datetime.fromisoformat(item['updated_at'])
-    return item
+def image_url(request: Request, image_name: str) -> str:
+    if PUBLIC_BASE_URL:
+        return f"{PUBLIC_BASE_URL}/api/images/{image_name}"
+    return str(request.url_for("get_image", image_name=image_name))
+
+# Direct-to-bucket uploads
+IMAGE_EXTENSIONS = {"image/jpeg": "jpg", "image/png": "png", "image/gif": "gif", "image/webp": "webp"}
+_s3_client = None
+
+def s3_client():
+    """Create the S3 client on first use so boto3 setup stays off the cold start path"""
+    global _s3_client
+    if _s3_client is None:
+        _s3_client = boto3.client(
+            "s3",
+            endpoint_url=S3_ENDPOINT_URL,
+            region_name=S3_REGION,
+            config=BotoConfig(signature_version="s3v4", s3={"addressing_style": "path" if S3_ENDPOINT_URL else "auto"})
+        )
+    return _s3_client
+
+def s3_object_url(key: str) -> str:
+    if S3_PUBLIC_URL:
+        return f"{S3_PUBLIC_URL}/{key}"
+    if S3_ENDPOINT_URL:
+        return f"{S3_ENDPOINT_URL.rstrip('/')}/{S3_BUCKET}/{key}"
+    return f"https://{S3_BUCKET}.s3.{S3_REGION}.amazonaws.com/{key}"
+
+def read_s3_object_head(key: str) -> Tuple[bytes, int, str]:
+    """Fetch the first bytes of an uploaded object; returns (head, total size, etag)"""
+    obj = s3_client().get_object(Bucket=S3_BUCKET, Key=key, Range=f"bytes=0-{IMAGE_SNIFF_BYTES - 1}")
+    head = obj["Body"].read()
+    # "bytes 0-11/12345"; stores that ignore the range answer with the whole object instead
+    content_range = obj.get("ContentRange")
+    size = int(content_range.rsplit("/", 1)[1]) if content_range else obj["ContentLength"]
+    return head, size, obj.get("ETag", "").strip('"')
+
+async def delete_s3_object(key: str):
+    try:
+        await asyncio.to_thread(s3_client().delete_object, Bucket=S3_BUCKET, Key=key)
+    except (BotoCoreError, ClientError) as e:
+        logging.error(f"S3 delete error for {key}: {str(e)}")
 
 # Routes
 @api_router.get("/")
@@ -288,69 +3291,88 @@ async def root():
 
 # Blog Routes
 @api_router.get("/blog/posts", response_model=List[BlogPost])
-async def get_blog_posts(published_only: bool = True):
+async def get_blog_posts(response: Response, published_only: bool = True):
     """Get all blog posts"""
+    cache_key = ("list", published_only)
+    cached = post_cache.get(cache_key)
+    if cached is not None:
+        return cached
+    generation = post_cache.generation
     query = {"published": True} if published_only else {}
-    posts = await db.blog_posts.find(query).sort("created_at", -1).to_list(100)
-    return [BlogPost(**parse_from_mongo(post)) for post in posts]
+    try:
+        posts = await mongo_breaker.call(lambda: db.blog_posts.find(query).sort("created_at", -1).to_list(100))
+    except MongoUnavailable:
+        if not published_only:
+            raise HTTPException(status_code=503, detail="Blog ist vorübergehend nicht verfügbar")
+        return await post_snapshot.read(response, limit=100)
+    with span("parse"):
+        posts = [BlogPost(**parse_from_mongo(post)) for post in posts]
+    post_cache.put(cache_key, posts, generation)
+    return posts
 
 @api_router.get("/blog/posts/{post_id}", response_model=BlogPost)
-async def get_blog_post(post_id: str):
+async def get_blog_post(post_id: str, response: Response):
     """Get single blog post"""
-    post = await db.blog_posts.find_one({"id": post_id})
-    if not post:
-        raise HTTPException(status_code=404, detail="Blog post nicht gefunden")
-    return BlogPost(**parse_from_mongo(post))
+    post = post_cache.get(("id", post_id))
+    if post is None:
+        generation = post_cache.generation
+        try:
+            post = await mongo_breaker.call(lambda: db.blog_posts.find_one({"id": post_id}))
+        except MongoUnavailable:
+            post = await post_snapshot.get(response, "id", post_id)
+            response.headers["ETag"] = f'"{post.version}"'
+            return post
+        if not post:
+            raise HTTPException(status_code=404, detail="Blog post nicht gefunden")
+        with span("parse"):
+            post = BlogPost(**parse_from_mongo(post))
+        post_cache.put(("id", post_id), post, generation)
+    response.headers["ETag"] = f'"{post.version}"'
+    return post
 
 @api_router.get("/blog/posts/slug/{slug}", response_model=BlogPost)
-async def get_blog_post_by_slug(slug: str):
+async def get_blog_post_by_slug(slug: str, response: Response):
     """Get blog post by slug"""
-    post = await db.blog_posts.find_one({"slug": slug})
-    if not post:
-        raise HTTPException(status_code=404, detail="Blog post nicht gefunden")
-    return BlogPost(**parse_from_mongo(post))
+    post = post_cache.get(("slug", slug))
+    if post is None:
+        generation = post_cache.generation
+        try:
+            post = await mongo_breaker.call(lambda: db.blog_posts.find_one({"slug": slug}))
+        except MongoUnavailable:
+            return await post_snapshot.get(response, "slug", slug)
+        if not post:
+            raise HTTPException(status_code=404, detail="Blog post nicht gefunden")
+        with span("parse"):
+            post = BlogPost(**parse_from_mongo(post))
+        post_cache.put(("slug", slug), post, generation)
+    return post
 
 @api_router.post("/blog/posts", response_model=BlogPost)
 async def create_blog_post(post_data: BlogPostCreate):
     """Create new blog post"""
-    slug = create_slug(post_data.title)
-    
-    # Check if slug already exists
-    existing_post = await db.blog_posts.find_one({"slug": slug})
-    if existing_post:
-        slug = f"{slug}-{str(uuid.uuid4())[:8]}"
-    
-    post_dict = post_data.dict()
-    post_dict["slug"] = slug
+    post_dict = process_post_content(apply_publish_schedule(post_data.dict()))
+    post_dict["slug"] = create_slug(post_data.title)
     post_obj = BlogPost(**post_dict)
     
-    mongo_data = prepare_for_mongo(post_obj.dict())
-    await db.blog_posts.insert_one(mongo_data)
-    
-    return post_obj
+    return await insert_post_with_unique_slug(post_obj)
 
 @api_router.put("/blog/posts/{post_id}", response_model=BlogPost)
-async def update_blog_post(post_id: str, post_data: BlogPostUpdate):
+async def update_blog_post(
+    post_id: str,
+    post_data: BlogPostUpdate,
+    response: Response,
+    if_match: Optional[str] = Header(None)
+):
     """Update blog post"""
-    existing_post = await db.blog_posts.find_one({"id": post_id})
-    if not existing_post:
-        raise HTTPException(status_code=404, detail="Blog post nicht gefunden")
-    
-    update_data = {k: v for k, v in post_data.dict().items() if v is not None}
+    update_data = process_post_content({k: v for k, v in post_data.dict().items() if v is not None})
     update_data["updated_at"] = datetime.now(timezone.utc).isoformat()
     
     # Update slug if title changed
     if "title" in update_data:
-        new_slug = create_slug(update_data["title"])
-        # Check if new slug already exists
-        slug_exists = await db.blog_posts.find_one({"slug": new_slug, "id": {"$ne": post_id}})
-        if slug_exists:
-            new_slug = f"{new_slug}-{str(uuid.uuid4())[:8]}"
-        update_data["slug"] = new_slug
+        update_data["slug"] = create_slug(update_data["title"])
     
-    await db.blog_posts.update_one({"id": post_id}, {"$set": update_data})
-    
-    updated_post = await db.blog_posts.find_one({"id": post_id})
+    updated_post = await apply_post_update(post_id, update_data, parse_if_match(if_match))
+    response.headers["ETag"] = f'"{updated_post["version"]}"'
     return BlogPost(**parse_from_mongo(updated_post))
 
 @api_router.delete("/blog/posts/{post_id}")
@@ -359,41 +3381,245 @@ async def delete_blog_post(post_id: str):
     result = await db.blog_posts.delete_one({"id": post_id})
     if result.deleted_count == 0:
         raise HTTPException(status_code=404, detail="Blog post nicht gefunden")
+    await delete_post_revisions([post_id])
+    await post_changed(operation="delete", post_id=post_id)
     return {"message": "Blog post gelöscht"}
 
 # Contact Form Routes
-@api_router.post("/contact", response_model=ContactFormResponse)
-async def submit_contact_form(contact_data: ContactFormCreate, background_tasks: BackgroundTasks):
-    """Submit contact form"""
+@api_router.post(
+    "/contact",
+    response_model=ContactFormResponse,
+    dependencies=[Depends(rate_limit("contact", CONTACT_RATE_LIMIT))]
+)
+async def submit_contact_form(
+    contact_data: ContactFormCreate,
+    background_tasks: BackgroundTasks,
+    response: Response,
+    idempotency_key: Optional[str] = Header(None, max_length=255)
+):
+    """Submit contact form
+
+    Retries with the same Idempotency-Key header, or identical submissions
+    within CONTACT_DEDUPE_WINDOW, return the original response without
+    storing the contact or sending emails again. Reusing a key for a
+    different message gives 422; a retry racing the original gives 409.
+    """
+    result = ContactFormResponse(
+        status="success",
+        message="Vielen Dank für Ihre Nachricht! Wir melden uns schnellstmöglich bei Ihnen."
+    )
+    key, ttl, fingerprint = contact_idempotency_key(contact_data, idempotency_key)
+    original = await contact_idempotency.claim(key, ttl, fingerprint)
+    if original is not None:
+        response.headers["Idempotent-Replayed"] = "true"
+        return ContactFormResponse(**original)
+    
     try:
         # Create contact record
         contact_obj = ContactForm(**contact_data.dict())
         mongo_data = prepare_for_mongo(contact_obj.dict())
-        await db.contacts.insert_one(mongo_data)
+        if contact_buffer.running:
+            await contact_buffer.add(mongo_data)
+        else:
+            await db.contacts.insert_one(mongo_data)
+            await record_contact_stats([mongo_data])
+        contact_broadcaster.publish(contact_obj)
         
         # Send emails in background
         background_tasks.add_task(email_service.send_contact_email, contact_obj)
         
-        return ContactFormResponse(
-            status="success",
-            message="Vielen Dank für Ihre Nachricht! Wir melden uns schnellstmöglich bei Ihnen."
-        )
+        contact_idempotency.complete(key, ttl, fingerprint, result.dict())
+        return result
         
     except Exception as e:
         logging.error(f"Contact form error: {str(e)}")
+        contact_idempotency.release(key)
         raise HTTPException(
             status_code=500, 
             detail="Es ist ein Fehler aufgetreten. Bitte versuchen Sie es später erneut."
         )
 
 @api_router.get("/contacts")
-async def get_contacts(current_admin: AdminUser = Depends(get_current_admin)):
-    """Get all contacts (admin only)"""
-    contacts = await db.contacts.find().sort("created_at", -1).to_list(100)
-    return [ContactForm(**parse_from_mongo(contact)) for contact in contacts]
+async def get_contacts(
+    request: Request,
+    response: Response,
+    limit: int = Query(100, ge=1, le=CONTACTS_PAGE_SIZE_MAX),
+    cursor: Optional[str] = None,
+    current_admin: AdminUser = Depends(get_current_admin)
+):
+    """Get contacts newest first, one page at a time (admin only)
+
+    The cursor for the next page is returned in the X-Next-Cursor header.
+    """
+    query = decode_contact_cursor(cursor) if cursor else {}
+    contacts = await db.contacts.find(query).sort([("created_at", -1), ("id", -1)]).to_list(limit)
+    if len(contacts) == limit:
+        next_cursor = encode_contact_cursor(contacts[-1])
+        response.headers["X-Next-Cursor"] = next_cursor
+        next_url = request.url.include_query_params(limit=limit, cursor=next_cursor)
+        response.headers["Link"] = f'<{next_url}>; rel="next"'
+    with span("parse"):
+        return [ContactForm(**parse_from_mongo(contact)) for contact in contacts]
+
+@api_router.get("/admin/stats/contacts", response_model=ContactStats)
+async def get_contact_stats(
+    days: int = Query(30, ge=1, le=366),
+    weeks: int = Query(12, ge=1, le=104),
+    months: int = Query(12, ge=1, le=120),
+    current_admin: AdminUser = Depends(get_current_admin)
+):
+    """Get contact lead counts per day, week and month with time-of-day distributions (admin only)
+
+    Reads only the precomputed rollups, so the cost depends on the number of
+    buckets requested rather than on the number of contacts. Buckets without
+    any submissions are left out.
+    """
+    since = contact_stats_since(datetime.now(STATS_ZONE).date(), days, weeks, months)
+    query = {"$or": [
+        {"period": "all"},
+        *({"period": period, "start": {"$gte": start.isoformat()}} for period, start in since.items())
+    ]}
+    buckets = {"day": [], "week": [], "month": []}
+    overall = {}
+    async for doc in db.contact_stats.find(query).sort("start", 1):
+        hours = [doc.get("hours", {}).get(str(hour), 0) for hour in range(24)]
+        if doc["period"] == "all":
+            overall = {"total": doc["count"], "hours": hours}
+        else:
+            buckets[doc["period"]].append(ContactStatsBucket(start=doc["start"], count=doc["count"], hours=hours))
+    return ContactStats(
+        timezone=STATS_TIMEZONE,
+        total=overall.get("total", 0),
+        hours=overall.get("hours", [0] * 24),
+        days=buckets["day"],
+        weeks=buckets["week"],
+        months=buckets["month"]
+    )
+
+@api_router.get("/contacts/export")
+async def export_contacts(
+    format: str = Query("csv", pattern="^(csv|ndjson)$"),
+    current_admin: AdminUser = Depends(get_current_admin)
+):
+    """Stream every contact as CSV or NDJSON (admin only)"""
+    cursor = db.contacts.find({}, {"_id": 0}).sort([("created_at", -1), ("id", -1)]).batch_size(CONTACT_EXPORT_BATCH_SIZE)
+
+    async def ndjson_rows():
+        chunk = []
+        async for contact in cursor:
+            chunk.append(json.dumps({field: contact.get(field) for field in CONTACT_EXPORT_FIELDS}, ensure_ascii=False))
+            if len(chunk) >= CONTACT_EXPORT_BATCH_SIZE:
+                yield "\n".join(chunk) + "\n"
+                chunk = []
+        if chunk:
+            yield "\n".join(chunk) + "\n"
+
+    async def csv_rows():
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        writer.writerow(CONTACT_EXPORT_FIELDS)
+        rows = 0
+        async for contact in cursor:
+            writer.writerow([csv_safe(contact.get(field)) for field in CONTACT_EXPORT_FIELDS])
+            rows += 1
+            if rows % CONTACT_EXPORT_BATCH_SIZE == 0:
+                yield buffer.getvalue()
+                buffer.seek(0)
+                buffer.truncate()
+        yield buffer.getvalue()
+
+    filename = f"contacts-{datetime.now(timezone.utc).strftime('%Y%m%d')}.{format}"
+    return StreamingResponse(
+        csv_rows() if format == "csv" else ndjson_rows(),
+        media_type="text/csv; charset=utf-8" if format == "csv" else "application/x-ndjson",
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'}
+    )
+
+@api_router.post("/admin/contacts/stream/token", response_model=StreamToken)
+async def create_stream_token(current_admin: AdminUser = Depends(get_current_admin)):
+    """Issue a short-lived token for ?token= on the contact stream (admin only)"""
+    token = create_access_token(
+        data={"sub": current_admin.username, "tenant": current_tenant.get().id, "scope": "contact_stream"},
+        expires_delta=timedelta(seconds=CONTACT_STREAM_TOKEN_EXPIRE)
+    )
+    return StreamToken(token=token, expires_in=CONTACT_STREAM_TOKEN_EXPIRE)
+
+async def get_stream_admin(
+    token: Optional[str] = Query(None),
+    credentials: Optional[HTTPAuthorizationCredentials] = Depends(optional_security)
+) -> AdminUser:
+    # A browser EventSource cannot send an Authorization header, so it passes a stream token instead
+    with span("auth"):
+        if token:
+            admin = await get_admin_from_token(token, scope="contact_stream")
+        else:
+            admin = await get_admin_from_token(credentials.credentials if credentials else None)
+    if admin is None:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Could not validate credentials",
+            headers={"WWW-Authenticate": "Bearer"},
+        )
+    return admin
+
+@api_router.get("/admin/contacts/stream")
+async def stream_contacts(
+    request: Request,
+    last_event_id: Optional[str] = Header(None),
+    current_admin: AdminUser = Depends(get_stream_admin)
+):
+    """Push new contact submissions as Server-Sent Events (admin only)
+
+    Sends a comment line every CONTACT_STREAM_HEARTBEAT seconds to keep
+    proxies from closing the connection, and replays anything missed when
+    the client reconnects with Last-Event-ID.
+
+    Authenticates with the usual bearer header (fetch-based clients) or,
+    for the browser's EventSource, with ?token= from POST
+    /admin/contacts/stream/token. The token is only checked on connect;
+    when the EventSource gives up, fetch a new one and reopen it.
+    """
+    # Subscribe before replaying so nothing published in between is lost
+    queue = contact_broadcaster.subscribe()
+    
+    async def events():
+        try:
+            yield "retry: 3000\n\n"
+            replayed = set()
+            if last_event_id:
+                missed = contact_broadcaster.replay_after(last_event_id)
+                if missed is None:
+                    missed = await contacts_after(last_event_id)
+                for contact in missed:
+                    replayed.add(contact.id)
+                    yield format_contact_event(contact)
+            
+            while contact_broadcaster.is_subscribed(queue) or not queue.empty():
+                try:
+                    contact = await asyncio.wait_for(queue.get(), timeout=CONTACT_STREAM_HEARTBEAT)
+                except asyncio.TimeoutError:
+                    if await request.is_disconnected():
+                        break
+                    yield ": heartbeat\n\n"
+                    continue
+                if contact.id in replayed:
+                    continue
+                yield format_contact_event(contact)
+        finally:
+            contact_broadcaster.unsubscribe(queue)
+    
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
 
 # Admin Routes
-@api_router.post("/auth/login", response_model=Token)
+@api_router.post(
+    "/auth/login",
+    response_model=Token,
+    dependencies=[Depends(rate_limit("login", LOGIN_RATE_LIMIT))]
+)
 async def login_admin(admin_data: AdminLogin):
     """Admin login"""
     admin = await authenticate_admin(admin_data.username, admin_data.password)
@@ -403,11 +3629,27 @@ async def login_admin(admin_data: AdminLogin):
             detail="Incorrect username or password",
             headers={"WWW-Authenticate": "Bearer"},
         )
-    access_token_expires = timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
-    access_token = create_access_token(
-        data={"sub": admin.username}, expires_delta=access_token_expires
-    )
-    return {"access_token": access_token, "token_type": "bearer"}
+    return await issue_tokens(admin.username)
+
+@api_router.post("/auth/refresh", response_model=Token)
+async def refresh_access_token(token_data: RefreshTokenRequest):
+    """Renew the access token without a password (the refresh token is replaced as well)"""
+    tokens = await rotate_refresh_token(token_data.refresh_token)
+    if tokens is None:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Sitzung abgelaufen. Bitte erneut anmelden.",
+            headers={"WWW-Authenticate": "Bearer"},
+        )
+    return tokens
+
+@api_router.post("/auth/logout")
+async def logout_admin(token_data: RefreshTokenRequest):
+    """End a session by revoking its refresh token family"""
+    token = await db.refresh_tokens.find_one({"_id": hash_refresh_token(token_data.refresh_token)}, {"family_id": 1})
+    if token:
+        await db.refresh_tokens.delete_many({"family_id": token["family_id"]})
+    return {"message": "Abgemeldet"}
 
 @api_router.get("/auth/me")
 async def read_admin_me(current_admin: AdminUser = Depends(get_current_admin)):
@@ -420,50 +3662,100 @@ async def create_blog_post_admin(
     current_admin: AdminUser = Depends(get_current_admin)
 ):
     """Create new blog post (admin only)"""
-    slug = create_slug(post_data.title)
-    
-    # Check if slug already exists
-    existing_post = await db.blog_posts.find_one({"slug": slug})
-    if existing_post:
-        slug = f"{slug}-{str(uuid.uuid4())[:8]}"
-    
-    post_dict = post_data.dict()
-    post_dict["slug"] = slug
+    post_dict = process_post_content(apply_publish_schedule(post_data.dict()))
+    post_dict["slug"] = create_slug(post_data.title)
     post_obj = BlogPost(**post_dict)
     
-    mongo_data = prepare_for_mongo(post_obj.dict())
-    await db.blog_posts.insert_one(mongo_data)
-    
-    return post_obj
+    return await insert_post_with_unique_slug(post_obj)
 
 @api_router.put("/admin/blog/posts/{post_id}", response_model=BlogPost)
 async def update_blog_post_admin(
     post_id: str, 
     post_data: BlogPostUpdate,
+    response: Response,
+    if_match: Optional[str] = Header(None),
     current_admin: AdminUser = Depends(get_current_admin)
 ):
     """Update blog post (admin only)"""
-    existing_post = await db.blog_posts.find_one({"id": post_id})
-    if not existing_post:
-        raise HTTPException(status_code=404, detail="Blog post nicht gefunden")
-    
-    update_data = {k: v for k, v in post_data.dict().items() if v is not None}
+    update_data = process_post_content({k: v for k, v in post_data.dict().items() if v is not None})
     update_data["updated_at"] = datetime.now(timezone.utc).isoformat()
     
     # Update slug if title changed
     if "title" in update_data:
-        new_slug = create_slug(update_data["title"])
-        # Check if new slug already exists
-        slug_exists = await db.blog_posts.find_one({"slug": new_slug, "id": {"$ne": post_id}})
-        if slug_exists:
-            new_slug = f"{new_slug}-{str(uuid.uuid4())[:8]}"
-        update_data["slug"] = new_slug
+        update_data["slug"] = create_slug(update_data["title"])
     
-    await db.blog_posts.update_one({"id": post_id}, {"$set": update_data})
-    
-    updated_post = await db.blog_posts.find_one({"id": post_id})
+    updated_post = await apply_post_update(post_id, update_data, parse_if_match(if_match))
+    response.headers["ETag"] = f'"{updated_post["version"]}"'
     return BlogPost(**parse_from_mongo(updated_post))
 
+@api_router.patch("/admin/blog/posts/{post_id}", response_model=BlogPostPatchResponse)
+async def patch_blog_post_admin(
+    post_id: str,
+    patch: Union[BlogPostPatch, List[JsonPatchOperation]],
+    response: Response,
+    if_match: Optional[str] = Header(None),
+    current_admin: AdminUser = Depends(get_current_admin)
+):
+    """Apply a partial update to a blog post (admin only)
+
+    Accepts a bare RFC 6902 array or an object with JSON Patch operations
+    and per-field text deltas, so editor autosaves only send what changed.
+    Text deltas must name the version they were made against.
+    """
+    if isinstance(patch, list):
+        patch = BlogPostPatch(operations=patch)
+    expected_version = patch.base_version if patch.base_version is not None else parse_if_match(if_match)
+    if patch.text_deltas and expected_version is None:
+        raise HTTPException(status_code=428, detail="Text deltas require base_version or If-Match")
+    
+    projection = {field: 1 for field in PATCHABLE_POST_FIELDS}
+    projection.update({"_id": 0, "version": 1})
+    current = await db.blog_posts.find_one({"id": post_id}, projection)
+    if not current:
+        raise HTTPException(status_code=404, detail="Blog post nicht gefunden")
+    current_version = current.pop("version", 1)
+    if expected_version is not None and current_version != expected_version:
+        raise HTTPException(
+            status_code=status.HTTP_412_PRECONDITION_FAILED,
+            detail="Blog post wurde zwischenzeitlich geändert. Bitte neu laden."
+        )
+    
+    patched = apply_json_patch(current, patch.operations)
+    for field, delta in patch.text_deltas.items():
+        if field not in PATCHABLE_POST_FIELDS or not isinstance(patched.get(field), str):
+            raise HTTPException(status_code=422, detail=f"Text deltas are not supported for: {field}")
+        patched[field] = apply_text_delta(patched[field], delta)
+    
+    try:
+        validated = prepare_for_mongo(BlogPostCreate(**patched).dict())
+    except ValidationError as e:
+        raise HTTPException(status_code=422, detail=e.errors())
+    sent = dict(validated)
+    validated = process_post_content(validated)
+    normalized_fields = sorted(field for field in validated if validated[field] != sent[field])
+    update_data = {field: value for field, value in validated.items() if current.get(field) != value}
+    
+    if update_data:
+        update_data["updated_at"] = datetime.now(timezone.utc).isoformat()
+        if "title" in update_data:
+            update_data["slug"] = create_slug(update_data["title"])
+        # Guarded by the version read above, so a concurrent save in between yields 412
+        updated_post = await apply_post_update(post_id, update_data, current_version)
+    else:
+        updated_post = await db.blog_posts.find_one({"id": post_id}, {"id": 1, "slug": 1, "version": 1, "updated_at": 1})
+        if not updated_post:
+            raise HTTPException(status_code=404, detail="Blog post nicht gefunden")
+    
+    response.headers["ETag"] = f'"{updated_post["version"]}"'
+    return BlogPostPatchResponse(
+        id=updated_post["id"],
+        slug=updated_post["slug"],
+        version=updated_post["version"],
+        updated_at=datetime.fromisoformat(updated_post["updated_at"]),
+        changed_fields=sorted(field for field in update_data if field != "updated_at"),
+        normalized_fields=normalized_fields
+    )
+
 @api_router.delete("/admin/blog/posts/{post_id}")
 async def delete_blog_post_admin(
     post_id: str,
@@ -473,70 +3765,353 @@ async def delete_blog_post_admin(
     result = await db.blog_posts.delete_one({"id": post_id})
     if result.deleted_count == 0:
         raise HTTPException(status_code=404, detail="Blog post nicht gefunden")
+    await delete_post_revisions([post_id])
+    await post_changed(operation="delete", post_id=post_id)
     return {"message": "Blog post gelöscht"}
 
+@api_router.get("/admin/blog/posts/{post_id}/revisions", response_model=List[BlogPostRevision])
+async def get_blog_post_revisions(post_id: str, current_admin: AdminUser = Depends(get_current_admin)):
+    """List the stored revisions of a blog post, newest first (admin only)"""
+    revisions = await db.post_revisions.find(
+        {"post_id": post_id},
+        {"_id": 0, "data": 0}
+    ).sort("version", -1).to_list(1000)
+    return [BlogPostRevision(**parse_from_mongo(revision)) for revision in revisions]
+
+@api_router.get("/admin/blog/posts/{post_id}/revisions/{version}", response_model=BlogPost)
+async def get_blog_post_revision(post_id: str, version: int, current_admin: AdminUser = Depends(get_current_admin)):
+    """Get a blog post as it was at an earlier version (admin only)"""
+    post = await reconstruct_post_revision(post_id, version)
+    return BlogPost(**parse_from_mongo(post))
+
+@api_router.post("/admin/blog/posts/bulk", response_model=BlogPostBulkResponse)
+async def bulk_blog_posts_admin(
+    bulk_request: BlogPostBulkRequest,
+    current_admin: AdminUser = Depends(get_current_admin)
+):
+    """Publish, unpublish, delete, retag posts and rename or merge tags in one request (admin only)
+
+    Per-post operations run as a single unordered bulk_write; tag renames and
+    merges each run as one server-side update_many.
+    """
+    results = [
+        BlogPostBulkResult(index=index, op=operation.op, post_id=operation.post_id, status="ok")
+        for index, operation in enumerate(bulk_request.operations)
+    ]
+    now = datetime.now(timezone.utc).isoformat()
+    
+    post_ops = []
+    post_op_results = []
+    tag_ops = []
+    for result, operation in zip(results, bulk_request.operations):
+        if operation.op in ("rename_tag", "merge_tags"):
+            if not operation.from_tags or not operation.to_tag:
+                result.status, result.detail = "invalid", "from_tags and to_tag are required"
+            else:
+                tag_ops.append((result, operation))
+        elif not operation.post_id:
+            result.status, result.detail = "invalid", "post_id is required"
+        elif operation.op == "retag" and operation.tags is None:
+            result.status, result.detail = "invalid", "tags is required"
+        else:
+            post_op_results.append((result, operation))
+    
+    # One lookup tells which posts exist and which operations would change nothing
+    post_ids = list({operation.post_id for _, operation in post_op_results})
+    existing = {}
+    if post_ids:
+        async for post in db.blog_posts.find({"id": {"$in": post_ids}}, {"id": 1, "published": 1, "publish_at": 1, "tags": 1}):
+            existing[post["id"]] = post
+    
+    bulk_results = []
+    for result, operation in post_op_results:
+        post = existing.get(operation.post_id)
+        if post is None:
+            result.status = "not_found"
+            continue
+        if operation.op == "delete":
+            post_ops.append(DeleteOne({"id": operation.post_id}))
+            del existing[operation.post_id]
+        else:
+            if operation.op == "retag":
+                changes = {"tags": operation.tags}
+            elif operation.op == "publish":
+                changes = {"published": True, "publish_at": None}
+            else:
+                changes = {"published": False, "publish_at": None}
+            # Publishing a published post must not bump its version or updated_at
+            if all(post.get(field) == value for field, value in changes.items()):
+                continue
+            post.update(changes)
+            changes["updated_at"] = now
+            post_ops.append(UpdateOne({"id": operation.post_id}, {"$set": changes, "$inc": {"version": 1}}))
+        result.modified = 1
+        bulk_results.append(result)
+    
+    modified = 0
+    if post_ops:
+        try:
+            bulk_result = await db.blog_posts.bulk_write(post_ops, ordered=False)
+            modified = bulk_result.modified_count + bulk_result.deleted_count
+        except BulkWriteError as e:
+            modified = e.details.get("nModified", 0) + e.details.get("nRemoved", 0)
+            for error in e.details.get("writeErrors", []):
+                failed = bulk_results[error["index"]]
+                failed.status, failed.modified, failed.detail = "error", 0, error.get("errmsg")
+    
+    deleted_ids = [
+        operation.post_id for result, operation in post_op_results
+        if operation.op == "delete" and result.status == "ok"
+    ]
+    if deleted_ids:
+        await delete_post_revisions(deleted_ids)
+    
+    for result, operation in tag_ops:
+        try:
+            update_result = await db.blog_posts.update_many(
+                {"tags": {"$in": operation.from_tags}},
+                tag_merge_pipeline(operation.from_tags, operation.to_tag) + [{"$set": {
+                    "updated_at": now,
+                    "version": {"$add": ["$version", 1]}
+                }}]
+            )
+            result.modified = update_result.modified_count
+            modified += update_result.modified_count
+        except Exception as e:
+            result.status, result.detail = "error", str(e)
+    
+    if modified:
+        await invalidation_bus.notify(InvalidationEvent(collection="blog_posts", operation="flush"))
+    return BlogPostBulkResponse(results=results, modified=modified)
+
+@api_router.post("/admin/blog/import", response_model=BlogPostImportResult)
+async def import_blog_posts_admin(
+    request: Request,
+    format: str = Query(..., pattern="^(wxr|markdown)$"),
+    current_admin: AdminUser = Depends(get_current_admin)
+):
+    """Import posts from a WordPress WXR export or a zip of Markdown files sent as the raw request body (admin only)
+
+    The upload is spooled to a temporary file and parsed incrementally.
+    Importing the same export again only adds entries that are new.
+    """
+    with tempfile.TemporaryFile() as spool:
+        size = 0
+        async for chunk in request.stream():
+            size += len(chunk)
+            if size > IMPORT_MAX_SIZE:
+                raise HTTPException(status_code=400, detail=f"File too large. Maximum size is {IMPORT_MAX_SIZE // (1024 * 1024)}MB.")
+            spool.write(chunk)
+        spool.seek(0)
+        entries = iter_wxr_posts(spool) if format == "wxr" else iter_markdown_zip(spool)
+        return await import_blog_posts(entries)
+
 @api_router.get("/admin/blog/posts", response_model=List[BlogPost])
 async def get_all_blog_posts_admin(current_admin: AdminUser = Depends(get_current_admin)):
     """Get all blog posts including unpublished (admin only)"""
     posts = await db.blog_posts.find().sort("created_at", -1).to_list(100)
-    return [BlogPost(**parse_from_mongo(post)) for post in posts]
+    with span("parse"):
+        return [BlogPost(**parse_from_mongo(post)) for post in posts]
 
 @api_router.post("/admin/upload/image", response_model=ImageUploadResponse)
 async def upload_image(
+    request: Request,
     file: UploadFile = File(...),
     current_admin: AdminUser = Depends(get_current_admin)
 ):
-    """Upload image for blog posts (admin only)"""
-    # Validate file type
-    allowed_types = ["image/jpeg", "image/png", "image/gif", "image/webp"]
-    if file.content_type not in allowed_types:
-        raise HTTPException(
-            status_code=400, 
-            detail="Invalid file type. Only JPEG, PNG, GIF, and WebP are allowed."
+    """Upload image for blog posts (admin only)
+
+    The format is taken from the file's magic bytes rather than the declared
+    content type. Images are stored once per distinct content; uploading the
+    same bytes again only records metadata and returns the existing URL.
+    """
+    return await save_image_upload(request, upload_file_chunks(file), file.filename)
+
+@api_router.post("/admin/upload/image/stream", response_model=ImageUploadResponse)
+async def upload_image_stream(
+    request: Request,
+    filename: Optional[str] = None,
+    current_admin: AdminUser = Depends(get_current_admin)
+):
+    """Upload an image sent as the raw request body (admin only)
+
+    Unlike the multipart endpoint the body is consumed as it arrives, so an
+    oversized or non-image upload is aborted after its first offending chunk.
+    """
+    content_length = request.headers.get("content-length")
+    if content_length and content_length.isdigit() and int(content_length) > IMAGE_MAX_SIZE:
+        raise HTTPException(status_code=400, detail=f"File too large. Maximum size is {IMAGE_MAX_SIZE // (1024 * 1024)}MB.")
+    return await save_image_upload(request, request.stream(), filename)
+
+@api_router.post("/admin/upload/image/presign", response_model=ImagePresignResponse)
+async def presign_image_upload(
+    upload: ImagePresignRequest,
+    current_admin: AdminUser = Depends(get_current_admin)
+):
+    """Hand out a presigned POST so the browser uploads an image straight to the bucket (admin only)
+
+    The policy pins the content type and caps the size, so the API process
+    never sees the bytes. Call the complete endpoint once the upload is done.
+    """
+    if not S3_BUCKET:
+        raise HTTPException(status_code=503, detail="Direct uploads are not configured")
+    extension = IMAGE_EXTENSIONS.get(upload.content_type)
+    if extension is None:
+        raise HTTPException(status_code=400, detail="Invalid file type. Only JPEG, PNG, GIF, and WebP are allowed.")
+    if upload.size <= 0 or upload.size > IMAGE_MAX_SIZE:
+        raise HTTPException(status_code=400, detail=f"File too large. Maximum size is {IMAGE_MAX_SIZE // (1024 * 1024)}MB.")
+    
+    upload_id = str(uuid.uuid4())
+    tenant = current_tenant.get()
+    site_prefix = "" if tenant.id == DEFAULT_TENANT_ID else f"{tenant.id}/"
+    key = f"{S3_UPLOAD_PREFIX}{site_prefix}{upload_id}.{extension}"
+    try:
+        presigned = s3_client().generate_presigned_post(
+            Bucket=S3_BUCKET,
+            Key=key,
+            Fields={"Content-Type": upload.content_type},
+            Conditions=[
+                {"Content-Type": upload.content_type},
+                ["content-length-range", 1, IMAGE_MAX_SIZE]
+            ],
+            ExpiresIn=S3_PRESIGN_EXPIRES
         )
+    except (BotoCoreError, ClientError) as e:
+        logging.error(f"S3 presign error: {str(e)}")
+        raise HTTPException(status_code=500, detail="Image upload failed")
     
-    # Validate file size (max 5MB)
-    if file.size > 5 * 1024 * 1024:
-        raise HTTPException(status_code=400, detail="File too large. Maximum size is 5MB.")
+    now = datetime.now(timezone.utc)
+    await db.image_uploads.insert_one({
+        "id": upload_id,
+        "key": key,
+        "content_type": upload.content_type,
+        "original_filename": upload.filename,
+        "created_at": now.isoformat(),
+        # Unfinished uploads are forgotten by a TTL index; the bucket should expire the prefix likewise
+        "expires_at": now + timedelta(seconds=S3_PRESIGN_EXPIRES * 2)
+    })
+    return ImagePresignResponse(
+        upload_id=upload_id,
+        url=presigned["url"],
+        fields=presigned["fields"],
+        key=key,
+        expires_in=S3_PRESIGN_EXPIRES
+    )
+
+@api_router.post("/admin/upload/image/presign/{upload_id}/complete", response_model=ImageUploadResponse)
+async def complete_image_upload(upload_id: str, current_admin: AdminUser = Depends(get_current_admin)):
+    """Record a finished direct upload in the image library (admin only)
+
+    Only the first bytes of the object are fetched to confirm it really is
+    the announced image type. Completing the same upload twice is harmless.
+    """
+    upload = await db.image_uploads.find_one({"id": upload_id}, {"_id": 0})
+    if not upload:
+        image = await db.images.find_one({"id": upload_id}, {"_id": 0, "url": 1})
+        if image:
+            return ImageUploadResponse(status="success", url=image["url"], message="Image already recorded")
+        raise HTTPException(status_code=404, detail="Upload not found")
     
     try:
-        # Read file content
-        content = await file.read()
-        
-        # Create unique filename
-        file_extension = file.filename.split('.')[-1].lower()
-        unique_filename = f"{str(uuid.uuid4())}.{file_extension}"
-        
-        # Convert to base64 for storage (in production, use cloud storage)
-        image_base64 = base64.b64encode(content).decode('utf-8')
-        image_url = f"data:{file.content_type};base64,{image_base64}"
-        
-        # Store image metadata in database
-        image_doc = {
-            "id": str(uuid.uuid4()),
-            "filename": unique_filename,
-            "original_filename": file.filename,
-            "content_type": file.content_type,
-            "size": file.size,
-            "url": image_url,
+        head, size, etag = await asyncio.to_thread(read_s3_object_head, upload["key"])
+    except ClientError as e:
+        if e.response.get("Error", {}).get("Code") in ("NoSuchKey", "404", "InvalidRange"):
+            raise HTTPException(status_code=400, detail="Upload not found in storage. Upload the file before completing it.")
+        logging.error(f"S3 read error: {str(e)}")
+        raise HTTPException(status_code=500, detail="Image upload failed")
+    except BotoCoreError as e:
+        logging.error(f"S3 read error: {str(e)}")
+        raise HTTPException(status_code=500, detail="Image upload failed")
+    
+    detected = sniff_image_type(head)
+    if detected is None or detected[0] != upload["content_type"] or size > IMAGE_MAX_SIZE:
+        await delete_s3_object(upload["key"])
+        await db.image_uploads.delete_one({"id": upload_id})
+        raise HTTPException(status_code=400, detail="Invalid file type. Only JPEG, PNG, GIF, and WebP are allowed.")
+    
+    url = s3_object_url(upload["key"])
+    await db.images.update_one(
+        {"id": upload_id},
+        {"$setOnInsert": {
+            "id": upload_id,
+            "filename": upload["key"].rsplit("/", 1)[-1],
+            "original_filename": upload.get("original_filename"),
+            "content_type": upload["content_type"],
+            "size": size,
+            "storage": "s3",
+            "key": upload["key"],
+            "etag": etag,
+            "url": url,
             "created_at": datetime.now(timezone.utc).isoformat()
+        }},
+        upsert=True
+    )
+    await db.image_uploads.delete_one({"id": upload_id})
+    return ImageUploadResponse(status="success", url=url, message="Image uploaded successfully")
+
+@api_router.delete("/admin/images/{image_id}")
+async def delete_image(image_id: str, current_admin: AdminUser = Depends(get_current_admin)):
+    """Delete an uploaded image, freeing its content once no other upload uses it (admin only)"""
+    image = await db.images.find_one_and_delete({"id": image_id})
+    if not image:
+        raise HTTPException(status_code=404, detail="Image not found")
+    if image.get("sha256"):
+        await release_image_blob(image["sha256"])
+    elif image.get("storage") == "s3":
+        await delete_s3_object(image["key"])
+    return {"message": "Image deleted"}
+
+@api_router.get("/images/{image_name}", name="get_image")
+async def get_image(image_name: str):
+    """Serve stored image content; URLs are content-addressed and therefore cacheable forever"""
+    digest = image_name.split('.')[0]
+    blob = await db.image_blobs.find_one({"_id": digest})
+    if not blob:
+        raise HTTPException(status_code=404, detail="Image not found")
+    grid_out = await image_bucket().open_download_stream(blob["gridfs_id"])
+    
+    async def image_chunks():
+        while chunk := await grid_out.readchunk():
+            yield chunk
+    
+    return StreamingResponse(
+        image_chunks(),
+        media_type=blob["content_type"],
+        headers={
+            "Content-Length": str(grid_out.length),
+            "Cache-Control": "public, max-age=31536000, immutable",
+            "ETag": f'"{digest}"'
         }
-        
-        await db.images.insert_one(image_doc)
-        
-        return ImageUploadResponse(
-            status="success",
-            url=image_url,
-            message="Image uploaded successfully"
-        )
-        
-    except Exception as e:
-        logging.error(f"Image upload error: {str(e)}")
-        raise HTTPException(status_code=500, detail="Image upload failed")
+    )
+
+@api_router.get("/admin/profiles", response_model=List[RequestProfile])
+async def get_request_profiles(current_admin: AdminUser = Depends(get_current_admin)):
+    """Get the most recent request profiles (admin only)"""
+    profiles = await db.profiles.find().sort("created_at", -1).to_list(20)
+    return [RequestProfile(**parse_from_mongo(profile)) for profile in profiles]
+
+@api_router.get("/admin/profiles/{profile_id}", response_model=RequestProfile)
+async def get_request_profile(profile_id: str, current_admin: AdminUser = Depends(get_current_admin)):
+    """Get a single request profile (admin only)"""
+    profile = await db.profiles.find_one({"id": profile_id})
+    if not profile:
+        raise HTTPException(status_code=404, detail="Profile not found")
+    return RequestProfile(**parse_from_mongo(profile))
+
+@api_router.get("/admin/profiles/{profile_id}/folded", response_class=PlainTextResponse)
+async def get_request_profile_folded(profile_id: str, current_admin: AdminUser = Depends(get_current_admin)):
+    """Get the folded CPU stacks of a profile, ready for flamegraph.pl or speedscope (admin only)"""
+    profile = await db.profiles.find_one({"id": profile_id}, {"folded_stacks": 1})
+    if not profile:
+        raise HTTPException(status_code=404, detail="Profile not found")
+    return profile["folded_stacks"]
 
 # Include router
 app.include_router(api_router)
 
+# Request profiling middleware (inert unless an admin opts in per request)
+app.add_middleware(RequestProfilerMiddleware)
+
 # CORS middleware
 app.add_middleware(
     CORSMiddleware,
@@ -544,18 +4119,42 @@ app.add_middleware(
     allow_origins=os.environ.get('CORS_ORIGINS', '*').split(','),
     allow_methods=["*"],
     allow_headers=["*"],
+    # Response headers the admin frontend reads cross-origin (pagination, If-Match, retries, diagnostics)
+    expose_headers=[
+        "X-Next-Cursor", "ETag", "Retry-After", "Idempotent-Replayed", "Server-Timing", "X-Request-ID",
+        "X-Snapshot-Age", "Warning"
+    ],
 )
 
+# Server-Timing phase breakdown
+if SERVER_TIMING:
+    app.add_middleware(ServerTimingMiddleware)
+
+# Site selection (everything inside works against the selected site's database)
+if len(TENANTS) > 1:
+    app.add_middleware(TenantMiddleware)
+
+# Request IDs and sampled access logs (outermost, so the timing covers everything else)
+app.add_middleware(AccessLogMiddleware)
+
 # Configure logging
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
-)
+log_listener = configure_logging()
 logger = logging.getLogger(__name__)
 
 @app.on_event("startup")
 async def startup_event():
+    """Initialize every site; background tasks started here keep the site they were started for"""
+    for tenant in TENANTS.values():
+        token = current_tenant.set(tenant)
+        try:
+            await init_tenant(tenant)
+        finally:
+            current_tenant.reset(token)
+
+async def init_tenant(tenant: Tenant):
     """Initialize database with sample blog posts and admin user"""
+    # Started first so that a database outage during startup still leaves the snapshot refreshing
+    await post_snapshot.start()
     try:
         # Create default admin user if it doesn't exist
         existing_admin = await db.admin_users.find_one({"username": "admin"})
@@ -568,12 +4167,54 @@ async def startup_event():
                 "created_at": datetime.now(timezone.utc).isoformat()
             }
             await db.admin_users.insert_one(admin_user)
+            await invalidation_bus.notify(InvalidationEvent(collection="admin_users", operation="insert", username="admin"))
             logger.info("Default admin user created (username: admin, password: admin123)")
         
+        # Slugs are allocated against this unique index instead of a check-then-insert
+        try:
+            await db.blog_posts.create_index("slug", unique=True)
+            slug_index_missing.discard(tenant.id)
+        except Exception as e:
+            slug_index_missing.add(tenant.id)
+            logger.error(f"Could not create unique slug index, post writes are disabled until duplicate slugs are resolved: {str(e)}")
+        try:
+            await db.blog_posts.create_index("id", unique=True)
+        except Exception as e:
+            logger.error(f"Could not create unique blog post id index, resolve duplicate ids first: {str(e)}")
+        try:
+            await db.blog_posts.create_index("source_id", unique=True, partialFilterExpression={"source_id": {"$exists": True}})
+        except Exception as e:
+            logger.error(f"Could not create unique source_id index, re-imports may duplicate posts: {str(e)}")
+        
+        if RATE_LIMIT_BACKEND == "mongo":
+            await db.rate_limits.create_index("expires_at", expireAfterSeconds=0)
+        
+        await db.refresh_tokens.create_index("expires_at", expireAfterSeconds=0)
+        await db.refresh_tokens.create_index("family_id")
+        
+        if S3_BUCKET:
+            await db.image_uploads.create_index("expires_at", expireAfterSeconds=0)
+        
+        # Contact ids must be unique so replayed spool segments cannot duplicate leads
+        await db.contacts.create_index("id", unique=True)
+        await db.contacts.create_index([("created_at", -1), ("id", -1)])
+        await db.contact_idempotency.create_index("expires_at", expireAfterSeconds=0)
+        await db.profiles.create_index("expires_at", expireAfterSeconds=0)
+        await db.contact_stats.create_index([("period", 1), ("start", 1)])
+        if not await db.contact_stats.count_documents({"_id": "all"}, limit=1):
+            counted = await rebuild_contact_stats()
+            if counted:
+                logger.info(f"Built contact statistics from {counted} existing contacts")
+        if CONTACT_WRITE_BEHIND:
+            try:
+                await contact_buffer.start()
+            except OSError as e:
+                logger.warning(f"Contact spool unavailable, writing contacts directly: {str(e)}")
+        
         # Check if blog posts exist
         existing_posts = await db.blog_posts.count_documents({})
         
-        if existing_posts == 0:
+        if existing_posts == 0 and tenant.seed_sample_posts:
             # Create sample blog posts with enhanced SEO fields
             sample_posts = [
                 {
@@ -694,12 +4335,32 @@ async def startup_event():
                 }]
             
             # Insert sample posts
+            for post in sample_posts:
+                process_post_content(post)
             await db.blog_posts.insert_many(sample_posts)
             logger.info("Sample blog posts created")
+        
+        # Posts written before versioning start at version 1
+        await db.blog_posts.update_many({"version": {"$exists": False}}, {"$set": {"version": 1}})
+        
+        await invalidation_bus.start()
+        await db.blog_posts.create_index([("published", 1), ("publish_at", 1)])
+        await db.post_revisions.create_index([("post_id", 1), ("version", 1)], unique=True)
+        await publish_scheduler.start()
             
     except Exception as e:
         logger.error(f"Startup error: {str(e)}")
 
 @app.on_event("shutdown")
 async def shutdown_db_client():
-    client.close()
\ No newline at end of file
+    for tenant in TENANTS.values():
+        token = current_tenant.set(tenant)
+        try:
+            await contact_buffer.drain()
+            await publish_scheduler.stop()
+            await post_snapshot.stop()
+            await invalidation_bus.stop()
+        finally:
+            current_tenant.reset(token)
+    client.close()
+    log_listener.stop()
\ No newline at end of file
@@ -14,10 +14,10 @@ class RudiMediaAPITester:
         self.errors = []
         self.admin_token = None
 
-    def run_test(self, name, method, endpoint, expected_status, data=None, check_response=None, files=None, use_auth=False):
+    def run_test(self, name, method, endpoint, expected_status, data=None, check_response=None, files=None, use_auth=False, extra_headers=None):
         """Run a single API test"""
         url = f"{self.api_url}/{endpoint}" if endpoint else f"{self.api_url}/"
-        headers = {}
+        headers = dict(extra_headers or {})
         
         # Add authentication header if needed
         if use_auth and self.admin_token:
@@ -45,6 +45,8 @@ class RudiMediaAPITester:
                     response = requests.post(url, json=data, headers=headers, timeout=10)
             elif method == 'PUT':
                 response = requests.put(url, json=data, headers=headers, timeout=10)
+            elif method == 'PATCH':
+                response = requests.patch(url, json=data, headers=headers, timeout=10)
             elif method == 'DELETE':
                 response = requests.delete(url, headers=headers, timeout=10)
 
@@ -202,6 +204,31 @@ class RudiMediaAPITester:
             check_response=check_contact_response
         )
 
+    def test_contact_form_idempotent_retry(self):
+        """Test that a retry with the same Idempotency-Key replays the original response"""
+        contact_data = {
+            "name": "Retry User",
+            "email": "retry@example.com",
+            "message": f"Test-Nachricht mit Wiederholung {datetime.now().isoformat()}"
+        }
+        headers = {'Idempotency-Key': f"test-{datetime.now().timestamp()}"}
+        
+        first, _ = self.run_test("Contact Form Submission (Idempotency-Key)", "POST", "contact", 200, data=contact_data, extra_headers=headers)
+        if not first:
+            return False, {}
+        
+        self.tests_run += 1
+        print(f"\n🔍 Testing Contact Form Retry (Idempotency-Key)...")
+        response = requests.post(f"{self.api_url}/contact", json=contact_data, headers=headers, timeout=10)
+        print(f"   Status Code: {response.status_code}, Idempotent-Replayed: {response.headers.get('Idempotent-Replayed')}")
+        if response.status_code != 200 or response.headers.get('Idempotent-Replayed') != 'true':
+            print("❌ Failed - Retry was not answered from the original response")
+            self.errors.append("Contact Form Retry: Expected replayed 200 response")
+            return False, {}
+        self.tests_passed += 1
+        print("✅ Passed - Status: 200")
+        return True, response.json()
+
     def test_contact_form_validation(self):
         """Test contact form validation with invalid data"""
         invalid_data = {
@@ -231,8 +258,9 @@ class RudiMediaAPITester:
                 print("   Missing access_token or token_type in response")
                 return False
             
-            # Store token for subsequent tests
+            # Store tokens for subsequent tests
             self.admin_token = data["access_token"]
+            self.refresh_token = data.get("refresh_token")
             print(f"   Token received: {self.admin_token[:20]}...")
             return data["token_type"] == "bearer"
             
@@ -245,6 +273,41 @@ class RudiMediaAPITester:
             check_response=check_login_response
         )
 
+    def test_refresh_token_rotation(self):
+        """Test renewing the access token and that a used refresh token cannot be replayed"""
+        if not getattr(self, 'refresh_token', None):
+            print("   Skipping - no refresh token available")
+            return False, {}
+        
+        used_token = self.refresh_token
+        
+        def check_refresh_response(data):
+            if not data.get("access_token") or not data.get("refresh_token"):
+                print("   Missing access_token or refresh_token in response")
+                return False
+            self.admin_token = data["access_token"]
+            self.refresh_token = data["refresh_token"]
+            return data["refresh_token"] != used_token
+            
+        success, _ = self.run_test(
+            "Refresh Access Token",
+            "POST",
+            "auth/refresh",
+            200,
+            data={"refresh_token": used_token},
+            check_response=check_refresh_response
+        )
+        if not success:
+            return False, {}
+        
+        return self.run_test(
+            "Refresh Access Token - Replayed Token",
+            "POST",
+            "auth/refresh",
+            401,
+            data={"refresh_token": used_token}
+        )
+
     def test_admin_login_invalid_credentials(self):
         """Test admin login with invalid credentials"""
         invalid_login_data = {
@@ -404,6 +467,47 @@ class RudiMediaAPITester:
             check_response=check_update_response
         )
 
+    def test_patch_blog_post_admin(self):
+        """Test a JSON Patch partial update via admin endpoint"""
+        if not hasattr(self, 'created_post_id'):
+            print("   Skipping - no post ID available")
+            return False, {}
+            
+        patch_data = [
+            {"op": "replace", "path": "/excerpt", "value": "Per PATCH aktualisierte Kurzbeschreibung"},
+            {"op": "add", "path": "/tags/-", "value": "Autosave"}
+        ]
+        
+        def check_patch_response(data):
+            print(f"   Changed fields: {data.get('changed_fields')}, version {data.get('version')}")
+            return data.get('changed_fields') == ['excerpt', 'tags']
+            
+        return self.run_test(
+            "Patch Blog Post (Admin)",
+            "PATCH",
+            f"admin/blog/posts/{self.created_post_id}",
+            200,
+            data=patch_data,
+            use_auth=True,
+            check_response=check_patch_response
+        )
+
+    def test_update_blog_post_stale_version(self):
+        """Test that an update with an outdated If-Match version is rejected"""
+        if not hasattr(self, 'created_post_id'):
+            print("   Skipping - no post ID available")
+            return False, {}
+            
+        return self.run_test(
+            "Update Blog Post - Stale If-Match",
+            "PUT",
+            f"admin/blog/posts/{self.created_post_id}",
+            412,
+            data={"excerpt": "Dieser Stand ist veraltet"},
+            use_auth=True,
+            extra_headers={"If-Match": '"0"'}
+        )
+
     def test_delete_blog_post_admin(self):
         """Test deleting a blog post via admin endpoint"""
         if not hasattr(self, 'created_post_id'):
@@ -422,6 +526,73 @@ class RudiMediaAPITester:
             check_response=check_delete_response
         )
 
+    def test_bulk_blog_posts_admin(self):
+        """Test bulk post operations report a result per item"""
+        bulk_data = {
+            "operations": [
+                {"op": "publish", "post_id": "non-existent-id"},
+                {"op": "retag", "post_id": "non-existent-id"},
+                {"op": "rename_tag", "from_tags": ["Bulk-Test-Alt"], "to_tag": "Bulk-Test-Neu"}
+            ]
+        }
+        
+        def check_bulk_response(data):
+            statuses = [result['status'] for result in data.get('results', [])]
+            print(f"   Item statuses: {statuses}, modified: {data.get('modified')}")
+            # No post carries the renamed tag, so nothing may be reported as changed
+            return statuses == ["not_found", "invalid", "ok"] and data.get('modified') == 0
+            
+        return self.run_test(
+            "Bulk Blog Post Operations (Admin)",
+            "POST",
+            "admin/blog/posts/bulk",
+            200,
+            data=bulk_data,
+            use_auth=True,
+            check_response=check_bulk_response
+        )
+
+    def test_blog_import_wxr_admin(self):
+        """Test importing a WordPress export twice; the second run must skip the already imported post"""
+        post_id = datetime.now().strftime('%H%M%S%f')
+        wxr = f"""<?xml version="1.0" encoding="UTF-8"?>
+<rss version="2.0" xmlns:content="http://purl.org/rss/1.0/modules/content/" xmlns:wp="http://wordpress.org/export/1.2/" xmlns:dc="http://purl.org/dc/elements/1.1/">
+<channel><title>Rudi Media</title>
+<item><title>Import Test {post_id}</title><dc:creator>Test</dc:creator>
+<content:encoded><![CDATA[Erster Absatz
+
+Zweiter Absatz]]></content:encoded>
+<wp:post_id>test-{post_id}</wp:post_id><wp:post_date_gmt>2024-01-01 10:00:00</wp:post_date_gmt>
+<wp:post_name>import-test-{post_id}</wp:post_name><wp:status>draft</wp:status><wp:post_type>post</wp:post_type>
+<category domain="post_tag" nicename="test"><![CDATA[Test]]></category></item>
+</channel></rss>""".encode('utf-8')
+        
+        self.tests_run += 1
+        print(f"\n🔍 Testing Blog Import (WXR, Admin)...")
+        results = []
+        for _ in range(2):
+            response = requests.post(
+                f"{self.api_url}/admin/blog/import?format=wxr",
+                data=wxr,
+                headers={'Authorization': f"Bearer {self.admin_token}", 'Content-Type': 'application/xml'},
+                timeout=30
+            )
+            print(f"   Status Code: {response.status_code}")
+            if response.status_code != 200:
+                print(f"❌ Failed - Expected 200, got {response.status_code}")
+                self.errors.append(f"Blog Import (WXR): Expected 200, got {response.status_code}")
+                return False, {}
+            results.append(response.json())
+        
+        print(f"   First run: {results[0]}, second run: {results[1]}")
+        if results[0].get('imported') != 1 or results[1].get('imported') != 0 or results[1].get('skipped') != 1:
+            print("❌ Failed - Re-import did not skip the existing post")
+            self.errors.append("Blog Import (WXR): Re-import did not skip the existing post")
+            return False, results
+        self.tests_passed += 1
+        print("✅ Passed - Status: 200")
+        return True, results
+
     # ===== IMAGE UPLOAD TESTS =====
     
     def test_image_upload_admin(self):
@@ -446,12 +617,12 @@ class RudiMediaAPITester:
                 print(f"   Upload status not success: {data['status']}")
                 return False
                 
-            if not data['url'].startswith('data:image/png;base64,'):
-                print(f"   Invalid image URL format: {data['url'][:50]}...")
+            if '/api/images/' not in data['url'] or not data['url'].endswith('.png'):
+                print(f"   Invalid image URL format: {data['url'][:80]}...")
                 return False
                 
             print(f"   Image uploaded successfully")
-            print(f"   URL length: {len(data['url'])} characters")
+            print(f"   URL: {data['url']}")
             
             return True
             
@@ -465,6 +636,48 @@ class RudiMediaAPITester:
             check_response=check_upload_response
         )
 
+    def test_presigned_image_upload_admin(self):
+        """Test the direct-to-bucket upload flow: presign, upload to storage, complete"""
+        test_image_data = base64.b64decode(
+            'iVBORw0KGgoAAAANSUhEUgAAAAEAAAABCAYAAAAfFcSJAAAADUlEQVR42mP8/5+hHgAHggJ/PchI7wAAAABJRU5ErkJggg=='
+        )
+        
+        response = requests.post(
+            f"{self.api_url}/admin/upload/image/presign",
+            json={"content_type": "image/png", "size": len(test_image_data), "filename": "test_image.png"},
+            headers={'Authorization': f"Bearer {self.admin_token}"},
+            timeout=10
+        )
+        if response.status_code == 503:
+            print("\n   Skipping presigned upload - no bucket configured")
+            return False, {}
+        if response.status_code != 200:
+            print(f"\n❌ Presign failed - Status: {response.status_code}")
+            self.errors.append(f"Image Upload - Presign: Expected 200, got {response.status_code}")
+            return False, {}
+        presign = response.json()
+        
+        storage_response = requests.post(
+            presign['url'],
+            data=presign['fields'],
+            files={'file': ('test_image.png', io.BytesIO(test_image_data), 'image/png')},
+            timeout=10
+        )
+        print(f"   Storage upload status: {storage_response.status_code}")
+        
+        def check_complete_response(data):
+            print(f"   URL: {data.get('url')}")
+            return data.get('status') == 'success' and data.get('url', '').endswith(presign['key'])
+            
+        return self.run_test(
+            "Image Upload - Complete Presigned (Admin)",
+            "POST",
+            f"admin/upload/image/presign/{presign['upload_id']}/complete",
+            200,
+            use_auth=True,
+            check_response=check_complete_response
+        )
+
     def test_image_upload_unauthorized(self):
         """Test image upload without authentication"""
         test_image_data = base64.b64decode(
@@ -519,6 +732,78 @@ class RudiMediaAPITester:
             check_response=check_contacts_response
         )
 
+    def test_admin_contact_stats(self):
+        """Test contact statistics rollups (admin only)"""
+        def check_stats_response(data):
+            for field in ['total', 'hours', 'days', 'weeks', 'months']:
+                if field not in data:
+                    print(f"   Missing field in response: {field}")
+                    return False
+            print(f"   {data['total']} contacts total, {len(data['days'])} active days")
+            return len(data['hours']) == 24
+            
+        return self.run_test(
+            "Admin Contact Stats",
+            "GET",
+            "admin/stats/contacts?days=7",
+            200,
+            use_auth=True,
+            check_response=check_stats_response
+        )
+
+    def test_contact_stream_token(self):
+        """Test opening the contact stream the way EventSource does: token in the query string, no header"""
+        success, data = self.run_test("Contact Stream Token (Admin)", "POST", "admin/contacts/stream/token", 200, use_auth=True)
+        if not success:
+            return False, {}
+        
+        self.tests_run += 1
+        print(f"\n🔍 Testing Contact Stream with ?token=...")
+        response = requests.get(
+            f"{self.api_url}/admin/contacts/stream",
+            params={'token': data['token']},
+            headers={'Accept': 'text/event-stream'},
+            stream=True,
+            timeout=10
+        )
+        try:
+            first_line = next(response.iter_lines(decode_unicode=True), '') if response.status_code == 200 else ''
+        finally:
+            response.close()
+        print(f"   Status Code: {response.status_code}, first line: {first_line!r}")
+        if response.status_code != 200 or not first_line.startswith('retry:'):
+            print("❌ Failed - Stream did not open with the stream token")
+            self.errors.append(f"Contact Stream Token: Expected 200 event stream, got {response.status_code}")
+            return False, {}
+        self.tests_passed += 1
+        print("✅ Passed - Status: 200")
+        
+        # A stream token must not work as an access token
+        return self.run_test(
+            "Stream Token Rejected as Access Token",
+            "GET",
+            "auth/me",
+            401,
+            extra_headers={'Authorization': f"Bearer {data['token']}"}
+        )
+
+    def test_admin_contacts_paginated(self):
+        """Test fetching a single page of contacts (admin only)"""
+        def check_page_response(data):
+            if not isinstance(data, list):
+                print(f"   Expected list, got {type(data)}")
+                return False
+            return len(data) <= 1
+            
+        return self.run_test(
+            "Admin Contacts - First Page",
+            "GET",
+            "contacts?limit=1",
+            200,
+            use_auth=True,
+            check_response=check_page_response
+        )
+
     def test_admin_contacts_unauthorized(self):
         """Test contacts endpoint without authentication"""
         return self.run_test(
@@ -528,6 +813,39 @@ class RudiMediaAPITester:
             403  # FastAPI returns 403 for missing auth
         )
 
+    # ===== REQUEST PROFILING TESTS =====
+    
+    def test_profiled_request(self):
+        """Test opt-in profiling of a single admin request"""
+        self.run_test(
+            "Profiled Blog Posts List",
+            "GET",
+            "blog/posts?published_only=true&_profile=1",
+            200,
+            use_auth=True
+        )
+        
+        def check_profiles_response(data):
+            if not isinstance(data, list) or len(data) == 0:
+                print("   No request profiles stored")
+                return False
+            profile = data[0]
+            for field in ['id', 'path', 'duration_ms', 'folded_stacks', 'top_allocations']:
+                if field not in profile:
+                    print(f"   Missing field: {field}")
+                    return False
+            print(f"   Latest profile: {profile['path']} ({profile['duration_ms']} ms, {profile['sample_count']} samples)")
+            return True
+            
+        return self.run_test(
+            "Request Profiles List",
+            "GET",
+            "admin/profiles",
+            200,
+            use_auth=True,
+            check_response=check_profiles_response
+        )
+
 def main():
     print("🚀 Starting Enhanced Rudi-Media API Tests")
     print("=" * 60)
@@ -565,6 +883,7 @@ def main():
     
     # Test contact form
     tester.test_contact_form_submission()
+    tester.test_contact_form_idempotent_retry()
     tester.test_contact_form_validation()
     
     # ===== ADMIN AUTHENTICATION TESTS =====
@@ -577,6 +896,7 @@ def main():
     
     if login_success:
         tester.test_admin_me()
+        tester.test_refresh_token_rotation()
     
     # Test unauthorized access
     tester.test_admin_me_unauthorized()
@@ -595,7 +915,12 @@ def main():
         if create_success:
             # Test update and delete
             tester.test_update_blog_post_admin()
+            tester.test_update_blog_post_stale_version()
+            tester.test_patch_blog_post_admin()
             tester.test_delete_blog_post_admin()
+        
+        tester.test_bulk_blog_posts_admin()
+        tester.test_blog_import_wxr_admin()
     
     # Test unauthorized access to admin endpoints
     tester.test_admin_blog_posts_unauthorized()
@@ -608,6 +933,7 @@ def main():
     if login_success:
         tester.test_image_upload_admin()
         tester.test_image_upload_invalid_file_type()
+        tester.test_presigned_image_upload_admin()
     
     tester.test_image_upload_unauthorized()
     
@@ -617,9 +943,19 @@ def main():
     
     if login_success:
         tester.test_admin_contacts_list()
+        tester.test_admin_contacts_paginated()
+        tester.test_admin_contact_stats()
+        tester.test_contact_stream_token()
     
     tester.test_admin_contacts_unauthorized()
     
+    # ===== REQUEST PROFILING TESTS =====
+    print("\n⏱️  REQUEST PROFILING TESTS")
+    print("-" * 30)
+    
+    if login_success:
+        tester.test_profiled_request()
+    
     # ===== FINAL RESULTS =====
     print("\n" + "=" * 60)
     print(f"📊 Test Results: {tester.tests_passed}/{tester.tests_run} passed")
@@ -644,7 +980,7 @@ def main():
     print("   - Admin credentials: admin/admin123")
     print("   - All admin endpoints require JWT authentication")
     print("   - SEO fields: meta_description, meta_keywords, featured_image")
-    print("   - Image uploads are stored as base64 data URLs")
+    print("   - Image uploads are stored once per SHA-256 and served from /api/images/")
     print("   - Email sending may fail (SendGrid API key not configured)")
     
     return 0 if tester.tests_passed == tester.tests_run else 1
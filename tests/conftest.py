@@ -0,0 +1,13 @@
+"""Unit tests for the pure helpers of backend/server.py.
+
+Importing the server module needs its environment but no running MongoDB:
+the Motor client only connects on first use.
+"""
+import os
+import sys
+from pathlib import Path
+
+os.environ.setdefault("MONGO_URL", "mongodb://localhost:27017")
+os.environ.setdefault("DB_NAME", "rudi_media_test")
+os.environ.setdefault("STATS_TIMEZONE", "Europe/Berlin")
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "backend"))
@@ -0,0 +1,65 @@
+import asyncio
+import logging
+import queue
+
+import pytest
+import server
+from server import AccessLogMiddleware, ContextQueueHandler, Tenant, TenantMiddleware
+
+
+async def echo_tenant(scope, receive, send):
+    status = 500 if scope["path"].endswith("/fail") else 200
+    await send({"type": "http.response.start", "status": status, "headers": []})
+    await send({"type": "http.response.body", "body": server.current_tenant.get().id.encode()})
+
+
+@pytest.fixture
+def access_records(monkeypatch):
+    tenants = dict(server.TENANTS, zweite=Tenant(id="zweite", db_name="zweite", hosts=["zweite.example"]))
+    monkeypatch.setattr(server, "TENANTS", tenants)
+    records = queue.Queue()
+    handler = ContextQueueHandler(records)
+    logger = logging.getLogger("access")
+    logger.addHandler(handler)
+    logger.setLevel(logging.INFO)
+    yield records
+    logger.removeHandler(handler)
+
+
+def call(path, host="localhost", request_id=None):
+    headers = [(b"host", host.encode())]
+    if request_id:
+        headers.append((b"x-request-id", request_id.encode()))
+    scope = {"type": "http", "method": "GET", "path": path, "root_path": "", "headers": headers}
+    messages = []
+
+    async def receive():
+        return {"type": "http.request", "body": b""}
+
+    async def send(message):
+        messages.append(message)
+
+    asyncio.run(AccessLogMiddleware(TenantMiddleware(echo_tenant))(scope, receive, send))
+    return messages
+
+
+def test_access_log_records_the_site_of_the_request(access_records, monkeypatch):
+    monkeypatch.setattr(server, "ACCESS_LOG_SAMPLE_RATE", 1.0)
+    messages = call("/sites/zweite/api/blog/posts")
+    call("/api/blog/posts", host="zweite.example")
+    call("/api/blog/posts")
+
+    assert messages[1]["body"] == b"zweite"
+    tenants = [access_records.get_nowait().tenant for _ in range(3)]
+    assert tenants == ["zweite", "zweite", server.DEFAULT_TENANT_ID]
+
+
+def test_request_id_is_echoed_and_errors_are_always_logged(access_records, monkeypatch):
+    monkeypatch.setattr(server, "ACCESS_LOG_SAMPLE_RATE", 0.0)
+    call("/api/blog/posts")
+    messages = call("/api/fail", request_id="abc123")
+
+    assert (b"x-request-id", b"abc123") in messages[0]["headers"]
+    record = access_records.get_nowait()
+    assert access_records.empty()
+    assert (record.status, record.request_id, record.sample_rate) == (500, "abc123", 1.0)
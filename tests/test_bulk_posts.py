@@ -0,0 +1,185 @@
+import asyncio
+import copy
+from types import SimpleNamespace
+
+import pytest
+import server
+from pymongo import DeleteOne
+from server import BlogPostBulkRequest, bulk_blog_posts_admin, tag_merge_pipeline
+
+
+def evaluate(expression, document, variables):
+    """Just enough of the aggregation language to run tag_merge_pipeline"""
+    if isinstance(expression, str) and expression.startswith("$$"):
+        return variables[expression[2:]]
+    if isinstance(expression, str) and expression.startswith("$"):
+        return document[expression[1:]]
+    if isinstance(expression, list):
+        return [evaluate(item, document, variables) for item in expression]
+    if not isinstance(expression, dict):
+        return expression
+    (operator, argument), = expression.items()
+    if operator == "$map":
+        values = evaluate(argument["input"], document, variables)
+        return [evaluate(argument["in"], document, {**variables, argument["as"]: value}) for value in values]
+    if operator == "$reduce":
+        value = evaluate(argument["initialValue"], document, variables)
+        for this in evaluate(argument["input"], document, variables):
+            value = evaluate(argument["in"], document, {**variables, "this": this, "value": value})
+        return value
+    if operator == "$cond":
+        condition, then, otherwise = argument
+        return evaluate(then if evaluate(condition, document, variables) else otherwise, document, variables)
+    if operator == "$in":
+        value, values = evaluate(argument, document, variables)
+        return value in values
+    if operator == "$concatArrays":
+        return [item for part in evaluate(argument, document, variables) for item in part]
+    if operator == "$add":
+        return sum(evaluate(argument, document, variables))
+    raise NotImplementedError(operator)
+
+
+def test_tag_merge_pipeline_replaces_tags_in_place_without_duplicates():
+    (stage,) = tag_merge_pipeline(["Alt", "Älter"], "Neu")
+    post = {"tags": ["Kultur", "Alt", "Neu", "Älter", "Musik"]}
+    assert evaluate(stage["$set"]["tags"], post, {}) == ["Kultur", "Neu", "Musik"]
+
+
+class FakeCursor:
+    def __init__(self, documents):
+        self.documents = documents
+
+    def __aiter__(self):
+        return self._iterate()
+
+    async def _iterate(self):
+        for document in self.documents:
+            yield document
+
+
+class FakePosts:
+    def __init__(self, posts):
+        self.posts = {post["id"]: post for post in copy.deepcopy(posts)}
+
+    def find(self, query, projection):
+        return FakeCursor([
+            {field: post[field] for field in projection if field in post}
+            for post_id, post in self.posts.items() if post_id in query["id"]["$in"]
+        ])
+
+    async def bulk_write(self, requests, ordered=True):
+        modified = deleted = 0
+        for request in requests:
+            post_id = request._filter["id"]
+            if isinstance(request, DeleteOne):
+                deleted += self.posts.pop(post_id, None) is not None
+                continue
+            post = self.posts[post_id]
+            before = dict(post)
+            post.update(request._doc["$set"])
+            post["version"] += request._doc["$inc"]["version"]
+            modified += post != before
+        return SimpleNamespace(modified_count=modified, deleted_count=deleted)
+
+    async def update_many(self, query, pipeline):
+        modified = 0
+        for post in self.posts.values():
+            if not set(post["tags"]) & set(query["tags"]["$in"]):
+                continue
+            for stage in pipeline:
+                post.update({field: evaluate(value, post, {}) for field, value in stage["$set"].items()})
+            modified += 1
+        return SimpleNamespace(modified_count=modified)
+
+
+class FakeRevisions:
+    def __init__(self):
+        self.deleted_for = []
+
+    async def delete_many(self, query):
+        self.deleted_for.extend(query["post_id"]["$in"])
+
+
+class FakeBus:
+    def __init__(self):
+        self.events = []
+
+    async def notify(self, event):
+        self.events.append(event)
+
+
+POSTS = [
+    {"id": "live", "published": True, "publish_at": None, "tags": ["Alt", "Kultur"], "version": 1},
+    {"id": "geplant", "published": False, "publish_at": "2099-01-01T08:00:00+00:00", "tags": ["Neu"], "version": 3},
+    {"id": "entwurf", "published": False, "publish_at": None, "tags": ["Älter"], "version": 2},
+]
+
+
+@pytest.fixture
+def fake_db(monkeypatch):
+    database = SimpleNamespace(blog_posts=FakePosts(POSTS), post_revisions=FakeRevisions())
+    bus = FakeBus()
+    monkeypatch.setattr(server, "db", database)
+    monkeypatch.setattr(server, "invalidation_bus", bus)
+    return database, bus
+
+
+def bulk(*operations):
+    request = BlogPostBulkRequest(operations=list(operations))
+    return asyncio.run(bulk_blog_posts_admin(request, current_admin=None))
+
+
+def test_results_are_reported_per_operation(fake_db):
+    database, bus = fake_db
+    response = bulk(
+        {"op": "publish", "post_id": "live"},
+        {"op": "unpublish", "post_id": "live"},
+        {"op": "retag", "post_id": "entwurf", "tags": ["Älter"]},
+        {"op": "delete", "post_id": "entwurf"},
+        {"op": "publish", "post_id": "fehlt"},
+        {"op": "retag", "post_id": "live"},
+        {"op": "delete"},
+        {"op": "rename_tag", "to_tag": "Neu"},
+    )
+
+    assert [(result.status, result.modified) for result in response.results] == [
+        ("ok", 0), ("ok", 1), ("ok", 0), ("ok", 1), ("not_found", 0), ("invalid", 0), ("invalid", 0), ("invalid", 0)
+    ]
+    assert response.modified == 2
+    assert database.blog_posts.posts["live"]["published"] is False
+    assert database.blog_posts.posts["live"]["version"] == 2
+    assert "entwurf" not in database.blog_posts.posts
+    assert database.post_revisions.deleted_for == ["entwurf"]
+    assert [event.operation for event in bus.events] == ["flush"]
+
+
+def test_unpublishing_a_scheduled_post_cancels_the_schedule(fake_db):
+    database, _ = fake_db
+    response = bulk({"op": "unpublish", "post_id": "geplant"})
+
+    assert response.results[0].modified == 1
+    assert database.blog_posts.posts["geplant"]["publish_at"] is None
+
+
+def test_nothing_changed_means_no_flush(fake_db):
+    _, bus = fake_db
+    response = bulk({"op": "publish", "post_id": "live"}, {"op": "rename_tag", "from_tags": ["Fehlt"], "to_tag": "Neu"})
+
+    assert response.modified == 0
+    assert bus.events == []
+
+
+def test_rename_and_merge_tags(fake_db):
+    database, _ = fake_db
+    response = bulk(
+        {"op": "rename_tag", "from_tags": ["Kultur"], "to_tag": "Kunst"},
+        {"op": "merge_tags", "from_tags": ["Alt", "Älter"], "to_tag": "Neu"},
+    )
+
+    assert [result.modified for result in response.results] == [1, 2]
+    posts = database.blog_posts.posts
+    assert posts["live"]["tags"] == ["Neu", "Kunst"]
+    assert posts["entwurf"]["tags"] == ["Neu"]
+    assert posts["geplant"]["tags"] == ["Neu"]
+    assert posts["live"]["version"] == 3
@@ -0,0 +1,109 @@
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+import server
+from server import InvalidationBus, InvalidationEvent, LocalCache
+
+
+@pytest.fixture
+def bus_state(monkeypatch):
+    state = SimpleNamespace(mode="change_stream", running=True)
+    monkeypatch.setattr(server, "invalidation_bus", state)
+    return state
+
+
+def test_result_read_before_an_invalidation_is_not_cached(bus_state):
+    cache = LocalCache(10)
+    generation = cache.generation
+    cache.clear()
+    cache.put("key", "stale", generation)
+    assert cache.get("key") is None
+
+    cache.put("key", "fresh", cache.generation)
+    assert cache.get("key") == "fresh"
+
+
+def test_least_recently_used_entry_is_evicted(bus_state):
+    cache = LocalCache(2)
+    cache.put("a", 1, cache.generation)
+    cache.put("b", 2, cache.generation)
+    cache.get("a")
+    cache.put("c", 3, cache.generation)
+    assert (cache.get("a"), cache.get("b"), cache.get("c")) == (1, None, 3)
+
+
+def test_change_stream_only_cache_is_off_while_polling(bus_state):
+    cache = LocalCache(10, change_stream_only=True)
+    bus_state.mode = "poll"
+    cache.put("admin", "cached", cache.generation)
+    assert cache.get("admin") is None
+
+    bus_state.mode = "change_stream"
+    cache.put("admin", "cached", cache.generation)
+    assert cache.get("admin") == "cached"
+
+    bus_state.running = False
+    assert cache.get("admin") is None
+
+
+class FakeCursor:
+    def __init__(self, documents):
+        self.documents = documents
+
+    def __aiter__(self):
+        return self._iterate()
+
+    async def _iterate(self):
+        for document in self.documents:
+            yield document
+
+
+class FakeCacheState:
+    def __init__(self):
+        self.counters = {}
+
+    async def update_one(self, query, update, upsert=False):
+        self.counters[query["_id"]] = self.counters.get(query["_id"], 0) + update["$inc"]["value"]
+
+    def find(self, query):
+        return FakeCursor([
+            {"_id": counter_id, "value": value}
+            for counter_id, value in self.counters.items() if counter_id in query["_id"]["$in"]
+        ])
+
+
+@pytest.fixture
+def cache_state(monkeypatch):
+    state = FakeCacheState()
+    monkeypatch.setattr(server, "db", SimpleNamespace(cache_state=state))
+    monkeypatch.setattr(server, "CACHE_POLL_INTERVAL", 0.01)
+    return state
+
+
+def test_notify_bumps_the_counter_unless_a_change_stream_runs(cache_state):
+    bus = InvalidationBus(mode="poll")
+    asyncio.run(bus.notify(InvalidationEvent(collection="admin_users", operation="update")))
+    assert cache_state.counters == {"version:admin_users": 1}
+
+    bus.mode = "change_stream"
+    asyncio.run(bus.notify(InvalidationEvent(collection="admin_users", operation="update")))
+    assert cache_state.counters == {"version:admin_users": 1}
+
+
+def test_polling_flushes_when_a_counter_first_appears(cache_state):
+    bus = InvalidationBus(mode="poll")
+    events = []
+    bus.subscribe(events.append)
+
+    async def main():
+        await bus.start()
+        await asyncio.sleep(0.05)
+        # Written by another instance, so only the poll can see it
+        await cache_state.update_one({"_id": "version:blog_posts"}, {"$inc": {"value": 1}}, upsert=True)
+        await asyncio.sleep(0.05)
+        seen = [(event.collection, event.operation) for event in events]
+        await bus.stop()
+        return seen
+
+    assert asyncio.run(main()) == [("blog_posts", "flush")]
@@ -0,0 +1,99 @@
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+import server
+from fastapi import HTTPException
+from server import apply_post_update, parse_if_match
+
+
+@pytest.mark.parametrize("header,expected", [
+    (None, None),
+    ("*", None),
+    (" * ", None),
+    ("3", 3),
+    ('"3"', 3),
+    ('W/"3"', 3),
+    (' "12" ', 12),
+])
+def test_if_match_forms(header, expected):
+    assert parse_if_match(header) == expected
+
+
+@pytest.mark.parametrize("header", ['"abc"', "W/", '"-1"', '"3", "4"', ""])
+def test_malformed_if_match_is_rejected(header):
+    with pytest.raises(HTTPException) as error:
+        parse_if_match(header)
+    assert error.value.status_code == 400
+
+
+class FakePosts:
+    def __init__(self, posts):
+        self.posts = {post["id"]: dict(post) for post in posts}
+
+    async def find_one_and_update(self, query, update, projection=None, return_document=None):
+        post = self.posts.get(query["id"])
+        if post is None or query.get("version", post["version"]) != post["version"]:
+            return None
+        previous = dict(post)
+        post.update(update["$set"])
+        post["version"] += update["$inc"]["version"]
+        return previous
+
+    async def count_documents(self, query, limit=0):
+        return int(query["id"] in self.posts)
+
+
+class FakeRevisions:
+    def __init__(self):
+        self.revisions = []
+
+    async def insert_one(self, document):
+        self.revisions.append(document)
+
+
+class FakeBus:
+    async def notify(self, event):
+        pass
+
+
+@pytest.fixture
+def fake_db(monkeypatch):
+    database = SimpleNamespace(
+        blog_posts=FakePosts([{"id": "p1", "title": "Alt", "slug": "alt", "version": 4}]),
+        post_revisions=FakeRevisions()
+    )
+    monkeypatch.setattr(server, "db", database)
+    monkeypatch.setattr(server, "invalidation_bus", FakeBus())
+    return database
+
+
+def update(post_id, expected_version=None, title="Neu"):
+    return asyncio.run(apply_post_update(post_id, {"title": title}, expected_version))
+
+
+def test_matching_version_applies_and_bumps_the_version(fake_db):
+    updated = update("p1", expected_version=4)
+    assert (updated["title"], updated["version"]) == ("Neu", 5)
+    assert fake_db.blog_posts.posts["p1"]["version"] == 5
+    assert fake_db.post_revisions.revisions[0]["version"] == 4
+
+
+def test_stale_version_is_a_precondition_failure(fake_db):
+    with pytest.raises(HTTPException) as error:
+        update("p1", expected_version=3)
+    assert error.value.status_code == 412
+    assert fake_db.blog_posts.posts["p1"]["title"] == "Alt"
+
+
+@pytest.mark.parametrize("expected_version", [None, 4])
+def test_missing_post_is_not_found(fake_db, expected_version):
+    with pytest.raises(HTTPException) as error:
+        update("fehlt", expected_version=expected_version)
+    assert error.value.status_code == 404
+
+
+def test_without_if_match_the_last_write_wins(fake_db):
+    update("p1", title="Erster")
+    updated = update("p1", title="Zweiter")
+    assert (updated["title"], updated["version"]) == ("Zweiter", 6)
@@ -0,0 +1,146 @@
+import asyncio
+import time
+from types import SimpleNamespace
+
+import pytest
+import server
+from fastapi import HTTPException
+from server import ContactFormCreate, ContactIdempotency, contact_idempotency_key
+
+
+def contact(**overrides):
+    data = {"name": "Anna Müller", "email": "anna@example.com", "message": "Bitte um Rückruf.", "phone": "+49 171 1234567"}
+    return ContactFormCreate(**{**data, **overrides})
+
+
+def test_fingerprint_ignores_case_and_whitespace():
+    key, ttl, fingerprint = contact_idempotency_key(contact(), None)
+    same_key, _, same_fingerprint = contact_idempotency_key(
+        contact(name=" anna  müller", email="Anna@Example.com", message="Bitte um\nRückruf. ", phone="+49171 1234567"), None
+    )
+    assert key == same_key == f"fp:{fingerprint}"
+    assert fingerprint == same_fingerprint
+
+
+def test_explicit_key_carries_body_fingerprint():
+    key, _, fingerprint = contact_idempotency_key(contact(), "retry-1")
+    other_key, _, other_fingerprint = contact_idempotency_key(contact(message="Eine andere Nachricht."), "retry-1")
+    # Same key, different body: the claim can tell the two apart and reject the second
+    assert key == other_key
+    assert key.startswith("key:")
+    assert fingerprint != other_fingerprint
+
+
+class FakeIdempotencyCollection:
+    def __init__(self, delay=0.0):
+        self.documents = {}
+        self.delay = delay
+        self.calls = 0
+
+    async def _wait(self):
+        self.calls += 1
+        await asyncio.sleep(self.delay)
+
+    async def insert_one(self, document):
+        await self._wait()
+        if document["_id"] in self.documents:
+            raise server.DuplicateKeyError("duplicate")
+        self.documents[document["_id"]] = dict(document)
+
+    async def find_one(self, query):
+        await self._wait()
+        return self.documents.get(query["_id"])
+
+    async def replace_one(self, query, document, upsert=False):
+        await self._wait()
+        self.documents[query["_id"]] = {"_id": query["_id"], **document}
+
+    async def update_one(self, query, update):
+        await self._wait()
+        self.documents[query["_id"]].update(update["$set"])
+
+    async def delete_one(self, query):
+        await self._wait()
+        self.documents.pop(query["_id"], None)
+
+
+@pytest.fixture
+def idempotency_db(monkeypatch):
+    def install(delay=0.0):
+        collection = FakeIdempotencyCollection(delay)
+        monkeypatch.setattr(server, "db", SimpleNamespace(contact_idempotency=collection))
+        return collection
+    return install
+
+
+RESPONSE = {"status": "success", "message": "Danke"}
+
+
+def test_retries_are_answered_locally_and_confirmed_in_the_background(idempotency_db):
+    collection = idempotency_db()
+    key, ttl, fingerprint = contact_idempotency_key(contact(), "retry-1")
+
+    async def main():
+        idempotency = ContactIdempotency(10)
+        assert await idempotency.claim(key, ttl, fingerprint) is None
+        with pytest.raises(HTTPException) as racing:
+            await idempotency.claim(key, ttl, fingerprint)
+        idempotency.complete(key, ttl, fingerprint, RESPONSE)
+        calls = collection.calls
+        assert await idempotency.claim(key, ttl, fingerprint) == RESPONSE
+        assert collection.calls == calls
+        await asyncio.sleep(0.01)
+        # Another instance without the local entry gets the confirmed response from MongoDB
+        assert await ContactIdempotency(10).claim(key, ttl, fingerprint) == RESPONSE
+        return racing.value.status_code
+
+    assert asyncio.run(main()) == 409
+
+
+def test_key_reused_for_another_message_is_rejected(idempotency_db):
+    idempotency_db()
+    key, ttl, fingerprint = contact_idempotency_key(contact(), "retry-1")
+    _, _, other_fingerprint = contact_idempotency_key(contact(message="Etwas anderes."), "retry-1")
+
+    async def main():
+        idempotency = ContactIdempotency(10)
+        await idempotency.claim(key, ttl, fingerprint)
+        idempotency.complete(key, ttl, fingerprint, RESPONSE)
+        await asyncio.sleep(0.01)
+        for instance in (idempotency, ContactIdempotency(10)):
+            with pytest.raises(HTTPException) as error:
+                await instance.claim(key, ttl, other_fingerprint)
+            assert error.value.status_code == 422
+
+    asyncio.run(main())
+
+
+def test_slow_database_does_not_hold_up_the_submission(idempotency_db):
+    idempotency_db(delay=5)
+    key, ttl, fingerprint = contact_idempotency_key(contact(), None)
+
+    async def main():
+        idempotency = ContactIdempotency(10, timeout=0.05)
+        started = time.monotonic()
+        assert await idempotency.claim(key, ttl, fingerprint) is None
+        idempotency.complete(key, ttl, fingerprint, RESPONSE)
+        elapsed = time.monotonic() - started
+        assert await idempotency.claim(key, ttl, fingerprint) == RESPONSE
+        return elapsed
+
+    assert asyncio.run(main()) < 1
+
+
+def test_failed_submission_can_be_retried(idempotency_db):
+    collection = idempotency_db()
+    key, ttl, fingerprint = contact_idempotency_key(contact(), "retry-1")
+
+    async def main():
+        idempotency = ContactIdempotency(10)
+        await idempotency.claim(key, ttl, fingerprint)
+        idempotency.release(key)
+        await asyncio.sleep(0.01)
+        assert collection.documents == {}
+        assert await idempotency.claim(key, ttl, fingerprint) is None
+
+    asyncio.run(main())
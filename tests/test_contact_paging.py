@@ -0,0 +1,111 @@
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+import server
+from fastapi import HTTPException, Response
+from server import csv_safe, decode_contact_cursor, encode_contact_cursor, get_contacts
+from starlette.requests import Request
+
+CONTACTS = [
+    {"id": f"c{number}", "name": "Anna", "email": "anna@example.com", "message": "Hallo", "created_at": created_at}
+    for number, created_at in [
+        (1, "2024-03-01T10:00:00+00:00"),
+        (2, "2024-03-02T10:00:00+00:00"),
+        (3, "2024-03-02T10:00:00+00:00"),
+        (4, "2024-03-02T10:00:00+00:00"),
+        (5, "2024-03-03T10:00:00+00:00"),
+    ]
+]
+
+
+def matches(contact, query):
+    if "$or" in query:
+        return any(matches(contact, branch) for branch in query["$or"])
+    for field, condition in query.items():
+        value = contact[field]
+        if isinstance(condition, dict):
+            if not value < condition["$lt"]:
+                return False
+        elif value != condition:
+            return False
+    return True
+
+
+class FakeCursor:
+    def __init__(self, documents):
+        self.documents = documents
+
+    def sort(self, keys):
+        for field, direction in reversed(keys):
+            self.documents.sort(key=lambda document: document[field], reverse=direction < 0)
+        return self
+
+    async def to_list(self, length):
+        return self.documents[:length]
+
+
+class FakeContacts:
+    def find(self, query):
+        return FakeCursor([dict(contact) for contact in CONTACTS if matches(contact, query)])
+
+
+@pytest.fixture
+def fake_db(monkeypatch):
+    monkeypatch.setattr(server, "db", SimpleNamespace(contacts=FakeContacts()))
+
+
+def test_cursor_round_trip_breaks_ties_on_id():
+    query = decode_contact_cursor(encode_contact_cursor(CONTACTS[2]))
+    after = [contact["id"] for contact in CONTACTS if matches(contact, query)]
+    # c3 shares its created_at with c2 and c4; only the lower id comes after it
+    assert after == ["c1", "c2"]
+
+
+@pytest.mark.parametrize("cursor", ["kein-cursor", "", "bnVsbA", "WzFd"])
+def test_bad_cursor_is_rejected(cursor):
+    with pytest.raises(HTTPException) as error:
+        decode_contact_cursor(cursor)
+    assert error.value.status_code == 400
+
+
+def site_request(query_string):
+    root_path = "/sites/zweite"
+    return Request({
+        "type": "http", "method": "GET", "scheme": "https", "server": ("rudi.de", 443),
+        "root_path": root_path, "path": f"{root_path}/api/contacts", "query_string": query_string.encode(),
+        "headers": [(b"host", b"rudi.de")],
+    })
+
+
+def page(query_string, limit, cursor=None):
+    response = Response()
+    contacts = asyncio.run(get_contacts(site_request(query_string), response, limit=limit, cursor=cursor, current_admin=None))
+    return [contact.id for contact in contacts], response.headers
+
+
+def test_pages_follow_each_other_without_gaps(fake_db):
+    seen = []
+    ids, headers = page("limit=2", 2)
+    while "X-Next-Cursor" in headers:
+        seen += ids
+        cursor = headers["X-Next-Cursor"]
+        assert headers["Link"] == f'<https://rudi.de/sites/zweite/api/contacts?limit=2&cursor={cursor}>; rel="next"'
+        ids, headers = page(f"limit=2&cursor={cursor}", 2, cursor)
+    seen += ids
+    assert seen == ["c5", "c4", "c3", "c2", "c1"]
+
+
+@pytest.mark.parametrize("value,expected", [
+    (None, ""),
+    (42, "42"),
+    ("Anna", "Anna"),
+    ("=HYPERLINK(\"x\")", "'=HYPERLINK(\"x\")"),
+    ("+49 171", "'+49 171"),
+    ("-1", "'-1"),
+    ("@SUMME(A1)", "'@SUMME(A1)"),
+    ("\tTab", "'\tTab"),
+    ("a=b", "a=b"),
+])
+def test_csv_safe_defuses_formulas(value, expected):
+    assert csv_safe(value) == expected
@@ -0,0 +1,40 @@
+import json
+
+from server import ContactIngestBuffer
+
+
+def spool_segment(buffer: ContactIngestBuffer, *contacts: dict):
+    buffer._open_segment()
+    for contact in contacts:
+        buffer._segment.write(json.dumps(contact) + "\n")
+    buffer._segment.close()
+
+
+def test_recover_skips_segments_of_running_workers(tmp_path):
+    running = ContactIngestBuffer(tmp_path, batch_size=10, flush_interval=1)
+    running._claim_worker_dir()
+    spool_segment(running, {"id": "a"})
+
+    starting = ContactIngestBuffer(tmp_path, batch_size=10, flush_interval=1)
+    starting._claim_worker_dir()
+    starting._recover()
+
+    assert starting._pending == []
+    assert list(running.worker_dir.glob("contacts-*.ndjson"))
+
+
+def test_recover_takes_over_segments_of_exited_workers(tmp_path):
+    exited = ContactIngestBuffer(tmp_path, batch_size=10, flush_interval=1)
+    exited._claim_worker_dir()
+    spool_segment(exited, {"id": "a"}, {"id": "b"})
+    exited._worker_lock.close()
+    # Spools written before per-worker directories sit directly in the spool directory
+    (tmp_path / "contacts-1.ndjson").write_text(json.dumps({"id": "c"}) + "\n")
+
+    starting = ContactIngestBuffer(tmp_path, batch_size=10, flush_interval=1)
+    starting._claim_worker_dir()
+    starting._recover()
+
+    assert sorted(contact["id"] for contact in starting._pending) == ["a", "b", "c"]
+    assert not exited.worker_dir.exists()
+    assert all(path.parent == starting.worker_dir for path in starting._sealed_segments)
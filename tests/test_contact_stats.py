@@ -0,0 +1,43 @@
+from collections import Counter
+from datetime import date
+
+import pytest
+from server import contact_stats_hour, contact_stats_since, contact_stats_totals
+
+
+def test_hours_are_counted_in_local_time():
+    # Europe/Berlin is UTC+2 in summer and UTC+1 in winter
+    assert contact_stats_hour("2024-07-31T22:30:00+00:00") == ("2024-08-01", 0)
+    assert contact_stats_hour("2024-12-31T23:15:00+00:00") == ("2025-01-01", 0)
+    assert contact_stats_hour("2024-03-31T00:59:00+00:00") == ("2024-03-31", 1)
+    assert contact_stats_hour("2024-03-31T01:00:00+00:00") == ("2024-03-31", 3)
+
+
+def test_totals_fold_hours_into_day_week_month_and_all():
+    totals = contact_stats_totals({("2024-09-01", 9): 2, ("2024-09-02", 9): 1, ("2024-08-31", 23): 4})
+
+    assert totals["day:2024-09-01"] == Counter({"count": 2, "hours.9": 2})
+    # 2024-09-01 is a Sunday, so it belongs to the week of the 31st of August
+    assert totals["week:2024-08-26"] == Counter({"count": 6, "hours.9": 2, "hours.23": 4})
+    assert totals["week:2024-09-02"]["count"] == 1
+    assert totals["month:2024-08-01"]["count"] == 4
+    assert totals["month:2024-09-01"]["count"] == 3
+    assert totals["all"] == Counter({"count": 7, "hours.9": 3, "hours.23": 4})
+
+
+@pytest.mark.parametrize("today,months,first_month", [
+    (date(2024, 10, 19), 12, date(2023, 11, 1)),
+    (date(2024, 12, 31), 12, date(2024, 1, 1)),
+    (date(2024, 1, 15), 1, date(2024, 1, 1)),
+    (date(2024, 1, 15), 2, date(2023, 12, 1)),
+    (date(2024, 3, 31), 120, date(2014, 4, 1)),
+])
+def test_month_window_includes_the_current_month(today, months, first_month):
+    assert contact_stats_since(today, 1, 1, months)["month"] == first_month
+
+
+def test_day_and_week_windows():
+    since = contact_stats_since(date(2024, 9, 4), days=30, weeks=2, months=1)
+    assert since["day"] == date(2024, 8, 6)
+    # Monday of the current week, one week back
+    assert since["week"] == date(2024, 8, 26)
@@ -0,0 +1,107 @@
+import asyncio
+import io
+
+import pytest
+import server
+from fastapi import HTTPException
+from server import release_image_blob, save_image_upload, store_image_blob
+
+PNG = b"\x89PNG\r\n\x1a\n" + b"\x00" * 64
+
+
+class FakeResult:
+    def __init__(self, deleted_count):
+        self.deleted_count = deleted_count
+
+
+class FakeBlobCollection:
+    def __init__(self):
+        self.documents = {}
+
+    async def find_one_and_update(self, query, update, projection=None, return_document=None):
+        document = self.documents.get(query["_id"])
+        if document is None:
+            return None
+        document["ref_count"] += update["$inc"]["ref_count"]
+        return dict(document)
+
+    async def update_one(self, query, update):
+        self.documents[query["_id"]]["ref_count"] += update["$inc"]["ref_count"]
+
+    async def insert_one(self, document):
+        if document["_id"] in self.documents:
+            raise server.DuplicateKeyError("duplicate")
+        self.documents[document["_id"]] = dict(document)
+
+    async def delete_one(self, query):
+        document = self.documents.get(query["_id"])
+        if document is None or document["ref_count"] > query["ref_count"]["$lte"]:
+            return FakeResult(0)
+        del self.documents[query["_id"]]
+        return FakeResult(1)
+
+
+class FailingImageCollection:
+    async def insert_one(self, document):
+        raise RuntimeError("write failed")
+
+
+class FakeDatabase:
+    def __init__(self):
+        self.image_blobs = FakeBlobCollection()
+        self.images = FailingImageCollection()
+
+
+class FakeBucket:
+    def __init__(self):
+        self.files = {}
+
+    async def upload_from_stream(self, filename, source, chunk_size_bytes=None, metadata=None):
+        file_id = len(self.files) + 1
+        self.files[file_id] = source.read()
+        return file_id
+
+    async def delete(self, file_id):
+        del self.files[file_id]
+
+
+class FakeRequest:
+    pass
+
+
+@pytest.fixture
+def fake_storage(monkeypatch):
+    database, bucket = FakeDatabase(), FakeBucket()
+    monkeypatch.setattr(server, "db", database)
+    monkeypatch.setattr(server, "image_bucket", lambda: bucket)
+    monkeypatch.setattr(server, "image_url", lambda request, name: f"/api/images/{name}")
+    return database, bucket
+
+
+async def chunks(data):
+    yield data
+
+
+def test_identical_bytes_share_one_blob(fake_storage):
+    database, bucket = fake_storage
+
+    assert asyncio.run(store_image_blob("d1", io.BytesIO(PNG), "image/png", len(PNG))) is True
+    assert asyncio.run(store_image_blob("d1", io.BytesIO(PNG), "image/png", len(PNG))) is False
+    assert database.image_blobs.documents["d1"]["ref_count"] == 2
+    assert len(bucket.files) == 1
+
+    asyncio.run(release_image_blob("d1"))
+    assert len(bucket.files) == 1
+    asyncio.run(release_image_blob("d1"))
+    assert database.image_blobs.documents == {}
+    assert bucket.files == {}
+
+
+def test_failed_metadata_insert_gives_the_reference_back(fake_storage):
+    database, bucket = fake_storage
+
+    with pytest.raises(HTTPException):
+        asyncio.run(save_image_upload(FakeRequest(), chunks(PNG), "bild.png"))
+
+    assert database.image_blobs.documents == {}
+    assert bucket.files == {}
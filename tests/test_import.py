@@ -0,0 +1,179 @@
+import asyncio
+import io
+import re
+import zipfile
+from datetime import datetime, timezone
+from types import SimpleNamespace
+
+import pytest
+import server
+from server import (
+    BlogPostImportResult, import_blog_posts, iter_markdown_zip, iter_wxr_posts, markdown_to_html,
+    parse_front_matter, prepare_import_batch, wp_autop
+)
+
+WXR = """<?xml version="1.0" encoding="UTF-8"?>
+<rss version="2.0" xmlns:content="http://purl.org/rss/1.0/modules/content/"
+     xmlns:excerpt="http://wordpress.org/export/1.2/excerpt/"
+     xmlns:wp="http://wordpress.org/export/1.2/" xmlns:dc="http://purl.org/dc/elements/1.1/">
+<channel><title>Rudi Media</title>
+<item>
+  <title>Erster Beitrag</title><dc:creator>Rudi</dc:creator>
+  <content:encoded><![CDATA[Erster Absatz
+zweite Zeile
+
+[caption id="1"]Zweiter Absatz[/caption]<script>alert(1)</script>]]></content:encoded>
+  <excerpt:encoded><![CDATA[]]></excerpt:encoded>
+  <wp:post_id>11</wp:post_id><wp:post_date_gmt>2024-03-01 09:30:00</wp:post_date_gmt>
+  <wp:post_modified_gmt>0000-00-00 00:00:00</wp:post_modified_gmt>
+  <wp:post_name>erster-beitrag</wp:post_name><wp:status>publish</wp:status><wp:post_type>post</wp:post_type>
+  <category domain="post_tag" nicename="kultur"><![CDATA[Kultur]]></category>
+  <category domain="category" nicename="kultur"><![CDATA[Kultur]]></category>
+  <wp:postmeta><wp:meta_key>_yoast_wpseo_metadesc</wp:meta_key><wp:meta_value>Beschreibung</wp:meta_value></wp:postmeta>
+</item>
+<item>
+  <title>Geplant</title><content:encoded><![CDATA[<p>Schon markiert</p>]]></content:encoded>
+  <wp:post_id>12</wp:post_id><wp:post_date_gmt>2099-01-01 08:00:00</wp:post_date_gmt>
+  <wp:post_name>geplant</wp:post_name><wp:status>future</wp:status><wp:post_type>post</wp:post_type>
+</item>
+<item>
+  <title>Entwurf</title><content:encoded><![CDATA[Text]]></content:encoded>
+  <wp:post_id>13</wp:post_id><pubDate>Fri, 01 Mar 2024 10:00:00 +0100</pubDate>
+  <wp:status>draft</wp:status><wp:post_type>post</wp:post_type>
+</item>
+<item><title>Papierkorb</title><wp:post_id>14</wp:post_id><wp:status>trash</wp:status><wp:post_type>post</wp:post_type></item>
+<item><title>Seite</title><wp:post_id>15</wp:post_id><wp:status>publish</wp:status><wp:post_type>page</wp:post_type></item>
+</channel></rss>""".encode("utf-8")
+
+
+def wxr_entries():
+    return list(iter_wxr_posts(io.BytesIO(WXR)))
+
+
+def test_wxr_maps_status_dates_and_skips_other_items():
+    first, planned, draft = wxr_entries()
+
+    assert [entry["source_id"] for entry in (first, planned, draft)] == ["wxr:11", "wxr:12", "wxr:13"]
+    assert first["published"] is True and first["publish_at"] is None
+    assert first["created_at"] == datetime(2024, 3, 1, 9, 30, tzinfo=timezone.utc)
+    assert first["updated_at"] == first["created_at"]  # 0000-00-00 means never modified
+    assert first["tags"] == ["Kultur"]
+    assert first["author"] == "Rudi"
+    assert first["excerpt"] is None
+    assert first["meta_description"] == "Beschreibung"
+    assert draft["published"] is False
+    assert draft["created_at"] == datetime(2024, 3, 1, 9, 0, tzinfo=timezone.utc)  # RFC 822 pubDate fallback
+
+
+def test_future_status_becomes_publish_at():
+    planned = wxr_entries()[1]
+    assert planned["published"] is False
+    assert planned["publish_at"] == datetime(2099, 1, 1, 8, 0, tzinfo=timezone.utc)
+
+
+def test_autop_wraps_classic_editor_paragraphs():
+    assert wp_autop("Eins\nZwei\n\n[gallery ids=\"1\"]Drei") == "<p>Eins<br>Zwei</p><p>Drei</p>"
+    assert wp_autop("<p>Schon markiert</p>\n\nText") == "<p>Schon markiert</p>\n\nText"
+    assert wp_autop("Text\n\n<ul><li>Punkt</li></ul>") == "<p>Text</p><ul><li>Punkt</li></ul>"
+
+
+@pytest.mark.parametrize("text,meta,body", [
+    ("---\ntitle: \"Hallo: Welt\"\ndraft: true\n---\nText", {"title": "Hallo: Welt", "draft": True}, "Text"),
+    ("---\ntags: [eins, 'zwei', \"drei\"]\n...\nText", {"tags": ["eins", "zwei", "drei"]}, "Text"),
+    ("---\ntags:\n  - eins\n  - zwei\n# Kommentar\nslug: x\n---\n", {"tags": ["eins", "zwei"], "slug": "x"}, ""),
+    ("---\ntitle: Ohne Ende\nText", {}, "---\ntitle: Ohne Ende\nText"),
+    ("Kein Front Matter", {}, "Kein Front Matter"),
+])
+def test_front_matter(text, meta, body):
+    assert parse_front_matter(text) == (meta, body)
+
+
+def test_markdown_subset():
+    rendered = markdown_to_html(
+        "# Titel\n\nEin *kurzer* und **fetter** Absatz\nmit [Link](https://example.com \"t\").\n\n"
+        "- eins\n- zwei\n  weiter\n\n1. erstens\n\n> Zitat\n\n```\n<b>roh</b>\n```\n\n---"
+    )
+    assert rendered == (
+        "<h1>Titel</h1>"
+        "<p>Ein <em>kurzer</em> und <strong>fetter</strong> Absatz mit <a href=\"https://example.com\">Link</a>.</p>"
+        "<ul><li>eins</li><li>zwei weiter</li></ul><ol><li>erstens</li></ol>"
+        "<blockquote><p>Zitat</p></blockquote><pre><code>&lt;b&gt;roh&lt;/b&gt;</code></pre><hr>"
+    )
+
+
+def markdown_zip(files):
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, "w") as archive:
+        for name, text in files.items():
+            archive.writestr(name, text)
+    buffer.seek(0)
+    return buffer
+
+
+MARKDOWN_FILES = {
+    "posts/sommer-fest.md": "---\ntitle: Sommerfest\ndate: 2024-06-01T18:00:00+02:00\ntags: Feier, Sommer\n---\n"
+                            "Wir feiern! [Klick](javascript:void) <script>alert(1)</script>",
+    "posts/ohne-titel.md": "Nur Text.",
+    "bilder/foto.png": "keine Markdown-Datei",
+}
+
+
+def test_rendered_html_is_sanitized():
+    result = BlogPostImportResult()
+    posts, exhausted = prepare_import_batch(iter_markdown_zip(markdown_zip(MARKDOWN_FILES)), 10, result)
+    wxr_posts, _ = prepare_import_batch(iter(wxr_entries()), 10, result)
+
+    assert exhausted
+    (second_id, untitled), (first_id, summer) = posts
+    assert (first_id, second_id) == ("md:posts/sommer-fest.md", "md:posts/ohne-titel.md")
+    assert summer.content == "<p>Wir feiern! <a>Klick</a></p>"
+    assert summer.tags == ["Feier", "Sommer"]
+    assert summer.created_at == datetime(2024, 6, 1, 16, 0, tzinfo=timezone.utc)
+    assert summer.excerpt == "Wir feiern! Klick"
+    assert (untitled.title, untitled.slug) == ("ohne titel", "ohne-titel")
+    assert "<script>" not in wxr_posts[0][1].content
+    assert wxr_posts[0][1].content == "<p>Erster Absatz<br>zweite Zeile</p><p>Zweiter Absatz</p>"
+
+
+def test_unreadable_file_is_reported():
+    result = BlogPostImportResult()
+    posts, exhausted = prepare_import_batch(iter_wxr_posts(io.BytesIO(b"<rss><channel><item>")), 10, result)
+    assert (posts, exhausted) == ([], True)
+    assert result.errors and result.errors[0].startswith("Import abgebrochen")
+
+
+class FakeCollection:
+    def __init__(self):
+        self.documents = []
+
+    async def distinct(self, field, query):
+        if field == "source_id":
+            wanted = set(query["source_id"]["$in"])
+            return [document["source_id"] for document in self.documents if document["source_id"] in wanted]
+        pattern = re.compile(query["slug"]["$regex"])
+        return [document["slug"] for document in self.documents if pattern.match(document["slug"])]
+
+    async def insert_many(self, documents, ordered=True):
+        self.documents.extend(documents)
+
+
+class FakeBus:
+    async def notify(self, event):
+        pass
+
+
+@pytest.fixture
+def fake_db(monkeypatch):
+    collection = FakeCollection()
+    monkeypatch.setattr(server, "db", SimpleNamespace(blog_posts=collection))
+    monkeypatch.setattr(server, "invalidation_bus", FakeBus())
+    return collection
+
+
+def test_importing_the_same_file_twice_skips_by_source_id(fake_db):
+    first = asyncio.run(import_blog_posts(iter_wxr_posts(io.BytesIO(WXR))))
+    second = asyncio.run(import_blog_posts(iter_wxr_posts(io.BytesIO(WXR))))
+
+    assert (first.imported, first.skipped, first.failed) == (3, 0, 0)
+    assert (second.imported, second.skipped, second.failed) == (0, 3, 0)
+    assert sorted(document["slug"] for document in fake_db.documents) == ["entwurf", "erster-beitrag", "geplant"]
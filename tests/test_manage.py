@@ -0,0 +1,73 @@
+import asyncio
+from datetime import datetime, timezone
+
+from manage import insert_batches, synthetic_contacts, synthetic_posts
+from pymongo.errors import BulkWriteError
+
+UNTIL = datetime(2024, 6, 1, tzinfo=timezone.utc)
+
+
+def posts(seed, batch=0, size=20):
+    return synthetic_posts(seed, batch, size, batch * size, UNTIL, 5)
+
+
+def contacts(seed, batch=0, size=20):
+    return synthetic_contacts(seed, batch, size, UNTIL, 5)
+
+
+def test_same_seed_gives_the_same_data():
+    assert posts(42) == posts(42)
+    assert contacts(42) == contacts(42)
+    assert posts(42) != posts(43)
+    assert contacts(42) != contacts(43)
+
+
+def test_batches_do_not_depend_on_each_other():
+    assert posts(42, batch=3) == posts(42, batch=3)
+    assert posts(42, batch=3) != posts(42, batch=2)
+    assert len({post["slug"] for batch in range(4) for post in posts(42, batch=batch)}) == 80
+
+
+def test_dates_stay_within_the_range():
+    assert all(post["created_at"] <= UNTIL.isoformat() for post in posts(42, size=200))
+    assert all(contact["created_at"] <= UNTIL.isoformat() for contact in contacts(42, size=200))
+
+
+class FakeCollection:
+    name = "fake"
+
+    def __init__(self):
+        self.documents = {}
+        self.calls = 0
+
+    async def insert_many(self, documents, ordered=True):
+        # Later batches finish first, so writes complete out of order
+        self.calls += 1
+        await asyncio.sleep(0.01 * (5 - self.calls % 5))
+        duplicates = [document["id"] for document in documents if document["id"] in self.documents]
+        for document in documents:
+            self.documents.setdefault(document["id"], document)
+        if duplicates:
+            raise BulkWriteError({"nInserted": len(documents) - len(duplicates), "writeErrors": []})
+
+
+def generate(collection, concurrency):
+    return asyncio.run(insert_batches(
+        collection, 95, 10, concurrency, lambda batch, size: synthetic_posts(7, batch, size, batch * 10, UNTIL, 5)
+    ))
+
+
+def test_concurrent_writes_produce_the_same_documents():
+    sequential, concurrent = FakeCollection(), FakeCollection()
+
+    assert generate(sequential, 1) == 95
+    assert generate(concurrent, 4) == 95
+    assert concurrent.documents == sequential.documents
+
+
+def test_rerun_with_the_same_seed_inserts_nothing_new():
+    collection = FakeCollection()
+    generate(collection, 4)
+
+    assert generate(collection, 4) == 0
+    assert len(collection.documents) == 95
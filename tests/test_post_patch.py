@@ -0,0 +1,57 @@
+import pytest
+from fastapi import HTTPException
+from server import JsonPatchOperation, apply_json_patch, apply_text_delta
+
+POST = {"title": "Titel", "content": "Hallo Welt", "excerpt": "Kurz", "tags": ["a", "b"]}
+
+
+def patch(document, *operations):
+    return apply_json_patch(document, [JsonPatchOperation(**operation) for operation in operations])
+
+
+def test_operations_apply_in_order_to_a_copy():
+    patched = patch(
+        POST,
+        {"op": "replace", "path": "/title", "value": "Neu"},
+        {"op": "add", "path": "/tags/-", "value": "c"},
+        {"op": "add", "path": "/tags/0", "value": "z"},
+        {"op": "remove", "path": "/tags/1"},
+        {"op": "copy", "from": "/title", "path": "/excerpt"},
+        {"op": "test", "path": "/excerpt", "value": "Neu"},
+    )
+    assert patched == {"title": "Neu", "content": "Hallo Welt", "excerpt": "Neu", "tags": ["z", "b", "c"]}
+    assert POST["tags"] == ["a", "b"]
+
+
+def test_move_between_list_positions():
+    assert patch(POST, {"op": "move", "from": "/tags/0", "path": "/tags/-"})["tags"] == ["b", "a"]
+
+
+@pytest.mark.parametrize("operation,status_code", [
+    ({"op": "replace", "path": "/version", "value": 9}, 422),
+    ({"op": "replace", "path": "/tags/5", "value": "x"}, 422),
+    ({"op": "replace", "path": "title", "value": "x"}, 422),
+    ({"op": "add", "path": "/title"}, 422),
+    ({"op": "move", "path": "/title"}, 422),
+    ({"op": "test", "path": "/title", "value": "Anders"}, 409),
+])
+def test_invalid_operations_are_rejected(operation, status_code):
+    with pytest.raises(HTTPException) as error:
+        patch(POST, operation)
+    assert error.value.status_code == status_code
+
+
+def test_text_delta_keeps_deletes_and_inserts():
+    assert apply_text_delta("Hallo Welt", [[0, 6], [-1, 4], [1, "Rudi"]]) == "Hallo Rudi"
+
+
+@pytest.mark.parametrize("delta", [
+    [[0, 6]],
+    [[0, 11]],
+    [[2, "x"]],
+    [[0]],
+])
+def test_text_delta_must_cover_the_base_text(delta):
+    with pytest.raises(HTTPException) as error:
+        apply_text_delta("Hallo Welt", delta)
+    assert error.value.status_code == 422
@@ -0,0 +1,109 @@
+import asyncio
+import time
+from types import SimpleNamespace
+
+import pytest
+import server
+from fastapi import HTTPException, Response
+from server import MongoUnavailable, PostSnapshot
+
+POSTS = [
+    {
+        "id": str(number), "title": f"Beitrag {number}", "content": "<p>Text</p>", "excerpt": "Text",
+        "slug": f"beitrag-{number}", "created_at": f"2024-01-{number + 1:02d}T08:00:00+00:00", "published": True
+    }
+    for number in range(7)
+]
+
+
+class FakeCursor:
+    def __init__(self, posts, fail_after=None):
+        self.posts = posts
+        self.position = 0
+        self.fail_after = fail_after
+        self.batches = 0
+
+    def batch_size(self, size):
+        return self
+
+    async def to_list(self, length):
+        if self.fail_after is not None and self.batches >= self.fail_after:
+            raise MongoUnavailable()
+        self.batches += 1
+        batch = self.posts[self.position:self.position + length]
+        self.position += length
+        return batch
+
+
+class FakeCollection:
+    def __init__(self):
+        self.cursors = []
+        self.fail_after = None
+
+    def find(self, query, projection):
+        self.cursors.append(FakeCursor(POSTS, fail_after=self.fail_after))
+        return self.cursors[-1]
+
+
+class FakeBreaker:
+    async def call(self, operation):
+        return await operation()
+
+
+@pytest.fixture
+def snapshot(monkeypatch, tmp_path):
+    posts = FakeCollection()
+    monkeypatch.setattr(server, "db", SimpleNamespace(blog_posts=posts))
+    monkeypatch.setattr(server, "mongo_breaker", FakeBreaker())
+    monkeypatch.setattr(PostSnapshot, "BATCH_SIZE", 3)
+    return PostSnapshot(tmp_path / "posts.sqlite", 300), posts
+
+
+def test_refresh_streams_posts_in_batches(snapshot):
+    post_snapshot, posts = snapshot
+    asyncio.run(post_snapshot.refresh())
+    response = Response()
+    snapshot_posts = asyncio.run(post_snapshot.read(response))
+
+    assert posts.cursors[0].batches == 4  # 3 + 3 + 1, then the empty batch that ends the stream
+    assert [post.id for post in snapshot_posts] == [str(number) for number in reversed(range(7))]
+    assert response.headers["X-Snapshot-Age"] == "0"
+    assert response.headers["Cache-Control"] == "no-store"
+    assert asyncio.run(post_snapshot.get(Response(), "slug", "beitrag-3")).id == "3"
+
+
+def test_failed_refresh_keeps_the_previous_snapshot(snapshot):
+    post_snapshot, posts = snapshot
+    asyncio.run(post_snapshot.refresh())
+    posts.fail_after = 1
+    with pytest.raises(MongoUnavailable):
+        asyncio.run(post_snapshot.refresh())
+
+    assert len(asyncio.run(post_snapshot.read(Response()))) == 7
+    assert [path.name for path in post_snapshot.path.parent.iterdir()] == ["posts.sqlite"]
+
+
+def test_missing_snapshot_answers_503(snapshot):
+    post_snapshot, _ = snapshot
+    with pytest.raises(HTTPException) as error:
+        asyncio.run(post_snapshot.read(Response()))
+    assert error.value.status_code == 503
+
+
+def test_burst_of_changes_settles_once(snapshot, monkeypatch):
+    post_snapshot, _ = snapshot
+    monkeypatch.setattr(PostSnapshot, "DEBOUNCE", 0.1)
+    monkeypatch.setattr(PostSnapshot, "MAX_DELAY", 1)
+
+    async def main():
+        async def writes():
+            for _ in range(3):
+                await asyncio.sleep(0.05)
+                post_snapshot.on_invalidation(server.InvalidationEvent(collection="blog_posts", operation="update"))
+
+        started = time.monotonic()
+        await asyncio.gather(post_snapshot._settle(), writes())
+        return time.monotonic() - started
+
+    # The last change comes after 0.15 s, so settling ends a quiet period later
+    assert 0.2 <= asyncio.run(main()) < 1
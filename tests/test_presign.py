@@ -0,0 +1,139 @@
+import asyncio
+import base64
+import json
+
+import boto3
+import pytest
+import requests
+import server
+from fastapi import HTTPException
+from moto import mock_aws
+from server import ImagePresignRequest, complete_image_upload, presign_image_upload
+
+PNG = b"\x89PNG\r\n\x1a\n" + b"\x00" * 64
+BUCKET = "rudi-media-test"
+
+
+class FakeCollection:
+    def __init__(self):
+        self.documents = []
+
+    def _find(self, query):
+        return next((document for document in self.documents if document["id"] == query["id"]), None)
+
+    async def insert_one(self, document):
+        self.documents.append(dict(document))
+
+    async def find_one(self, query, projection=None):
+        document = self._find(query)
+        return dict(document) if document else None
+
+    async def update_one(self, query, update, upsert=False):
+        if self._find(query) is None and upsert:
+            self.documents.append(dict(update["$setOnInsert"]))
+
+    async def delete_one(self, query):
+        document = self._find(query)
+        if document:
+            self.documents.remove(document)
+
+
+class FakeDatabase:
+    def __init__(self):
+        self.image_uploads = FakeCollection()
+        self.images = FakeCollection()
+
+
+@pytest.fixture
+def bucket(monkeypatch):
+    monkeypatch.setenv("AWS_ACCESS_KEY_ID", "testing")
+    monkeypatch.setenv("AWS_SECRET_ACCESS_KEY", "testing")
+    monkeypatch.setattr(server, "S3_BUCKET", BUCKET)
+    monkeypatch.setattr(server, "S3_ENDPOINT_URL", None)
+    monkeypatch.setattr(server, "S3_PUBLIC_URL", "")
+    monkeypatch.setattr(server, "_s3_client", None)
+    monkeypatch.setattr(server, "db", FakeDatabase())
+    with mock_aws():
+        s3 = boto3.client("s3", region_name=server.S3_REGION)
+        s3.create_bucket(Bucket=BUCKET, CreateBucketConfiguration={"LocationConstraint": server.S3_REGION})
+        yield s3
+
+
+def presign(content_type="image/png", size=len(PNG)):
+    return asyncio.run(presign_image_upload(ImagePresignRequest(content_type=content_type, size=size, filename="bild.png"), current_admin=None))
+
+
+def upload(presigned, data, key=None):
+    fields = dict(presigned.fields, key=key or presigned.fields["key"])
+    response = requests.post(presigned.url, data=fields, files={"file": ("bild.png", data, "image/png")})
+    assert response.status_code in (200, 201, 204)
+
+
+def complete(presigned):
+    return asyncio.run(complete_image_upload(presigned.upload_id, current_admin=None))
+
+
+def test_presigned_upload_is_recorded_as_image(bucket):
+    presigned = presign()
+    assert presigned.key.startswith(server.S3_UPLOAD_PREFIX) and presigned.key.endswith(".png")
+    upload(presigned, PNG)
+
+    result = complete(presigned)
+
+    assert result.url == server.s3_object_url(presigned.key)
+    image = server.db.images.documents[0]
+    assert (image["id"], image["key"], image["size"], image["storage"]) == (presigned.upload_id, presigned.key, len(PNG), "s3")
+    assert server.db.image_uploads.documents == []
+    # Completing again is harmless
+    assert complete(presigned).url == result.url
+    assert len(server.db.images.documents) == 1
+
+
+def test_policy_pins_the_key_content_type_and_size(bucket):
+    presigned = presign()
+    policy = json.loads(base64.b64decode(presigned.fields["policy"]))
+
+    assert {"key": presigned.key} in policy["conditions"]
+    assert {"Content-Type": "image/png"} in policy["conditions"]
+    assert ["content-length-range", 1, server.IMAGE_MAX_SIZE] in policy["conditions"]
+
+
+def test_wrong_magic_bytes_are_rejected_and_deleted(bucket):
+    presigned = presign()
+    upload(presigned, b"GIF89a" + b"\x00" * 64)
+
+    with pytest.raises(HTTPException) as error:
+        complete(presigned)
+
+    assert error.value.status_code == 400
+    assert bucket.list_objects_v2(Bucket=BUCKET).get("KeyCount") == 0
+    assert server.db.images.documents == []
+
+
+def test_oversize_object_is_rejected(bucket, monkeypatch):
+    presigned = presign()
+    upload(presigned, PNG + b"\x00" * 1024)
+    monkeypatch.setattr(server, "IMAGE_MAX_SIZE", len(PNG))
+
+    with pytest.raises(HTTPException) as error:
+        complete(presigned)
+
+    assert error.value.status_code == 400
+    assert server.db.images.documents == []
+
+
+def test_oversize_request_gets_no_presigned_post(bucket):
+    with pytest.raises(HTTPException) as error:
+        presign(size=server.IMAGE_MAX_SIZE + 1)
+    assert error.value.status_code == 400
+
+
+def test_object_outside_the_issued_key_is_not_recorded(bucket):
+    presigned = presign()
+    upload(presigned, PNG, key=f"{server.S3_UPLOAD_PREFIX}fremd.png")
+
+    with pytest.raises(HTTPException) as error:
+        complete(presigned)
+
+    assert error.value.status_code == 400
+    assert server.db.images.documents == []
@@ -0,0 +1,125 @@
+import asyncio
+import threading
+import time
+import tracemalloc
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+
+import pytest
+import server
+from server import RequestProfilerMiddleware, SamplingProfiler, top_allocations
+
+
+def scope(headers=(), query_string=b""):
+    return {
+        "type": "http", "method": "GET", "path": "/api/blog/posts",
+        "headers": [(b"authorization", b"Bearer token"), *headers], "query_string": query_string,
+    }
+
+
+@pytest.mark.parametrize("headers,query_string,wanted", [
+    ((), b"", False),
+    (((b"x-profile", b"1"),), b"", True),
+    (((b"x-profile", b"true"),), b"", True),
+    (((b"x-profile", b"0"),), b"", False),
+    ((), b"_profile=1", True),
+    ((), b"limit=5&_profile=true", True),
+    ((), b"_profile=0", False),
+    ((), b"no_profile_here=1", False),
+])
+def test_profiling_is_opt_in(headers, query_string, wanted):
+    assert RequestProfilerMiddleware._wants_profile(scope(headers, query_string)) is wanted
+
+
+def busy_loop(deadline):
+    while time.perf_counter() < deadline:
+        sum(range(100))
+
+
+def test_sampling_profiler_collects_folded_stacks():
+    worker = threading.Thread(target=busy_loop, args=(time.perf_counter() + 0.2,), name="busy")
+    profiler = SamplingProfiler(interval=0.005)
+    worker.start()
+    profiler.start()
+    worker.join()
+    profiler.stop()
+
+    assert profiler.sample_count > 0
+    busy_stacks = [line for line in profiler.folded().splitlines() if line.startswith("busy;")]
+    assert busy_stacks and "busy_loop (test_profiler.py:" in busy_stacks[0]
+    assert int(busy_stacks[0].rsplit(" ", 1)[1]) >= 1
+
+
+def test_top_allocations_reports_the_largest_growth():
+    tracemalloc.start(5)
+    try:
+        before = tracemalloc.take_snapshot()
+        retained = [bytes(1024) for _ in range(1000)]
+        after = tracemalloc.take_snapshot()
+    finally:
+        tracemalloc.stop()
+
+    allocations = top_allocations(before, after, 3)
+    assert len(allocations) <= 3
+    assert set(allocations[0]) == {"size_diff", "count_diff", "size", "traceback"}
+    assert allocations[0]["size_diff"] >= 1024 * 1000
+    assert any("test_profiler.py" in frame for frame in allocations[0]["traceback"])
+    assert len(retained) == 1000
+
+
+class FakeProfiles:
+    def __init__(self):
+        self.documents = []
+
+    async def insert_one(self, document):
+        self.documents.append(document)
+
+
+@pytest.fixture
+def profiles(monkeypatch):
+    collection = FakeProfiles()
+    monkeypatch.setattr(server, "db", SimpleNamespace(profiles=collection))
+    return collection
+
+
+def run(monkeypatch, request_scope, admin=object()):
+    async def app(scope, receive, send):
+        await send({"type": "http.response.start", "status": 200, "headers": []})
+        await send({"type": "http.response.body", "body": b"ok"})
+
+    async def get_admin(token):
+        return admin if token == "token" else None
+
+    monkeypatch.setattr(server, "get_admin_from_token", get_admin)
+    messages = []
+
+    async def send(message):
+        messages.append(message)
+
+    asyncio.run(RequestProfilerMiddleware(app)(request_scope, None, send))
+    return dict(messages[0]["headers"])
+
+
+def test_profile_is_stored_with_an_expiry(profiles, monkeypatch):
+    headers = run(monkeypatch, scope(((b"x-profile", b"1"),)))
+
+    (document,) = profiles.documents
+    assert headers[b"x-profile-id"].decode() == document["id"]
+    assert set(document) == {
+        "id", "method", "path", "status_code", "duration_ms", "sample_interval", "sample_count",
+        "folded_stacks", "top_allocations", "created_at", "expires_at",
+    }
+    assert (document["method"], document["path"], document["status_code"]) == ("GET", "/api/blog/posts", 200)
+    # created_at is stored as ISO text like everywhere else; the TTL index needs a real date
+    created_at = datetime.fromisoformat(document["created_at"])
+    assert document["expires_at"] - created_at == timedelta(days=server.PROFILE_RETENTION_DAYS)
+
+
+@pytest.mark.parametrize("request_scope,admin", [
+    (scope(), object()),
+    (scope(((b"x-profile", b"1"),)), None),
+])
+def test_requests_without_opt_in_or_admin_are_not_profiled(profiles, monkeypatch, request_scope, admin):
+    headers = run(monkeypatch, request_scope, admin)
+    assert b"x-profile-id" not in headers
+    assert profiles.documents == []
@@ -0,0 +1,127 @@
+import asyncio
+from datetime import datetime, timedelta, timezone
+
+import pytest
+import server
+from server import InvalidationEvent, PublishScheduler, apply_publish_schedule, format_publish_at
+
+
+def test_publish_at_is_stored_as_utc_seconds():
+    local = datetime(2024, 7, 1, 12, 30, 15, 999, tzinfo=timezone(timedelta(hours=2)))
+    assert format_publish_at(local) == "2024-07-01T10:30:15+00:00"
+    assert format_publish_at(datetime(2024, 7, 1, 10, 30)) == "2024-07-01T10:30:00+00:00"
+
+
+def test_future_publish_at_keeps_the_post_unpublished():
+    future = datetime.now(timezone.utc) + timedelta(days=1)
+    data = apply_publish_schedule({"published": True, "publish_at": future})
+    assert data["published"] is False
+    assert data["publish_at"] == future
+
+
+def test_publishing_now_clears_the_schedule():
+    past = datetime.now(timezone.utc) - timedelta(days=1)
+    assert apply_publish_schedule({"published": True, "publish_at": None}) == {"published": True, "publish_at": None}
+    assert apply_publish_schedule({"published": True, "publish_at": past})["published"] is True
+
+
+class FakeResult:
+    def __init__(self, modified_count):
+        self.modified_count = modified_count
+
+
+class FakeCursor:
+    def __init__(self, documents):
+        self.documents = documents
+
+    def __aiter__(self):
+        return self._iterate()
+
+    async def _iterate(self):
+        for document in self.documents:
+            yield document
+
+
+class FakeCollection:
+    def __init__(self, posts):
+        self.posts = posts
+
+    def find(self, query, projection=None):
+        return FakeCursor([
+            {"id": post["id"], "publish_at": post["publish_at"]}
+            for post in self.posts if not post["published"] and post["publish_at"] is not None
+        ])
+
+    async def update_many(self, query, update):
+        modified = 0
+        for post in self.posts:
+            if post["id"] in query["id"]["$in"] and not post["published"] and post["publish_at"] <= query["publish_at"]["$lte"]:
+                post.update(update["$set"])
+                modified += 1
+        return FakeResult(modified)
+
+
+class FakeDatabase:
+    def __init__(self, posts):
+        self.blog_posts = FakeCollection(posts)
+
+
+class FakeBus:
+    def __init__(self):
+        self.events = []
+
+    async def notify(self, event):
+        self.events.append(event)
+
+
+def at(seconds):
+    return format_publish_at(datetime.now(timezone.utc) + timedelta(seconds=seconds))
+
+
+@pytest.fixture
+def scheduled(monkeypatch):
+    posts = [
+        {"id": "faellig", "published": False, "publish_at": at(-60)},
+        {"id": "morgen", "published": False, "publish_at": at(86400)},
+        {"id": "entwurf", "published": False, "publish_at": None},
+    ]
+    bus = FakeBus()
+    monkeypatch.setattr(server, "db", FakeDatabase(posts))
+    monkeypatch.setattr(server, "invalidation_bus", bus)
+    return {post["id"]: post for post in posts}, bus
+
+
+def run_scheduler(scheduler, while_running=None):
+    async def main():
+        await scheduler.start()
+        await asyncio.sleep(0.05)
+        if while_running:
+            while_running()
+            await asyncio.sleep(1.5)
+        await scheduler.stop()
+    asyncio.run(main())
+
+
+def test_due_posts_are_published_at_startup(scheduled):
+    posts, bus = scheduled
+    run_scheduler(PublishScheduler())
+
+    assert posts["faellig"]["published"] is True
+    assert posts["faellig"]["publish_at"] is None
+    assert posts["morgen"]["published"] is False
+    assert [event.operation for event in bus.events] == ["flush"]
+
+
+def test_newly_scheduled_post_wakes_the_scheduler(scheduled):
+    posts, bus = scheduled
+    scheduler = PublishScheduler()
+
+    def reschedule():
+        posts["morgen"]["publish_at"] = at(1)
+        scheduler.on_invalidation(InvalidationEvent(
+            collection="blog_posts", operation="update", post_id="morgen",
+            published=False, publish_at=posts["morgen"]["publish_at"]
+        ))
+
+    run_scheduler(scheduler, reschedule)
+    assert posts["morgen"]["published"] is True
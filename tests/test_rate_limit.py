@@ -0,0 +1,40 @@
+import asyncio
+
+import server
+from fastapi import Request
+from server import TokenBucketRateLimiter, get_client_ip, parse_rate_limit
+
+
+def request_from(forwarded_for=None, client="10.0.0.1"):
+    headers = [(b"x-forwarded-for", forwarded_for.encode())] if forwarded_for else []
+    return Request({"type": "http", "method": "POST", "path": "/api/contact", "headers": headers, "client": (client, 1234)})
+
+
+def test_parse_rate_limit():
+    assert parse_rate_limit("5/600") == (5, 600.0)
+
+
+def test_client_ip_ignores_forwarded_for_without_trusted_proxies(monkeypatch):
+    monkeypatch.setattr(server, "TRUSTED_PROXY_HOPS", 0)
+    assert get_client_ip(request_from("1.2.3.4")) == "10.0.0.1"
+
+
+def test_client_ip_uses_entry_added_by_trusted_proxy(monkeypatch):
+    monkeypatch.setattr(server, "TRUSTED_PROXY_HOPS", 1)
+    # The client prepended a fake address; the proxy appended the real one
+    assert get_client_ip(request_from("6.6.6.6, 1.2.3.4")) == "1.2.3.4"
+    monkeypatch.setattr(server, "TRUSTED_PROXY_HOPS", 2)
+    assert get_client_ip(request_from("6.6.6.6, 1.2.3.4, 172.16.0.9")) == "1.2.3.4"
+    assert get_client_ip(request_from("1.2.3.4")) == "1.2.3.4"
+
+
+def test_token_bucket_allows_capacity_then_reports_retry_after():
+    limiter = TokenBucketRateLimiter(max_keys=10, sweep_interval=60)
+
+    async def hits():
+        return [await limiter.hit("contact:1.2.3.4", 2, 60) for _ in range(3)]
+
+    first, second, third = asyncio.run(hits())
+    assert first == second == 0
+    assert 0 < third <= 30
+    assert asyncio.run(limiter.hit("contact:5.6.7.8", 2, 60)) == 0
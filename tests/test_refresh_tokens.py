@@ -0,0 +1,101 @@
+import asyncio
+from datetime import datetime, timedelta, timezone
+
+import pytest
+import server
+from server import hash_refresh_token, issue_tokens, rotate_refresh_token
+
+
+def matches(document, query):
+    for field, condition in query.items():
+        value = document.get(field)
+        if isinstance(condition, dict):
+            if "$gt" in condition and not value > condition["$gt"]:
+                return False
+            if "$ne" in condition and value == condition["$ne"]:
+                return False
+        elif value != condition:
+            return False
+    return True
+
+
+class FakeResult:
+    def __init__(self, deleted_count):
+        self.deleted_count = deleted_count
+
+
+class FakeCollection:
+    def __init__(self, documents=()):
+        self.documents = [dict(document) for document in documents]
+
+    async def insert_one(self, document):
+        self.documents.append(dict(document))
+
+    async def find_one(self, query, projection=None):
+        return next((dict(document) for document in self.documents if matches(document, query)), None)
+
+    async def find_one_and_update(self, query, update, projection=None):
+        for document in self.documents:
+            if matches(document, query):
+                document.update(update["$set"])
+                return dict(document)
+        return None
+
+    async def delete_many(self, query):
+        kept = [document for document in self.documents if not matches(document, query)]
+        deleted = len(self.documents) - len(kept)
+        self.documents = kept
+        return FakeResult(deleted)
+
+
+class FakeDatabase:
+    def __init__(self):
+        self.refresh_tokens = FakeCollection()
+        self.admin_users = FakeCollection([{"username": "admin", "is_active": True}])
+
+
+@pytest.fixture
+def fake_db(monkeypatch):
+    database = FakeDatabase()
+    monkeypatch.setattr(server, "db", database)
+    return database
+
+
+def test_rotation_issues_a_new_refresh_token(fake_db):
+    first = asyncio.run(issue_tokens("admin"))
+    second = asyncio.run(rotate_refresh_token(first["refresh_token"]))
+
+    assert second["refresh_token"] != first["refresh_token"]
+    stored = {document["_id"]: document for document in fake_db.refresh_tokens.documents}
+    assert stored[hash_refresh_token(first["refresh_token"])]["rotated_at"] is not None
+    assert stored[hash_refresh_token(second["refresh_token"])]["rotated_at"] is None
+
+
+def test_racing_reuse_within_grace_gets_the_same_successor(fake_db):
+    first = asyncio.run(issue_tokens("admin"))
+    winner = asyncio.run(rotate_refresh_token(first["refresh_token"]))
+    racer = asyncio.run(rotate_refresh_token(first["refresh_token"]))
+
+    assert racer["refresh_token"] == winner["refresh_token"]
+    assert racer["access_token"]
+    # Only one successor was stored and it can still be rotated
+    assert len(fake_db.refresh_tokens.documents) == 2
+    assert asyncio.run(rotate_refresh_token(racer["refresh_token"])) is not None
+
+
+def test_reuse_after_grace_revokes_the_family(fake_db):
+    first = asyncio.run(issue_tokens("admin"))
+    asyncio.run(rotate_refresh_token(first["refresh_token"]))
+    for document in fake_db.refresh_tokens.documents:
+        if document["rotated_at"] is not None:
+            document["rotated_at"] -= timedelta(seconds=server.REFRESH_TOKEN_REUSE_GRACE + 1)
+
+    assert asyncio.run(rotate_refresh_token(first["refresh_token"])) is None
+    assert fake_db.refresh_tokens.documents == []
+
+
+def test_expired_token_is_refused(fake_db):
+    first = asyncio.run(issue_tokens("admin"))
+    fake_db.refresh_tokens.documents[0]["expires_at"] = datetime.now(timezone.utc) - timedelta(seconds=1)
+
+    assert asyncio.run(rotate_refresh_token(first["refresh_token"])) is None
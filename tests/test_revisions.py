@@ -0,0 +1,95 @@
+import asyncio
+
+import pytest
+import server
+from fastapi import HTTPException
+from server import apply_text_delta, compute_text_delta, reconstruct_post_revision, save_post_revision
+
+
+class FakeCursor:
+    def __init__(self, documents):
+        self.documents = documents
+
+    def sort(self, field, direction):
+        self.documents.sort(key=lambda document: document[field], reverse=direction < 0)
+        return self
+
+    def batch_size(self, size):
+        return self
+
+    def __aiter__(self):
+        return self._iterate()
+
+    async def _iterate(self):
+        for document in self.documents:
+            yield document
+
+
+class FakeCollection:
+    def __init__(self):
+        self.documents = []
+
+    async def insert_one(self, document):
+        self.documents.append(dict(document))
+
+    async def find_one(self, query, projection=None):
+        return next((dict(document) for document in self.documents if document["id"] == query["id"]), None)
+
+    def find(self, query):
+        return FakeCursor([
+            document for document in self.documents
+            if document["post_id"] == query["post_id"] and document["version"] >= query["version"]["$gte"]
+        ])
+
+
+class FakeDatabase:
+    def __init__(self):
+        self.blog_posts = FakeCollection()
+        self.post_revisions = FakeCollection()
+
+
+@pytest.fixture
+def fake_db(monkeypatch):
+    database = FakeDatabase()
+    monkeypatch.setattr(server, "db", database)
+    return database
+
+
+def write_versions(database, contents):
+    """Store a post through len(contents) versions the way apply_post_update records them"""
+    post = {"id": "p1", "title": "Titel", "content": contents[0], "version": 1, "updated_at": "v1"}
+    for version, content in enumerate(contents[1:], start=2):
+        updated = {**post, "content": content, "version": version, "updated_at": f"v{version}"}
+        asyncio.run(save_post_revision(post, updated))
+        post = updated
+    database.blog_posts.documents.append(post)
+    return post
+
+
+def test_text_delta_round_trip():
+    old = "Social Media Marketing ist für kleine Unternehmen unverzichtbar. " * 5
+    new = old.replace("kleine", "mittelständische") + "Neuer Absatz."
+    assert apply_text_delta(new, compute_text_delta(new, old)) == old
+
+
+def test_reconstruct_walks_deltas_and_snapshots(fake_db, monkeypatch):
+    monkeypatch.setattr(server, "REVISION_SNAPSHOT_INTERVAL", 3)
+    contents = [f"Version {number}: " + "Inhalt " * 50 + str(number) for number in range(1, 8)]
+    write_versions(fake_db, contents)
+    for version, content in enumerate(contents, start=1):
+        post = asyncio.run(reconstruct_post_revision("p1", version))
+        assert post["content"] == content
+        assert post["version"] == version
+
+
+def test_reconstruct_refuses_to_cross_a_version_without_revision(fake_db, monkeypatch):
+    monkeypatch.setattr(server, "REVISION_SNAPSHOT_INTERVAL", 100)
+    contents = [f"Inhalt {number} " * 60 for number in range(1, 5)]
+    write_versions(fake_db, contents)
+    # A bulk publish bumps the version without writing a revision
+    fake_db.blog_posts.documents[0].update(version=5, published=True)
+
+    with pytest.raises(HTTPException) as error:
+        asyncio.run(reconstruct_post_revision("p1", 2))
+    assert error.value.status_code == 409
+    assert asyncio.run(reconstruct_post_revision("p1", 5))["version"] == 5
@@ -0,0 +1,36 @@
+from server import sanitize_html
+
+
+def test_drops_scripts_and_event_handlers():
+    assert sanitize_html('<p onclick="x()">a</p><script>alert(1)</script><p>b</p>') == "<p>a</p><p>b</p>"
+
+
+def test_self_closed_dropped_tags_keep_following_content():
+    assert sanitize_html("<p>a</p><svg/><p>b</p>") == "<p>a</p><p>b</p>"
+    assert sanitize_html('<p>a</p><iframe src="x"/><p>b</p>') == "<p>a</p><p>b</p>"
+
+
+def test_unsafe_urls_are_removed():
+    assert sanitize_html('<a href="javascript:alert(1)">x</a>') == "<a>x</a>"
+    assert sanitize_html('<a href="https://rudi-media.de" target="_blank">x</a>') == (
+        '<a href="https://rudi-media.de" target="_blank" rel="noopener noreferrer">x</a>'
+    )
+
+
+def test_whitespace_is_collapsed_outside_pre():
+    assert sanitize_html("\n  <p>  viel   Text  </p>\n  <p>b</p> ") == "<p>viel Text</p><p>b</p>"
+
+
+def test_pre_keeps_trailing_whitespace():
+    assert sanitize_html("<pre>code  \n  </pre><p>b</p>") == "<pre>code  \n  </pre><p>b</p>"
+
+
+def test_new_list_item_closes_previous_one():
+    assert sanitize_html("<ul><li>one<li>two</ul>") == "<ul><li>one</li><li>two</li></ul>"
+    assert sanitize_html("<ul><li>a<ul><li>b<li>c</ul><li>d</ul>") == (
+        "<ul><li>a<ul><li>b</li><li>c</li></ul></li><li>d</li></ul>"
+    )
+
+
+def test_unclosed_tags_are_balanced():
+    assert sanitize_html("<p><strong>fett") == "<p><strong>fett</strong></p>"
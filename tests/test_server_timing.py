@@ -0,0 +1,49 @@
+import asyncio
+import time
+
+import server
+from server import ServerTimingMiddleware, span
+
+
+async def timed_app(scope, receive, send):
+    with span("auth"):
+        pass
+    for _ in range(2):
+        with span("mongo-find"):
+            time.sleep(0.001)
+    server.request_timings.get()["handler_end"] = time.perf_counter()
+    await send({"type": "http.response.start", "status": 200, "headers": []})
+    await send({"type": "http.response.body", "body": b"{}"})
+
+
+def test_span_outside_a_timed_request_records_nothing():
+    with span("parse") as timed:
+        pass
+    assert timed.timings is None
+
+
+def test_repeated_phases_are_summed():
+    timings = {"spans": [("mongo-find", 0.002), ("parse", 0.001), ("mongo-find", 0.003)], "handler_end": 10.0, "started": 9.99}
+    phases = ServerTimingMiddleware.summarize(timings, 0.02)
+
+    assert phases["mongo-find"][1] == 2
+    assert round(phases["mongo-find"][0], 6) == 0.005
+    assert round(phases["render"][0], 6) == 0.01
+    assert list(phases)[-1] == "total"
+
+
+def test_header_lists_every_phase():
+    messages = []
+
+    async def send(message):
+        messages.append(message)
+
+    scope = {"type": "http", "method": "GET", "path": "/api/blog/posts", "headers": []}
+    asyncio.run(ServerTimingMiddleware(timed_app)(scope, None, send))
+
+    headers = dict(messages[0]["headers"])
+    phases = [part.split(";")[0] for part in headers[b"server-timing"].decode().split(", ")]
+    assert phases == ["auth", "mongo-find", "render", "total"]
+    assert b'mongo-find;dur=' in headers[b"server-timing"] and b'desc="2x"' in headers[b"server-timing"]
+    assert b"timing-allow-origin" in headers
+    assert server.request_timings.get() is None
@@ -0,0 +1,72 @@
+import asyncio
+import re
+
+import pytest
+import server
+from fastapi import HTTPException
+from server import BlogPost, allocate_slugs, create_slug, current_tenant, insert_post_with_unique_slug
+
+
+@pytest.mark.parametrize("title,expected", [
+    ("Größere Übungen für Ärzte", "groessere-uebungen-fuer-aerzte"),
+    ("Straße & Café", "strasse-cafe"),
+    ("  Viele   Leer_zeichen -- hier ", "viele-leer-zeichen-hier"),
+    ("???", "beitrag"),
+])
+def test_create_slug_transliterates_german_umlauts(title, expected):
+    assert create_slug(title) == expected
+
+
+class FakeCollection:
+    def __init__(self, posts):
+        self.posts = posts
+        self.queries = 0
+
+    async def distinct(self, field, query):
+        self.queries += 1
+        pattern = re.compile(query["slug"]["$regex"])
+        excluded = query.get("id", {}).get("$ne")
+        return [post["slug"] for post in self.posts if pattern.match(post["slug"]) and post["id"] != excluded]
+
+
+class FakeDatabase:
+    def __init__(self, posts):
+        self.blog_posts = FakeCollection(posts)
+
+
+@pytest.fixture
+def fake_db(monkeypatch):
+    database = FakeDatabase([
+        {"id": "a", "slug": "rudi"},
+        {"id": "b", "slug": "rudi-2"},
+        {"id": "c", "slug": "rudi-media"},
+    ])
+    monkeypatch.setattr(server, "db", database)
+    return database
+
+
+def test_taken_slugs_get_the_next_free_suffix(fake_db):
+    assert asyncio.run(allocate_slugs(["rudi", "neu", "rudi-media"])) == ["rudi-3", "neu", "rudi-media-2"]
+
+
+def test_duplicates_within_a_batch_are_resolved_against_each_other(fake_db):
+    assert asyncio.run(allocate_slugs(["neu", "neu", "rudi"])) == ["neu", "neu-2", "rudi-3"]
+
+
+def test_a_post_keeps_its_own_slug(fake_db):
+    assert asyncio.run(allocate_slugs(["rudi"], exclude_id="a")) == ["rudi"]
+
+
+def test_bases_are_looked_up_in_batches(fake_db, monkeypatch):
+    monkeypatch.setattr(server, "SLUG_BATCH_SIZE", 2)
+    asyncio.run(allocate_slugs(["eins", "zwei", "drei", "eins"]))
+    assert fake_db.blog_posts.queries == 2
+
+
+def test_posts_are_not_written_without_the_slug_index(fake_db, monkeypatch):
+    monkeypatch.setattr(server, "slug_index_missing", {current_tenant.get().id})
+    post = BlogPost(title="Neu", content="<p>Text</p>", excerpt="Text", slug="neu")
+
+    with pytest.raises(HTTPException) as error:
+        asyncio.run(insert_post_with_unique_slug(post))
+    assert error.value.status_code == 503
@@ -0,0 +1,56 @@
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+import server
+from server import Tenant, create_access_token, current_tenant, get_admin_from_token
+
+
+class FakeAdmins:
+    def __init__(self, admins):
+        self.admins = admins
+
+    async def find_one(self, query):
+        return next((dict(admin) for admin in self.admins if admin["username"] == query["username"]), None)
+
+
+@pytest.fixture
+def admins(monkeypatch):
+    accounts = [
+        {"username": "admin", "hashed_password": "x", "is_active": True},
+        {"username": "alt", "hashed_password": "x", "is_active": False},
+    ]
+    monkeypatch.setattr(server, "db", SimpleNamespace(admin_users=FakeAdmins(accounts)))
+    return accounts
+
+
+def token(**claims):
+    return create_access_token({"sub": "admin", "tenant": current_tenant.get().id, **claims})
+
+
+def resolve(raw_token, scope=None):
+    admin = asyncio.run(get_admin_from_token(raw_token, scope=scope))
+    return admin.username if admin else None
+
+
+def test_tokens_only_work_for_their_scope(admins):
+    access_token = token()
+    stream_token = token(scope="contact_stream")
+
+    assert resolve(access_token) == "admin"
+    assert resolve(stream_token, scope="contact_stream") == "admin"
+    assert resolve(stream_token) is None
+    assert resolve(access_token, scope="contact_stream") is None
+
+
+def test_invalid_inactive_and_foreign_tokens_are_rejected(admins):
+    assert resolve(None) is None
+    assert resolve("kein-token") is None
+    assert resolve(token(sub="alt")) is None
+    assert resolve(token(tenant="zweite")) is None
+
+    other_site = current_tenant.set(Tenant(id="zweite", db_name="zweite"))
+    try:
+        assert resolve(token()) == "admin"
+    finally:
+        current_tenant.reset(other_site)
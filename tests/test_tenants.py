@@ -0,0 +1,95 @@
+import asyncio
+from pathlib import Path
+
+import pytest
+import server
+from server import DEFAULT_TENANT_ID, Tenant, TenantMiddleware, TenantScoped, current_tenant, load_tenants, tenant_path
+
+SECOND = Tenant(id="zweite", db_name="zweite_db", hosts=["zweite.example", "www.zweite.example"])
+
+
+@pytest.fixture
+def two_sites(monkeypatch):
+    tenants = dict(server.TENANTS, zweite=SECOND)
+    monkeypatch.setattr(server, "TENANTS", tenants)
+    return tenants
+
+
+def in_tenant(tenant, function):
+    token = current_tenant.set(tenant)
+    try:
+        return function()
+    finally:
+        current_tenant.reset(token)
+
+
+def test_scoped_objects_exist_once_per_site(two_sites):
+    scoped = TenantScoped(lambda tenant: {"site": tenant.id})
+    default = scoped.current()
+    second = in_tenant(SECOND, scoped.current)
+
+    assert default == {"site": DEFAULT_TENANT_ID}
+    assert second == {"site": "zweite"}
+    assert default is not second
+    assert in_tenant(SECOND, scoped.current) is second
+
+
+def test_tenants_config_adds_sites_and_overrides_the_default(monkeypatch):
+    monkeypatch.setattr(server, "TENANTS_CONFIG", '{"default": {"site_name": "Haupt"}, "zweite": {"db_name": "zweite_db"}}')
+    tenants = load_tenants()
+
+    assert tenants[DEFAULT_TENANT_ID].site_name == "Haupt"
+    assert tenants[DEFAULT_TENANT_ID].seed_sample_posts
+    assert tenants["zweite"].db_name == "zweite_db"
+    assert not tenants["zweite"].seed_sample_posts
+
+
+def test_local_files_are_separate_per_site():
+    path = Path("/data/snapshot.sqlite")
+    assert tenant_path(path, server.TENANTS[DEFAULT_TENANT_ID]) == path
+    assert tenant_path(path, SECOND) == Path("/data/snapshot-zweite.sqlite")
+
+
+def resolve(path, host):
+    scope = {"type": "http", "path": path, "root_path": "", "headers": [(b"host", host.encode())]}
+    tenant, scope = TenantMiddleware(None).resolve(scope)
+    return (tenant.id if tenant else None), scope["root_path"]
+
+
+def test_site_is_selected_by_path_prefix_before_host(two_sites):
+    assert resolve("/sites/zweite/api/blog/posts", "localhost") == ("zweite", "/sites/zweite")
+    assert resolve("/api/blog/posts", "WWW.Zweite.Example:8443") == ("zweite", "")
+    assert resolve("/api/blog/posts", "unbekannt.example") == (DEFAULT_TENANT_ID, "")
+
+
+def test_unknown_sites_are_rejected(two_sites, monkeypatch):
+    assert resolve("/sites/fremd/api/blog/posts", "zweite.example") == (None, "")
+    monkeypatch.setattr(server, "TENANT_STRICT_HOSTS", True)
+    assert resolve("/api/blog/posts", "unbekannt.example") == (None, "")
+
+    messages = []
+
+    async def send(message):
+        messages.append(message)
+
+    scope = {"type": "http", "path": "/api/", "root_path": "", "headers": [(b"host", b"unbekannt.example")]}
+    asyncio.run(TenantMiddleware(None)(scope, None, send))
+    assert messages[0]["status"] == 404
+
+
+def test_mongo_circuit_is_separate_per_site(two_sites, monkeypatch):
+    monkeypatch.setattr(server, "BREAKER_FAILURE_THRESHOLD", 1)
+    monkeypatch.setattr(server, "mongo_breaker", TenantScoped(server.mongo_breaker._factory))
+
+    async def failing_read():
+        raise server.PyMongoError("down")
+
+    async def read():
+        return "ok"
+
+    with pytest.raises(server.MongoUnavailable):
+        in_tenant(SECOND, lambda: asyncio.run(server.mongo_breaker.call(failing_read)))
+
+    assert in_tenant(SECOND, lambda: server.mongo_breaker.is_open)
+    assert not server.mongo_breaker.is_open
+    assert asyncio.run(server.mongo_breaker.call(read)) == "ok"